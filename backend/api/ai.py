@@ -2,21 +2,17 @@
 AI answer generation module for Francoflex API.
 """
 
-import os
 from typing import Dict
 from fastapi import HTTPException
-import openai
+from function.oa_client import chat_completion, is_llm_configured
 
 
 def generate_ai_answer(question: str) -> Dict[str, str]:
     """Generate an AI answer to a French question."""
     
-    api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
+    if not is_llm_configured():
         raise HTTPException(status_code=500, detail="OPENAI_API_KEY not configured")
     
-    client = openai.OpenAI(api_key=api_key)
-    
     prompt = f"""You are a French language learning assistant. Provide a helpful, professional answer to this French question in French. Keep it concise but informative.
 
 Question: {question}
@@ -24,8 +20,8 @@ Question: {question}
 Answer in French:"""
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
+        answer = chat_completion(
+            "ai_answer",
             messages=[
                 {"role": "system", "content": "You are a helpful French language learning assistant. Answer questions professionally in French."},
                 {"role": "user", "content": prompt}
@@ -34,7 +30,6 @@ Answer in French:"""
             max_tokens=200
         )
         
-        answer = response.choices[0].message.content.strip()
         return {"answer": answer}
         
     except Exception as e:
@@ -3,18 +3,24 @@ Audio generation module for Francoflex API.
 """
 
 import uuid
-from pathlib import Path
 from fastapi import HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
 from core.conversational_ai import ElevenLabsClient
+from function.in_audio_transcode import audio_file_info
 
-# Storage directories
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+# Chunk size used when streaming synthesized audio to the client
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _iter_chunks(audio_data: bytes):
+    """Yield audio in STREAM_CHUNK_SIZE slices."""
+    view = memoryview(audio_data)
+    for start in range(0, len(view), STREAM_CHUNK_SIZE):
+        yield bytes(view[start:start + STREAM_CHUNK_SIZE])
 
 
 def generate_audio(text: str, voice_type: str = "professional_female"):
-    """Generate AI voice from text using ElevenLabs."""
+    """Generate AI voice from text using ElevenLabs, streamed to the client without touching disk."""
     
     elevenlabs_client = ElevenLabsClient()
     
@@ -27,18 +33,20 @@ def generate_audio(text: str, voice_type: str = "professional_female"):
         if not audio_data:
             raise HTTPException(status_code=500, detail="Failed to generate audio")
         
-        # Save audio to temporary file
+        # The speech gateway may have fallen back to local WAV synthesis
+        extension, media_type = audio_file_info(audio_data, default="mp3")
         file_id = str(uuid.uuid4())
-        audio_path = UPLOAD_DIR / f"{file_id}.mp3"
-        
-        with open(audio_path, "wb") as f:
-            f.write(audio_data)
         
-        return FileResponse(
-            path=str(audio_path),
-            media_type="audio/mpeg",
-            filename=f"generated_audio_{file_id}.mp3"
+        return StreamingResponse(
+            _iter_chunks(audio_data),
+            media_type=media_type,
+            headers={
+                "Content-Disposition": f'attachment; filename="generated_audio_{file_id}.{extension}"',
+                "Content-Length": str(len(audio_data))
+            }
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Audio generation error: {str(e)}")
@@ -3,19 +3,12 @@ Pronunciation analysis module for Francoflex API.
 """
 
 import os
-import uuid
-import shutil
-from pathlib import Path
 from fastapi import File, UploadFile, HTTPException, Form
 from utils.pronunciation_analyzer import (
     analyze_pronunciation, 
     generate_word_feedback
 )
 
-# Storage directories
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
-
 
 def analyze_pronunciation_endpoint(
     audio_file: UploadFile = File(...),
@@ -28,22 +21,12 @@ def analyze_pronunciation_endpoint(
     if not api_key:
         raise HTTPException(status_code=500, detail="SpeechAce API key not configured")
     
-    # Save uploaded audio file
-    file_id = str(uuid.uuid4())
-    audio_path = UPLOAD_DIR / f"{file_id}.wav"
-    
     try:
-        with open(audio_path, "wb") as buffer:
-            shutil.copyfileobj(audio_file.file, buffer)
-        
-        # Analyze pronunciation
-        custom_response, error_message = analyze_pronunciation(str(audio_path), target_text)
-        
-        if error_message:
-            raise HTTPException(status_code=500, detail=error_message)
+        # The upload's spooled buffer (in memory below 1 MB) goes straight to SpeechAce
+        custom_response, raw_or_error = analyze_pronunciation(audio_file.file, target_text)
         
         if not custom_response:
-            raise HTTPException(status_code=500, detail="Failed to analyze pronunciation")
+            raise HTTPException(status_code=500, detail=raw_or_error or "Failed to analyze pronunciation")
         
         # Generate AI feedback for each word
         overall_score = custom_response.get('overall_score', 0)
@@ -57,7 +40,3 @@ def analyze_pronunciation_endpoint(
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis error: {str(e)}")
-    finally:
-        # Clean up uploaded file
-        if audio_path.exists():
-            audio_path.unlink()
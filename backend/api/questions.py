@@ -2,22 +2,18 @@
 Question generation module for Francoflex API.
 """
 
-import os
 import json
 from typing import List, Dict
 from fastapi import HTTPException
-import openai
+from function.oa_client import chat_completion, is_llm_configured
 
 
 def generate_questions(industry: str, job_title: str) -> Dict[str, List[Dict[str, str]]]:
     """Generate French learning questions for specific industry and job title."""
     
-    api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
+    if not is_llm_configured():
         raise HTTPException(status_code=500, detail="OPENAI_API_KEY not configured")
     
-    client = openai.OpenAI(api_key=api_key)
-    
     prompt = f"""Generate 10 highly specific French learning questions for a {job_title} working in {industry}.
 
 Requirements:
@@ -41,8 +37,8 @@ Industry: {industry}
 Job Title: {job_title}"""
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
+        response_content = chat_completion(
+            "questions_lite",
             messages=[
                 {"role": "system", "content": "You are a French language learning assistant. Generate exactly 10 professional French questions in JSON format."},
                 {"role": "user", "content": prompt}
@@ -51,7 +47,6 @@ Job Title: {job_title}"""
             temperature=0.7
         )
         
-        response_content = response.choices[0].message.content
         questions_data = json.loads(response_content)
         
         questions = questions_data.get('content', [])
@@ -34,6 +34,6 @@ SPEECHACE_API_KEY = os.getenv('SPEECHACE_API_KEY')
 ELEVENLABS_API_KEY = os.getenv('ELEVENLABS_API_KEY')
 
 # Model Configuration
-OPENAI_MODEL = "gpt-3.5-turbo"
+OPENAI_MODEL = os.getenv('OPENAI_MODEL', "gpt-4o")  # Large tier of the LLM gateway (see function/oa_routing.py)
 ELEVENLABS_VOICE_TYPE = "professional_female"
 SPEECHACE_DIALECT = "fr-fr"
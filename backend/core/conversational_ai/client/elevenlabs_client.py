@@ -2,9 +2,14 @@
 
 import os
 import requests
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator
 from dotenv import load_dotenv
 
+try:
+    from function.el_client import synthesize_speech, stream_speech
+except ImportError:
+    synthesize_speech = stream_speech = None
+
 # Load environment variables
 load_dotenv()
 
@@ -36,15 +41,21 @@ class ElevenLabsClient:
         Returns:
             Audio data as bytes, or None if error
         """
-        if not self.api_key:
-            print("Error: ELEVENLABS_API_KEY not found in environment variables")
-            return None
-        
         if voice_type not in self.french_voices:
             print(f"Error: Unknown voice type '{voice_type}'")
             return None
         
         voice_id = self.french_voices[voice_type]
+        
+        if synthesize_speech is not None:
+            # Pooled session, deadline and local fallback from the speech gateway
+            speech = synthesize_speech(text, voice_id, model_id=model_id)
+            return speech['audio_bytes'] if speech else None
+        
+        if not self.api_key:
+            print("Error: ELEVENLABS_API_KEY not found in environment variables")
+            return None
+        
         url = f"{self.base_url}/text-to-speech/{voice_id}"
         
         headers = {
@@ -65,7 +76,7 @@ class ElevenLabsClient:
         }
         
         try:
-            response = requests.post(url, json=data, headers=headers)
+            response = requests.post(url, json=data, headers=headers, timeout=30)
             response.raise_for_status()
             return response.content
             
@@ -76,6 +87,33 @@ class ElevenLabsClient:
             print(f"Unexpected error: {e}")
             return None
     
+    def text_to_speech_stream(self, text: str, voice_type: str = 'professional_female',
+                              model_id: str = 'eleven_multilingual_v2') -> Optional[Iterator[bytes]]:
+        """
+        Convert text to speech, yielding audio chunks as ElevenLabs produces them.
+        
+        Args:
+            text: Text to convert to speech
+            voice_type: Type of voice to use ('professional_female', 'professional_male', 'friendly_female')
+            model_id: Model to use for synthesis
+            
+        Returns:
+            Iterator over audio chunks, or None if error
+        """
+        if voice_type not in self.french_voices:
+            print(f"Error: Unknown voice type '{voice_type}'")
+            return None
+        
+        voice_id = self.french_voices[voice_type]
+        
+        if stream_speech is not None:
+            speech = stream_speech(text, voice_id, model_id=model_id)
+            return speech['chunks'] if speech else None
+        
+        # Without the speech gateway, fall back to a single buffered chunk
+        audio_data = self.text_to_speech(text, voice_type=voice_type, model_id=model_id)
+        return iter([audio_data]) if audio_data else None
+    
     def save_audio(self, audio_data: bytes, filename: str) -> bool:
         """
         Save audio data to file.
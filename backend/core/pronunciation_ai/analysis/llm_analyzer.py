@@ -1,52 +1,35 @@
 """LLM-based pronunciation analysis for detailed feedback."""
 
+import asyncio
 import json
 import os
-from typing import Dict, Any, Optional
-from langchain.tools import BaseTool
-from langchain_community.llms import OpenAI
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
+from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
 
+try:
+    from function.oa_client import chat_completion, achat_completion, is_llm_configured
+    from function.oa_prompt import compact_syllable_table
+except ImportError:
+    from oa_client import chat_completion, achat_completion, is_llm_configured
+    from oa_prompt import compact_syllable_table
+
 # Load environment variables
 load_dotenv()
 
-class WordPronunciationAnalysisTool(BaseTool):
-    """Tool for analyzing pronunciation assessment JSON and providing syllable-focused feedback."""
-    
-    name: str = "word_pronunciation_analysis"
-    description: str = "Analyzes pronunciation assessment JSON and provides detailed syllable-focused feedback with specific corrections"
-    llm: Optional[OpenAI] = None
-    prompt_template: Optional[PromptTemplate] = None
-    chain: Optional[LLMChain] = None
-    
-    def __init__(self):
-        """Initialize the analysis tool."""
-        super().__init__()
-        
-        # Get OpenAI API key
-        openai_api_key = os.getenv('OPENAI_API_KEY')
-        if not openai_api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables")
-        
-        # Initialize OpenAI LLM
-        self.llm = OpenAI(
-            temperature=0.3,
-            openai_api_key=openai_api_key
-        )
-        
-        # Create the prompt template
-        self.prompt_template = PromptTemplate(
-            input_variables=["json_data"],
-            template="""Analyze this pronunciation assessment JSON and provide syllable-focused feedback:
+# Maximum concurrent LLM calls in analyze_pronunciation_batch
+LLM_BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", 4))
+
+SYSTEM_PROMPT = "You are a French pronunciation coach. Give specific, actionable syllable-level corrections."
+
+PROMPT_TEMPLATE = """Analyze this pronunciation assessment and provide syllable-focused feedback.
+Only syllables that need work are listed, weakest first; weak phones are written "phone score>sound it was heard as":
 
 {json_data}
 
-For each syllable in syllable_score_list:
+For each syllable:
 1. **Syllable**: "{{letters}}" - Score: {{quality_score}}/100
 2. **Issues**: For phones in this syllable with quality_score < 70:
-   - Target sound: "{{phone}}" 
+   - Target sound: "{{phone}}"
    - You pronounced: "{{sound_most_like}}"
    - Correction: [specific guidance]
 3. **Good**: Highlight phones > 85 in this syllable
@@ -54,125 +37,213 @@ For each syllable in syllable_score_list:
 Present as: "In syllable 'bon': your 'b' sounded like 'rw' - try pressing lips together firmly before releasing the sound."
 
 Focus on 1-2 worst syllables. Make corrections specific and actionable based on the "sound_most_like" data."""
-        )
-        
-        # Create the LLM chain
-        self.chain = LLMChain(llm=self.llm, prompt=self.prompt_template)
-    
+
+
+class WordPronunciationAnalysisTool:
+    """Tool for analyzing pronunciation assessment data and providing syllable-focused feedback."""
+
+    name: str = "word_pronunciation_analysis"
+    description: str = "Analyzes pronunciation assessment JSON and provides detailed syllable-focused feedback with specific corrections"
+    route: str = "syllable_feedback"
+
+    def __init__(self):
+        """Initialize the analysis tool."""
+        if not is_llm_configured():
+            raise ValueError("OPENAI_API_KEY not found in environment variables")
+
+    def _messages(self, json_data: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": PROMPT_TEMPLATE.format(json_data=json_data)}
+        ]
+
     def _run(self, json_data: str) -> str:
         """
-        Analyze pronunciation assessment JSON and return detailed feedback.
-        
+        Analyze pronunciation assessment data and return detailed feedback.
+
         Args:
-            json_data: JSON string containing pronunciation assessment data
-            
+            json_data: Compact syllable table (or JSON string) of the pronunciation assessment
+
         Returns:
             Detailed syllable-focused feedback
         """
         try:
-            # Validate that the input is valid JSON
-            json.loads(json_data)
-            
-            # Get analysis from LLM
-            result = self.chain.run(json_data=json_data)
-            return result
-            
-        except json.JSONDecodeError:
-            return "Error: Invalid JSON data provided for analysis"
+            if not json_data.strip():
+                return "Great pronunciation! No syllables need work."
+
+            return chat_completion(self.route, self._messages(json_data), temperature=0.3, max_tokens=400)
+
         except Exception as e:
             return f"Error analyzing pronunciation data: {str(e)}"
-    
+
     async def _arun(self, json_data: str) -> str:
-        """Async version of _run."""
-        return self._run(json_data)
+        """Async version of _run, on the shared async client."""
+        try:
+            if not json_data.strip():
+                return "Great pronunciation! No syllables need work."
+
+            return await achat_completion(self.route, self._messages(json_data), temperature=0.3, max_tokens=400)
+
+        except Exception as e:
+            return f"Error analyzing pronunciation data: {str(e)}"
 
 class LLMAnalyzer:
     """Main class for LLM-based pronunciation analysis."""
-    
+
     analysis_tool: Optional[WordPronunciationAnalysisTool] = None
-    
+
     def __init__(self):
         """Initialize LLM analyzer."""
         self.analysis_tool = WordPronunciationAnalysisTool()
-    
+
+    @staticmethod
+    def _prompt_data(pronunciation_json: Dict[str, Any]) -> str:
+        """Weak syllables and phones only, within the prompt token budget."""
+        try:
+            return compact_syllable_table(pronunciation_json)['table']
+        except Exception:
+            return json.dumps(pronunciation_json, separators=(",", ":"), ensure_ascii=False)
+
     def analyze_pronunciation(self, pronunciation_json: Dict[str, Any]) -> str:
         """
         Analyze pronunciation JSON with LLM feedback.
-        
+
         Args:
             pronunciation_json: Dictionary containing pronunciation assessment data
-            
+
+        Returns:
+            Detailed syllable-focused feedback from LLM
+        """
+        return self.analysis_tool._run(self._prompt_data(pronunciation_json))
+
+    async def aanalyze_pronunciation(self, pronunciation_json: Dict[str, Any]) -> str:
+        """
+        Async version of analyze_pronunciation.
+
+        Args:
+            pronunciation_json: Dictionary containing pronunciation assessment data
+
         Returns:
             Detailed syllable-focused feedback from LLM
         """
-        # Convert dict to JSON string
-        json_string = json.dumps(pronunciation_json, indent=2)
-        
-        # Use the analysis tool
-        return self.analysis_tool._run(json_string)
-    
+        return await self.analysis_tool._arun(self._prompt_data(pronunciation_json))
+
+    async def analyze_pronunciation_batch(
+        self,
+        pronunciation_jsons: List[Dict[str, Any]],
+        max_concurrency: int = LLM_BATCH_CONCURRENCY
+    ) -> List[str]:
+        """
+        Analyze many pronunciation JSONs concurrently.
+
+        Args:
+            pronunciation_jsons: List of pronunciation assessment dictionaries
+            max_concurrency: Maximum number of LLM calls in flight
+
+        Returns:
+            Feedback for each input, in the same order
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def analyze_one(pronunciation_json: Dict[str, Any]) -> str:
+            async with semaphore:
+                return await self.aanalyze_pronunciation(pronunciation_json)
+
+        return await asyncio.gather(*(analyze_one(item) for item in pronunciation_jsons))
+
+    @staticmethod
+    def _syllable_scores(pronunciation_json: Dict[str, Any]) -> tuple:
+        """Extract overall score and syllable information from the JSON."""
+        overall_score = None
+        syllable_scores = []
+
+        if 'text_score' in pronunciation_json:
+            text_score = pronunciation_json['text_score']
+            overall_score = text_score.get('quality_score', 0)
+
+            # Extract syllable information
+            if 'syllable_score_list' in text_score:
+                for syllable in text_score['syllable_score_list']:
+                    syllable_info = {
+                        'letters': syllable.get('letters', ''),
+                        'quality_score': syllable.get('quality_score', 0),
+                        'phones': []
+                    }
+
+                    # Extract phone information
+                    if 'phone_score_list' in syllable:
+                        for phone in syllable['phone_score_list']:
+                            phone_info = {
+                                'phone': phone.get('phone', ''),
+                                'quality_score': phone.get('quality_score', 0),
+                                'sound_most_like': phone.get('sound_most_like', '')
+                            }
+                            syllable_info['phones'].append(phone_info)
+
+                    syllable_scores.append(syllable_info)
+
+        return overall_score, syllable_scores
+
     def format_pronunciation_feedback(self, pronunciation_json: Dict[str, Any]) -> Dict[str, Any]:
         """
         Format pronunciation feedback with both raw data and LLM analysis.
-        
+
         Args:
             pronunciation_json: Dictionary containing pronunciation assessment data
-            
+
         Returns:
             Dictionary with formatted feedback including LLM analysis
         """
         try:
             # Get LLM analysis
             llm_feedback = self.analyze_pronunciation(pronunciation_json)
-            
-            # Extract key metrics from the JSON
-            overall_score = None
-            syllable_scores = []
-            
-            if 'text_score' in pronunciation_json:
-                text_score = pronunciation_json['text_score']
-                overall_score = text_score.get('quality_score', 0)
-                
-                # Extract syllable information
-                if 'syllable_score_list' in text_score:
-                    for syllable in text_score['syllable_score_list']:
-                        syllable_info = {
-                            'letters': syllable.get('letters', ''),
-                            'quality_score': syllable.get('quality_score', 0),
-                            'phones': []
-                        }
-                        
-                        # Extract phone information
-                        if 'phone_score_list' in syllable:
-                            for phone in syllable['phone_score_list']:
-                                phone_info = {
-                                    'phone': phone.get('phone', ''),
-                                    'quality_score': phone.get('quality_score', 0),
-                                    'sound_most_like': phone.get('sound_most_like', '')
-                                }
-                                syllable_info['phones'].append(phone_info)
-                        
-                        syllable_scores.append(syllable_info)
-            
+            overall_score, syllable_scores = self._syllable_scores(pronunciation_json)
+
             return {
                 'overall_score': overall_score,
                 'syllable_scores': syllable_scores,
                 'llm_feedback': llm_feedback,
                 'raw_data': pronunciation_json
             }
-            
+
         except Exception as e:
             return {
                 'error': f"Error formatting feedback: {str(e)}",
                 'raw_data': pronunciation_json
             }
-    
+
+    async def aformat_pronunciation_feedback(self, pronunciation_json: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async version of format_pronunciation_feedback.
+
+        Args:
+            pronunciation_json: Dictionary containing pronunciation assessment data
+
+        Returns:
+            Dictionary with formatted feedback including LLM analysis
+        """
+        try:
+            llm_feedback = await self.aanalyze_pronunciation(pronunciation_json)
+            overall_score, syllable_scores = self._syllable_scores(pronunciation_json)
+
+            return {
+                'overall_score': overall_score,
+                'syllable_scores': syllable_scores,
+                'llm_feedback': llm_feedback,
+                'raw_data': pronunciation_json
+            }
+
+        except Exception as e:
+            return {
+                'error': f"Error formatting feedback: {str(e)}",
+                'raw_data': pronunciation_json
+            }
+
     def is_configured(self) -> bool:
         """
         Check if LLM analyzer is properly configured.
-        
+
         Returns:
-            True if OpenAI API key is available, False otherwise
+            True if an LLM backend is available, False otherwise
         """
-        openai_api_key = os.getenv('OPENAI_API_KEY')
-        return openai_api_key is not None and openai_api_key.strip() != ""
+        return is_llm_configured()
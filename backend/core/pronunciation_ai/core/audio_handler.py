@@ -1,25 +1,25 @@
 """Audio handling functionality for voice recordings."""
 
 import os
-import uuid
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
+
+try:
+    from function.in_recordings import get_recording_store
+except ImportError:
+    from in_recordings import get_recording_store
 
 class AudioHandler:
     """Handles audio recording operations including saving, listing, and deleting recordings."""
     
     def __init__(self):
-        """Initialize AudioHandler with default paths."""
-        # Get the absolute path to the project root
-        current_dir = Path(__file__).parent.parent.parent  # pronunciation-voice-ai directory
-        self.recordings_dir = current_dir / "data" / "recordings"
-        
-        # Ensure directories exist
-        self.recordings_dir.mkdir(parents=True, exist_ok=True)
+        """Initialize AudioHandler on the shared recording store (sharded layout, SQLite manifest, retention GC)."""
+        self.store = get_recording_store()
+        self.recordings_dir = self.store.root
     
     def save_recording(self, audio_data, file_extension: Optional[str] = None) -> str:
         """
-        Save voice recording to recordings directory with a UUID filename.
+        Save voice recording to the recording store with a UUID filename.
         
         Args:
             audio_data: The audio data from Streamlit's st.audio_input (UploadedFile object)
@@ -33,53 +33,41 @@ class AudioHandler:
         """
         # Get file extension from the uploaded file if not provided
         if file_extension is None:
-            original_name = audio_data.name
+            original_name = getattr(audio_data, "name", None)
             if original_name and '.' in original_name:
                 file_extension = original_name.split('.')[-1]
-            else:
-                file_extension = "wav"  # default fallback
         
-        # Generate a unique filename using UUID
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
-        filepath = self.recordings_dir / unique_filename
-        
-        # Save the audio data to file
         try:
-            with open(filepath, "wb") as f:
-                f.write(audio_data.read())
-            
-            # Reset the file pointer for potential future reads
-            audio_data.seek(0)
-            
-            # Verify the file was actually created and has content
-            if filepath.exists() and filepath.stat().st_size > 0:
-                return str(filepath)
-            else:
-                raise Exception("File was not created or is empty")
-                
+            return self.store.save(audio_data, file_extension)["path"]
         except Exception as e:
             print(f"Error saving file: {e}")
             raise e
     
-    def get_recordings(self) -> List[str]:
+    def get_recordings(self, limit: int = 50, offset: int = 0) -> List[str]:
         """
-        Get list of all voice recordings in the recordings directory.
+        Get a page of voice recordings, newest first.
+        
+        Args:
+            limit: Maximum number of recordings returned
+            offset: Number of recordings to skip
         
         Returns:
             List[str]: List of filepaths to voice recordings
         """
-        if not self.recordings_dir.exists():
-            return []
-        
-        # Get all audio files in the recordings directory
-        audio_extensions = [".wav", ".mp3", ".m4a", ".ogg", ".webm"]
-        recordings = []
+        return [record["path"] for record in self.store.list_recordings(limit=limit, offset=offset)]
+    
+    def list_recordings(self, limit: int = 50, before: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Get a page of recording manifest entries, newest first.
         
-        for file_path in self.recordings_dir.iterdir():
-            if file_path.is_file() and file_path.suffix.lower() in audio_extensions:
-                recordings.append(str(file_path))
+        Args:
+            limit: Page size
+            before: created_at of the last entry of the previous page
         
-        return recordings
+        Returns:
+            List[Dict[str, Any]]: Entries with id, path, extension, size, duration, sha256 and created_at
+        """
+        return self.store.list_recordings(limit=limit, before=before)
     
     def delete_recording(self, filepath: str) -> bool:
         """
@@ -92,6 +80,9 @@ class AudioHandler:
             bool: True if file was deleted successfully, False otherwise
         """
         try:
+            record = self.store.get_by_path(filepath)
+            if record:
+                return self.store.delete(record["id"])
             if os.path.exists(filepath):
                 os.remove(filepath)
                 return True
@@ -110,6 +101,17 @@ class AudioHandler:
         Returns:
             dict: File information including size, name, etc.
         """
+        record = self.store.get_by_path(filepath)
+        if record:
+            return {
+                "name": Path(record["path"]).name,
+                "size": record["size"],
+                "extension": f".{record['extension']}",
+                "created": record["created_at"],
+                "duration": record["duration"],
+                "sha256": record["sha256"]
+            }
+        
         file_path = Path(filepath)
         if not file_path.exists():
             return {"error": "File not found"}
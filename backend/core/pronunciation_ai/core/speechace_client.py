@@ -5,6 +5,12 @@ import requests
 from typing import Optional, Dict, Any
 from dotenv import load_dotenv
 
+try:
+    from function.sa_cache import get_cached_result, cache_result
+except ImportError:
+    # Running without the function package on the path: no result cache
+    get_cached_result = cache_result = None
+
 # Load environment variables
 load_dotenv()
 
@@ -43,18 +49,30 @@ class SpeechAceClient:
         # Prepare the file
         try:
             with open(filepath, 'rb') as audio_file:
-                files = {
-                    'user_audio_file': audio_file
-                }
-                
-                # Make the API request
-                response = requests.post(url, data=data, files=files)
-                
-                # Check if request was successful
-                response.raise_for_status()
-                
-                # Return the JSON response
-                return response.json()
+                audio_bytes = audio_file.read()
+            
+            # Same recording already scored for this text and dialect
+            if get_cached_result:
+                cached = get_cached_result(audio_bytes, word, dialect, kind="raw")
+                if cached:
+                    return cached
+            
+            files = {
+                'user_audio_file': (os.path.basename(filepath), audio_bytes)
+            }
+            
+            # Make the API request
+            response = requests.post(url, data=data, files=files, timeout=60)
+            
+            # Check if request was successful
+            response.raise_for_status()
+            
+            result = response.json()
+            if cache_result and result.get("status") == "success":
+                cache_result(audio_bytes, word, dialect, result, kind="raw")
+            
+            # Return the JSON response
+            return result
                 
         except requests.exceptions.RequestException as e:
             print(f"Error making SpeechAce API request: {e}")
@@ -0,0 +1,482 @@
+"""
+Speech gateway: text-to-speech and speech-to-text behind pluggable providers.
+
+ElevenLabs calls share one pooled HTTP session and run under per-call deadlines.
+A local offline backend (espeak-ng / espeak when installed) can be selected with
+SPEECH_BACKEND=local or as SPEECH_FALLBACK when ElevenLabs is unconfigured, slow or
+rate-limited. Without espeak it is unavailable, so callers keep their "no audio"
+path, unless LOCAL_TTS_TONES enables the deterministic tone synthesizer used by
+benchmarks and tests.
+
+stream_speech relays ElevenLabs' chunked streaming endpoint chunk by chunk, so
+playback can start after the first chunk instead of the whole file.
+
+Output format and bitrate are chosen per client (negotiate_audio_format): low-bitrate
+Opus or mp3 for mobile / Save-Data / slow connections, 64 kbps for everyone else.
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional
+
+import numpy as np
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+try:
+    from .in_audio_stream import encode_wav
+    from .in_metrics import increment, observe
+except ImportError:
+    from in_audio_stream import encode_wav
+    from in_metrics import increment, observe
+
+load_dotenv()
+
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io/v1")
+DEFAULT_VOICE_ID = "pNInz6obpgDQGcFmaJgB"  # Adam
+DEFAULT_TTS_MODEL = "eleven_multilingual_v2"
+DEFAULT_STT_MODEL = "scribe_v1"
+
+SPEECH_BACKEND = os.getenv("SPEECH_BACKEND", "elevenlabs")          # "elevenlabs" or "local"
+SPEECH_FALLBACK = os.getenv("SPEECH_FALLBACK", "")                  # fallback backend, e.g. "local" (disabled by default)
+LOCAL_TTS_TONES = os.getenv("LOCAL_TTS_TONES", "").lower() in ("1", "true", "yes")  # tone synth without espeak (benchmarks/tests only)
+TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", 15))                   # seconds per synthesis call
+STT_TIMEOUT = float(os.getenv("STT_TIMEOUT", 30))                   # seconds per transcription call
+CONNECT_TIMEOUT = float(os.getenv("SPEECH_CONNECT_TIMEOUT", 3.05))
+PROVIDER_COOLDOWN = float(os.getenv("SPEECH_PROVIDER_COOLDOWN", 30))  # skip a rate-limited provider this long
+HTTP_POOL_SIZE = int(os.getenv("SPEECH_HTTP_POOL_SIZE", 16))
+STREAM_CHUNK_SIZE = int(os.getenv("TTS_STREAM_CHUNK_SIZE", 4096))
+STREAM_LATENCY_OPTIMIZATION = os.getenv("TTS_STREAM_LATENCY_OPTIMIZATION", "2")  # ElevenLabs optimize_streaming_latency (0-4)
+
+# Output profiles: name -> (ElevenLabs output_format, file extension, MIME type)
+AUDIO_PROFILES = {
+    "opus_32": ("opus_48000_32", "ogg", "audio/ogg"),
+    "opus_64": ("opus_48000_64", "ogg", "audio/ogg"),
+    "mp3_32": ("mp3_22050_32", "mp3", "audio/mpeg"),
+    "mp3_64": ("mp3_44100_64", "mp3", "audio/mpeg"),
+    "mp3_128": ("mp3_44100_128", "mp3", "audio/mpeg"),
+}
+DEFAULT_AUDIO_FORMAT = os.getenv("TTS_DEFAULT_FORMAT", "mp3_64")
+SLOW_CONNECTIONS = {"slow-2g", "2g", "3g"}
+
+VOICE_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.5,
+    "style": 0.0,
+    "use_speaker_boost": True
+}
+
+
+class SpeechProviderError(Exception):
+    """Raised when a speech provider call fails."""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """
+    Shared keep-alive HTTP session for speech providers.
+
+    Returns:
+        requests.Session: Session with a connection pool of SPEECH_HTTP_POOL_SIZE
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+class ElevenLabsBackend:
+    """ElevenLabs text-to-speech and speech-to-text."""
+
+    name = "elevenlabs"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("ELEVENLABS_API_KEY")
+        self._cooldown_until = 0.0
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    def is_available(self) -> bool:
+        """Configured and not cooling down after a rate limit or timeout."""
+        return self.is_configured() and time.monotonic() >= self._cooldown_until
+
+    def _post(self, url: str, timeout: float, headers: Optional[Dict[str, str]] = None, **kwargs) -> requests.Response:
+        try:
+            response = get_http_session().post(
+                url, headers={"xi-api-key": self.api_key, **(headers or {})},
+                timeout=(CONNECT_TIMEOUT, timeout), **kwargs
+            )
+        except (requests.Timeout, requests.ConnectionError) as e:
+            self._cooldown_until = time.monotonic() + PROVIDER_COOLDOWN
+            raise SpeechProviderError(f"ElevenLabs unreachable: {e}", retryable=True) from e
+
+        if response.status_code == 429 or response.status_code >= 500:
+            self._cooldown_until = time.monotonic() + PROVIDER_COOLDOWN
+            raise SpeechProviderError(f"ElevenLabs returned {response.status_code}", retryable=True)
+        if response.status_code != 200:
+            raise SpeechProviderError(f"ElevenLabs returned {response.status_code}: {response.text[:200]}")
+        return response
+
+    def synthesize(self, text: str, voice_id: Optional[str], model_id: str, timeout: float,
+                   audio_format: str = DEFAULT_AUDIO_FORMAT) -> Dict[str, Any]:
+        output_format, extension, content_type = AUDIO_PROFILES[audio_format]
+        response = self._post(
+            f"{ELEVENLABS_BASE_URL}/text-to-speech/{voice_id or DEFAULT_VOICE_ID}",
+            timeout,
+            headers={"Accept": content_type},
+            params={"output_format": output_format},
+            json={"text": text, "model_id": model_id, "voice_settings": VOICE_SETTINGS}
+        )
+        return {"audio_bytes": response.content, "extension": extension, "content_type": content_type, "format": audio_format}
+
+    def stream(self, text: str, voice_id: Optional[str], model_id: str, timeout: float,
+               audio_format: str = DEFAULT_AUDIO_FORMAT) -> Dict[str, Any]:
+        output_format, extension, content_type = AUDIO_PROFILES[audio_format]
+        response = self._post(
+            f"{ELEVENLABS_BASE_URL}/text-to-speech/{voice_id or DEFAULT_VOICE_ID}/stream",
+            timeout,
+            headers={"Accept": content_type},
+            params={"optimize_streaming_latency": STREAM_LATENCY_OPTIMIZATION, "output_format": output_format},
+            json={"text": text, "model_id": model_id, "voice_settings": VOICE_SETTINGS},
+            stream=True
+        )
+
+        def chunks() -> Iterator[bytes]:
+            try:
+                for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                    if chunk:
+                        yield chunk
+            finally:
+                response.close()
+
+        return {"chunks": chunks(), "extension": extension, "content_type": content_type, "format": audio_format}
+
+    def transcribe(self, audio_bytes: bytes, filename: str, content_type: str, language: str, timeout: float) -> str:
+        response = self._post(
+            f"{ELEVENLABS_BASE_URL}/speech-to-text",
+            timeout,
+            files={"file": (filename, audio_bytes, content_type)},
+            data={"model_id": DEFAULT_STT_MODEL, "language_code": language}
+        )
+        return response.json().get("text", "")
+
+
+class LocalSpeechBackend:
+    """
+    Offline synthesis with espeak-ng/espeak.
+
+    The deterministic tone sequence is only used when allow_tones is set (LOCAL_TTS_TONES),
+    so placeholder beeps are never stored and served as question audio in production.
+    """
+
+    name = "local"
+    sample_rate = 16000
+
+    def __init__(self, allow_tones: bool = LOCAL_TTS_TONES):
+        self.engine = shutil.which("espeak-ng") or shutil.which("espeak")
+        self.allow_tones = allow_tones
+
+    def is_configured(self) -> bool:
+        return bool(self.engine) or self.allow_tones
+
+    def is_available(self) -> bool:
+        return self.is_configured()
+
+    def _tones(self, text: str) -> bytes:
+        # One short tone per word, pitch derived from the word, so output is stable for a given text
+        sr = self.sample_rate
+        gap = np.zeros(int(0.08 * sr), dtype=np.int16)
+        pieces = []
+        for word in text.split() or [""]:
+            t = np.arange(int(sr * min(0.6, 0.12 + 0.04 * len(word)))) / sr
+            freq = 160 + (sum(word.encode("utf-8")) % 120)
+            pieces.append((6000 * np.sin(2 * np.pi * freq * t) * np.hanning(len(t))).astype(np.int16))
+            pieces.append(gap)
+        return encode_wav(np.concatenate(pieces), sr)
+
+    def synthesize(self, text: str, voice_id: Optional[str], model_id: str, timeout: float,
+                   audio_format: str = DEFAULT_AUDIO_FORMAT) -> Dict[str, Any]:
+        # Offline output is always WAV, whatever format was negotiated
+        if self.engine:
+            try:
+                result = subprocess.run(
+                    [self.engine, "-v", os.getenv("LOCAL_TTS_VOICE", "fr"), "--stdout", text],
+                    capture_output=True, timeout=timeout, check=True
+                )
+                return {"audio_bytes": result.stdout, "extension": "wav", "content_type": "audio/wav", "format": "wav"}
+            except (subprocess.SubprocessError, OSError) as e:
+                if not self.allow_tones:
+                    raise SpeechProviderError(f"{os.path.basename(self.engine)} failed: {e}") from e
+                print(f"⚠️ {os.path.basename(self.engine)} failed, using tone synthesis: {e}")
+        elif not self.allow_tones:
+            raise SpeechProviderError("No offline speech engine installed")
+        return {"audio_bytes": self._tones(text), "extension": "wav", "content_type": "audio/wav", "format": "wav"}
+
+    def stream(self, text: str, voice_id: Optional[str], model_id: str, timeout: float,
+               audio_format: str = DEFAULT_AUDIO_FORMAT) -> Dict[str, Any]:
+        # Local synthesis is fast enough to run in full; only the delivery is chunked
+        result = self.synthesize(text, voice_id, model_id, timeout, audio_format)
+        audio = result.pop("audio_bytes")
+        result["chunks"] = (audio[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(audio), STREAM_CHUNK_SIZE))
+        return result
+
+    def transcribe(self, audio_bytes: bytes, filename: str, content_type: str, language: str, timeout: float) -> str:
+        raise SpeechProviderError("Speech-to-text is not available offline")
+
+
+_backends: Dict[str, Any] = {}
+_backends_lock = threading.Lock()
+
+
+def get_speech_backend(name: str):
+    """
+    Return a speech backend by name, creating it on first use.
+
+    Args:
+        name (str): "elevenlabs" or "local"
+
+    Returns:
+        ElevenLabsBackend or LocalSpeechBackend
+    """
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = LocalSpeechBackend() if name == "local" else ElevenLabsBackend()
+        return _backends[name]
+
+
+def _backend_chain(primary: Optional[str]):
+    names = [primary or SPEECH_BACKEND]
+    if SPEECH_FALLBACK and SPEECH_FALLBACK not in names:
+        names.append(SPEECH_FALLBACK)
+    return [get_speech_backend(name) for name in names]
+
+
+def negotiate_audio_format(headers: Mapping[str, str], requested: Optional[str] = None) -> str:
+    """
+    Pick the TTS output profile for a client from its request headers.
+
+    An explicit, known format wins. Otherwise mobile clients (Sec-CH-UA-Mobile: ?1),
+    Save-Data and slow connections (ECT) get 32 kbps, everyone else DEFAULT_AUDIO_FORMAT.
+    Opus is used when the client advertises it in Accept or is Chromium-based (Sec-CH-UA),
+    since Safari may not play Ogg Opus.
+
+    Args:
+        headers (Mapping[str, str]): Request headers (case-insensitive mapping)
+        requested (Optional[str]): Format asked for explicitly (e.g. ?format=opus_32)
+
+    Returns:
+        str: An AUDIO_PROFILES key
+    """
+    if requested in AUDIO_PROFILES:
+        return requested
+
+    accept = headers.get("accept", "").lower()
+    supports_opus = "opus" in accept or "audio/ogg" in accept or "audio/webm" in accept or "sec-ch-ua" in headers
+    constrained = (
+        headers.get("sec-ch-ua-mobile", "") == "?1"
+        or headers.get("save-data", "").lower() == "on"
+        or headers.get("ect", "").lower() in SLOW_CONNECTIONS
+    )
+    if constrained:
+        return "opus_32" if supports_opus else "mp3_32"
+    if supports_opus and DEFAULT_AUDIO_FORMAT == "mp3_64":
+        return "opus_64"
+    return DEFAULT_AUDIO_FORMAT
+
+
+def synthesize_speech(
+    text: str,
+    voice_id: Optional[str] = None,
+    model_id: str = DEFAULT_TTS_MODEL,
+    timeout: Optional[float] = None,
+    backend: Optional[str] = None,
+    audio_format: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Synthesize speech with the configured provider, then SPEECH_FALLBACK if set.
+
+    Args:
+        text (str): Text to speak
+        voice_id (Optional[str]): Provider voice ID (ignored offline)
+        model_id (str): Provider model
+        timeout (Optional[float]): Deadline in seconds (default: TTS_TIMEOUT)
+        backend (Optional[str]): Force a backend ("elevenlabs" or "local")
+        audio_format (Optional[str]): AUDIO_PROFILES key (default: DEFAULT_AUDIO_FORMAT)
+
+    Returns:
+        Optional[Dict[str, Any]]: audio_bytes, extension, content_type, format and backend, or None if every provider failed
+    """
+    timeout = timeout or TTS_TIMEOUT
+    audio_format = audio_format if audio_format in AUDIO_PROFILES else DEFAULT_AUDIO_FORMAT
+    for provider in _backend_chain(backend):
+        if not provider.is_available():
+            increment(f"tts.{provider.name}.skipped")
+            continue
+        start = time.perf_counter()
+        try:
+            result = provider.synthesize(text, voice_id, model_id, timeout, audio_format)
+        except Exception as e:
+            increment(f"tts.{provider.name}.errors")
+            print(f"⚠️ TTS via {provider.name} failed: {e}")
+            continue
+        latency_ms = 1000 * (time.perf_counter() - start)
+        observe(f"tts.{provider.name}.latency_ms", latency_ms)
+        increment(f"tts.{provider.name}.calls")
+        increment(f"tts.format.{result['format']}.bytes", len(result["audio_bytes"]))
+        if provider.name != (backend or SPEECH_BACKEND):
+            increment("tts.fallbacks")
+        result["backend"] = provider.name
+        return result
+    return None
+
+
+def stream_speech(
+    text: str,
+    voice_id: Optional[str] = None,
+    model_id: str = DEFAULT_TTS_MODEL,
+    timeout: Optional[float] = None,
+    backend: Optional[str] = None,
+    on_complete: Optional[Callable[[Dict[str, Any]], None]] = None,
+    audio_format: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Stream synthesized speech chunk by chunk as the provider produces it.
+
+    The first chunk is fetched before returning, so a provider that fails up front is
+    replaced by the fallback. Once the stream has been fully consumed, on_complete runs
+    in a background thread with the whole clip (audio_bytes, extension, content_type,
+    backend), e.g. to store and cache it. Streams that are cut short are not stored.
+
+    Args:
+        text (str): Text to speak
+        voice_id (Optional[str]): Provider voice ID (ignored offline)
+        model_id (str): Provider model
+        timeout (Optional[float]): Deadline in seconds between chunks (default: TTS_TIMEOUT)
+        backend (Optional[str]): Force a backend ("elevenlabs" or "local")
+        on_complete (Optional[Callable]): Called with the full result after the last chunk
+        audio_format (Optional[str]): AUDIO_PROFILES key (default: DEFAULT_AUDIO_FORMAT)
+
+    Returns:
+        Optional[Dict[str, Any]]: chunks (iterator of bytes), extension, content_type, format and backend,
+            or None if every provider failed before its first chunk
+    """
+    timeout = timeout or TTS_TIMEOUT
+    audio_format = audio_format if audio_format in AUDIO_PROFILES else DEFAULT_AUDIO_FORMAT
+    for provider in _backend_chain(backend):
+        if not provider.is_available():
+            increment(f"tts.{provider.name}.skipped")
+            continue
+        start = time.perf_counter()
+        try:
+            result = provider.stream(text, voice_id, model_id, timeout, audio_format)
+            first_chunk = next(result["chunks"], b"")
+        except Exception as e:
+            increment(f"tts.{provider.name}.errors")
+            print(f"⚠️ TTS stream via {provider.name} failed: {e}")
+            continue
+        observe(f"tts.{provider.name}.first_chunk_ms", 1000 * (time.perf_counter() - start))
+        if provider.name != (backend or SPEECH_BACKEND):
+            increment("tts.fallbacks")
+
+        def relay(provider=provider, result=result, first_chunk=first_chunk, start=start) -> Iterator[bytes]:
+            buffer = bytearray(first_chunk)
+            if first_chunk:
+                yield first_chunk
+            try:
+                for chunk in result["chunks"]:
+                    buffer += chunk
+                    yield chunk
+            except Exception as e:
+                increment(f"tts.{provider.name}.errors")
+                print(f"⚠️ TTS stream via {provider.name} broke off after {len(buffer)} bytes: {e}")
+                return
+            observe(f"tts.{provider.name}.latency_ms", 1000 * (time.perf_counter() - start))
+            increment(f"tts.{provider.name}.calls")
+            increment(f"tts.format.{result['format']}.bytes", len(buffer))
+            if on_complete:
+                clip = {"audio_bytes": bytes(buffer), "extension": result["extension"], "content_type": result["content_type"],
+                        "format": result["format"], "backend": provider.name}
+                threading.Thread(target=on_complete, args=(clip,), daemon=True).start()
+
+        return {"chunks": relay(), "extension": result["extension"], "content_type": result["content_type"],
+                "format": result["format"], "backend": provider.name}
+    return None
+
+
+def transcribe_speech(
+    audio_bytes: bytes,
+    filename: str = "audio.wav",
+    content_type: str = "audio/wav",
+    language: str = "fr",
+    timeout: Optional[float] = None
+) -> Optional[str]:
+    """
+    Transcribe audio with the configured provider.
+
+    Args:
+        audio_bytes (bytes): Audio file content
+        filename (str): File name sent to the provider
+        content_type (str): MIME type of the audio
+        language (str): Language code
+        timeout (Optional[float]): Deadline in seconds (default: STT_TIMEOUT)
+
+    Returns:
+        Optional[str]: Transcribed text, or None if every provider failed
+    """
+    timeout = timeout or STT_TIMEOUT
+    for provider in _backend_chain(None):
+        if not provider.is_available():
+            continue
+        start = time.perf_counter()
+        try:
+            text = provider.transcribe(audio_bytes, filename, content_type, language, timeout)
+        except Exception as e:
+            increment(f"stt.{provider.name}.errors")
+            print(f"⚠️ STT via {provider.name} failed: {e}")
+            continue
+        observe(f"stt.{provider.name}.latency_ms", 1000 * (time.perf_counter() - start))
+        increment(f"stt.{provider.name}.calls")
+        return text
+    return None
+
+
+# Benchmark section
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    sentences = [f"Phrase numéro {i}, nous préparons la réunion de projet demain matin." for i in range(10)]
+    backend_name = os.getenv("BENCH_SPEECH_BACKEND", "local")
+    # Benchmarks run without espeak too
+    get_speech_backend("local").allow_tones = True
+
+    print(f"🧪 Synthesizing {len(sentences)} sentences with the {backend_name} backend...")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda text: synthesize_speech(text, backend=backend_name), sentences))
+    elapsed = time.perf_counter() - start
+    total_bytes = sum(len(result["audio_bytes"]) for result in results if result)
+    print(f"✅ {len(results)} clips, {total_bytes} bytes in {1000 * elapsed:.0f} ms ({len(results) / elapsed:.1f} clips/s)")
+
+    start = time.perf_counter()
+    stream = stream_speech(sentences[0], backend=backend_name)
+    first_chunk_ms = None
+    for chunk in stream["chunks"]:
+        if first_chunk_ms is None:
+            first_chunk_ms = 1000 * (time.perf_counter() - start)
+    print(f"✅ Streaming: first chunk after {first_chunk_ms:.0f} ms, full clip after {1000 * (time.perf_counter() - start):.0f} ms")
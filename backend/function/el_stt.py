@@ -1,7 +1,15 @@
-import os
-import requests
 from typing import Optional, Dict, Any
 from dotenv import load_dotenv
+from fastapi import HTTPException
+
+try:
+    from .in_audio_precheck import precheck_audio
+    from .in_audio_transcode import transcode_audio_in_pool
+    from .el_client import transcribe_speech, get_speech_backend, get_http_session
+except ImportError:
+    from in_audio_precheck import precheck_audio
+    from in_audio_transcode import transcode_audio_in_pool
+    from el_client import transcribe_speech, get_speech_backend, get_http_session
 
 load_dotenv()
 
@@ -15,46 +23,39 @@ def speech_to_text(audio_url: str, language: str = "fr") -> Optional[str]:
         
     Returns:
         Optional[str]: Transcribed text if successful, None if failed
+    
+    Raises:
+        HTTPException: 422 if the audio is empty, silent or too short to transcribe
     """
     try:
-        elevenlabs_api_key = os.getenv('ELEVENLABS_API_KEY')
-        if not elevenlabs_api_key:
+        if not get_speech_backend("elevenlabs").is_configured():
             print("❌ ElevenLabs API key not configured")
             return None
         
-        # ElevenLabs Speech-to-Text API endpoint
-        url = "https://api.elevenlabs.io/v1/speech-to-text"
-        
-        headers = {
-            "xi-api-key": elevenlabs_api_key,
-            "Content-Type": "application/json"
-        }
-        
         # Download audio from URL
-        audio_response = requests.get(audio_url)
+        audio_response = get_http_session().get(audio_url, timeout=30)
         if audio_response.status_code != 200:
             print(f"❌ Failed to download audio: {audio_response.status_code}")
             return None
         
-        # Prepare the request data
-        data = {
-            "audio": audio_response.content,
-            "model_id": "eleven_multilingual_v2",  # Use multilingual model
-            "language": language
-        }
+        # Normalize to 16 kHz mono WAV, reject unusable audio and only send the speech span
+        audio_content = transcode_audio_in_pool(audio_response.content)['audio_bytes']
+        precheck = precheck_audio(audio_content)
+        if precheck:
+            audio_content = precheck['audio_bytes']
         
-        # Make the request
-        response = requests.post(url, headers=headers, json=data)
+        # Upload the audio as multipart form data
+        transcribed_text = transcribe_speech(audio_content, "audio.wav", "audio/wav", language)
         
-        if response.status_code == 200:
-            result = response.json()
-            transcribed_text = result.get('text', '')
+        if transcribed_text is not None:
             print(f"✅ Speech transcribed successfully: {transcribed_text}")
             return transcribed_text
         else:
-            print(f"❌ Speech-to-text failed: {response.status_code} - {response.text}")
+            print("❌ Speech-to-text failed")
             return None
             
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error in speech-to-text: {str(e)}")
         return None
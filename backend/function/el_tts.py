@@ -1,14 +1,23 @@
 """
-Text-to-Speech module using ElevenLabs API directly.
+Text-to-Speech module using the speech gateway (ElevenLabs with local fallback).
+
+Uploaded clips are cached by text, voice and output format, so each variant of a
+sentence is synthesized and stored only once.
 """
 
+import hashlib
 import os
 import sys
 import uuid
-import requests
-from typing import Optional
+from typing import Any, Dict, Optional
 from dotenv import load_dotenv
 
+try:
+    from .el_client import synthesize_speech, stream_speech, DEFAULT_VOICE_ID, DEFAULT_TTS_MODEL, SPEECH_BACKEND, DEFAULT_AUDIO_FORMAT
+    from .in_cache import get_cache
+except ImportError:
+    from el_client import synthesize_speech, stream_speech, DEFAULT_VOICE_ID, DEFAULT_TTS_MODEL, SPEECH_BACKEND, DEFAULT_AUDIO_FORMAT
+    from in_cache import get_cache
 
 
 # Try the import
@@ -32,53 +41,71 @@ except ImportError as e:
 # Load environment variables
 load_dotenv()
 
+TTS_CACHE_TTL = float(os.getenv("TTS_CACHE_TTL", 30 * 24 * 3600))
+TTS_CACHE_MAX_ENTRIES = int(os.getenv("TTS_CACHE_MAX_ENTRIES", 20000))
+TTS_MAX_TEXT_CHARS = int(os.getenv("TTS_MAX_TEXT_CHARS", 1000))  # longest text synthesized in one call
+
+
+def _tts_cache_key(text_input: str, voice_id: Optional[str], audio_format: Optional[str]) -> str:
+    text_hash = hashlib.sha256(text_input.strip().encode("utf-8")).hexdigest()
+    return f"{voice_id or DEFAULT_VOICE_ID}:{DEFAULT_TTS_MODEL}:{audio_format or DEFAULT_AUDIO_FORMAT}:{text_hash}"
+
+
+def get_cached_audio_url(text_input: str, voice_id: Optional[str] = DEFAULT_VOICE_ID, audio_format: Optional[str] = None) -> Optional[str]:
+    """
+    Public URL of a clip already synthesized and uploaded for this text, voice and format.
+
+    Args:
+        text_input (str): Text spoken in the clip
+        voice_id (Optional[str]): ElevenLabs voice ID
+        audio_format (Optional[str]): Output profile (default: DEFAULT_AUDIO_FORMAT)
+
+    Returns:
+        Optional[str]: Cached audio URL, or None
+    """
+    return get_cache("tts_audio", TTS_CACHE_TTL, TTS_CACHE_MAX_ENTRIES).get(_tts_cache_key(text_input, voice_id, audio_format))
+
+
+def _store_clip(text_input: str, voice_id: Optional[str], audio_format: Optional[str], speech: Dict[str, Any]) -> Optional[str]:
+    """Upload a synthesized clip and cache its URL (fallback-backend clips are uploaded but not cached)."""
+    audio_url = save_audio_file(speech['audio_bytes'], speech['extension'])
+    if audio_url and speech.get('backend') == SPEECH_BACKEND:
+        get_cache("tts_audio", TTS_CACHE_TTL, TTS_CACHE_MAX_ENTRIES).set(_tts_cache_key(text_input, voice_id, audio_format), audio_url)
+    return audio_url
+
 
-def text_to_audio(text_input: str, voice_id: str = "pNInz6obpgDQGcFmaJgB") -> Optional[str]:
+def text_to_audio(text_input: str, voice_id: str = DEFAULT_VOICE_ID, audio_format: Optional[str] = None) -> Optional[str]:
     """
-    Convert text to audio file using ElevenLabs API and upload to Supabase.
+    Convert text to audio file using the speech gateway and upload to Supabase.
     
     Args:
         text_input (str): Text to convert to speech
         voice_id (str): ElevenLabs voice ID (default: "pNInz6obpgDQGcFmaJgB" - Adam)
+        audio_format (Optional[str]): Output profile from negotiate_audio_format (default: DEFAULT_AUDIO_FORMAT)
         
     Returns:
         Optional[str]: Public URL of the uploaded audio file, or None if failed
     """
     try:
-        # Check if API key is configured
-        api_key = os.getenv('ELEVENLABS_API_KEY')
-        if not api_key:
-            print("❌ ELEVENLABS_API_KEY not found in environment variables")
+        if len(text_input) > TTS_MAX_TEXT_CHARS:
+            print(f"❌ Text too long for speech synthesis ({len(text_input)} > {TTS_MAX_TEXT_CHARS} characters)")
             return None
         
         print(f"🎤 Converting text to speech: '{text_input[:50]}...'")
         
-        # ElevenLabs API endpoint
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+        cached_url = get_cached_audio_url(text_input, voice_id, audio_format)
+        if cached_url:
+            print(f"✅ Reusing cached audio: {cached_url}")
+            return cached_url
         
-        headers = {
-            "Accept": "audio/mpeg",
-            "Content-Type": "application/json",
-            "xi-api-key": api_key
-        }
-        
-        data = {
-            "text": text_input,
-            "model_id": "eleven_multilingual_v2",
-            "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.5,
-                "style": 0.0,
-                "use_speaker_boost": True
-            }
-        }
-        
-        # Make API request
-        response = requests.post(url, json=data, headers=headers)
-        response.raise_for_status()
+        # Synthesize (ElevenLabs first, local backend if it is slow, rate-limited or unconfigured)
+        speech = synthesize_speech(text_input, voice_id, audio_format=audio_format)
+        if not speech:
+            print("❌ No speech provider could synthesize the text")
+            return None
         
         # Upload audio to Supabase and get URL
-        audio_url = save_audio_file(response.content, "mp3")
+        audio_url = _store_clip(text_input, voice_id, audio_format, speech)
         
         if audio_url:
             print(f"✅ Audio uploaded to Supabase: {audio_url}")
@@ -92,6 +119,35 @@ def text_to_audio(text_input: str, voice_id: str = "pNInz6obpgDQGcFmaJgB") -> Op
         return None
 
 
+def stream_text_to_audio(text_input: str, voice_id: str = DEFAULT_VOICE_ID, audio_format: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Stream speech to the caller as it is synthesized, uploading the full clip in the background.
+    
+    Args:
+        text_input (str): Text to convert to speech
+        voice_id (str): ElevenLabs voice ID
+        audio_format (Optional[str]): Output profile from negotiate_audio_format
+        
+    Returns:
+        Optional[Dict[str, Any]]: chunks (iterator of bytes), extension, content_type and backend,
+            or None if no provider could start synthesizing (or the text is over TTS_MAX_TEXT_CHARS)
+    """
+    if len(text_input) > TTS_MAX_TEXT_CHARS:
+        print(f"❌ Text too long for speech synthesis ({len(text_input)} > {TTS_MAX_TEXT_CHARS} characters)")
+        return None
+    
+    def store(speech: Dict[str, Any]) -> None:
+        try:
+            audio_url = _store_clip(text_input, voice_id, audio_format, speech)
+            if audio_url:
+                print(f"✅ Streamed audio stored: {audio_url}")
+        except Exception as e:
+            print(f"❌ Error storing streamed audio: {str(e)}")
+    
+    print(f"🎤 Streaming text to speech: '{text_input[:50]}...'")
+    return stream_speech(text_input, voice_id, on_complete=store, audio_format=audio_format)
+
+
 # Example usage
 if __name__ == "__main__":
     # Test the function
@@ -0,0 +1,167 @@
+"""
+Local audio quality precheck run before paying for SpeechAce or speech-to-text.
+
+Decodes the clip to 16 kHz mono, trims leading/trailing silence, rejects empty or too-short
+audio with a 422 and flags clipping and low signal-to-noise ratio.
+"""
+
+from typing import Any, Dict, Optional
+
+import numpy as np
+from fastapi import HTTPException
+
+try:
+    from .in_audio_stream import EnergyVAD, encode_wav, frame_features
+    from .in_audio_transcode import decode_audio, PROVIDER_SAMPLE_RATE
+except ImportError:
+    from in_audio_stream import EnergyVAD, encode_wav, frame_features
+    from in_audio_transcode import decode_audio, PROVIDER_SAMPLE_RATE
+
+# Thresholds
+MIN_SPEECH_MS = 300           # Clips with less speech than this (unpadded) are rejected
+SILENCE_PEAK_DBFS = -50.0     # A clip whose loudest frame is below this is treated as empty
+CLIPPING_LEVEL = 32700        # |sample| at or above this counts as clipped
+CLIPPING_RATIO_WARN = 0.001   # Flag clipping when more than 0.1% of samples are clipped
+LOW_SNR_DB = 10.0             # Flag low SNR below this
+
+
+def measure_audio(samples: np.ndarray, sample_rate: int) -> Dict[str, Any]:
+    """
+    Measure speech span, clipping and SNR of decoded samples.
+
+    Args:
+        samples (np.ndarray): Mono int16 samples
+        sample_rate (int): Sample rate in Hz
+
+    Returns:
+        Dict[str, Any]: duration_ms, speech_span, speech_ms, peak_dbfs, clipping_ratio and snr_db
+    """
+    vad = EnergyVAD(sample_rate=sample_rate)
+    energy_db, _ = frame_features(samples, vad.frame_length)
+    vad.process(samples)
+    span = vad.speech_span()
+
+    duration_ms = int(1000 * len(samples) / sample_rate) if sample_rate else 0
+    peak_dbfs = float(energy_db.max()) if energy_db.size else -100.0
+    clipping_ratio = float(np.count_nonzero(np.abs(samples.astype(np.int32)) >= CLIPPING_LEVEL) / len(samples)) if len(samples) else 0.0
+
+    snr_db = None
+    if span is not None and energy_db.size:
+        speech = vad.classify(energy_db, np.zeros_like(energy_db))
+        if speech.any() and (~speech).any():
+            # Mean power ratio between speech and non-speech frames
+            speech_power = np.mean(10 ** (energy_db[speech] / 10))
+            noise_power = np.mean(10 ** (energy_db[~speech] / 10))
+            snr_db = round(float(10 * np.log10(speech_power / noise_power)), 1)
+
+    speech_ms = 0
+    if span is not None:
+        # Speech length is measured without the VAD padding; the padded span is only for trimming
+        speech_end = min(vad.speech_end, len(samples))
+        speech_ms = int(1000 * (speech_end - vad.speech_start) / sample_rate)
+        span = (span[0], min(span[1], len(samples)))
+
+    return {
+        "duration_ms": duration_ms,
+        "speech_span": span,
+        "speech_ms": speech_ms,
+        "peak_dbfs": round(peak_dbfs, 1),
+        "clipping_ratio": round(clipping_ratio, 5),
+        "snr_db": snr_db,
+    }
+
+
+def precheck_audio(audio_bytes: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Check a clip before it is sent to a paid provider and trim it to the speech span.
+
+    Args:
+        audio_bytes (bytes): Audio file content
+
+    Returns:
+        Optional[Dict[str, Any]]: audio_bytes (trimmed 16 kHz mono WAV) plus quality metrics and
+        warnings, or None if the clip could not be decoded locally and should be sent as-is
+
+    Raises:
+        HTTPException: 422 if the clip is empty, silent or too short
+    """
+    decoded = decode_audio(audio_bytes, PROVIDER_SAMPLE_RATE)
+    if decoded is None:
+        print("⚠️ Audio precheck skipped: format not decodable locally")
+        return None
+
+    samples, sample_rate = decoded
+    if len(samples) == 0:
+        raise HTTPException(status_code=422, detail="Audio is empty")
+
+    metrics = measure_audio(samples, sample_rate)
+
+    if metrics["peak_dbfs"] < SILENCE_PEAK_DBFS or metrics["speech_span"] is None:
+        raise HTTPException(status_code=422, detail="No speech detected in audio")
+    if metrics["speech_ms"] < MIN_SPEECH_MS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Audio too short: {metrics['speech_ms']} ms of speech (minimum {MIN_SPEECH_MS} ms)"
+        )
+
+    warnings = []
+    if metrics["clipping_ratio"] > CLIPPING_RATIO_WARN:
+        warnings.append("clipping")
+    if metrics["snr_db"] is not None and metrics["snr_db"] < LOW_SNR_DB:
+        warnings.append("low_snr")
+
+    start, end = metrics.pop("speech_span")
+    trimmed = encode_wav(samples[start:end], sample_rate)
+
+    print(
+        f"🔎 Audio precheck: {metrics['duration_ms']} ms -> {metrics['speech_ms']} ms speech, "
+        f"{len(audio_bytes)} -> {len(trimmed)} bytes"
+        + (f", warnings: {', '.join(warnings)}" if warnings else "")
+    )
+
+    return {
+        "audio_bytes": trimmed,
+        "sample_rate": sample_rate,
+        "original_bytes": len(audio_bytes),
+        "warnings": warnings,
+        **metrics,
+    }
+
+
+def audio_quality_summary(precheck_result: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Client-facing subset of a precheck result (without the audio itself).
+
+    Args:
+        precheck_result: Result of precheck_audio, or None
+
+    Returns:
+        Optional[Dict[str, Any]]: Quality metrics and warnings, or None if the clip was not checked
+    """
+    if not precheck_result:
+        return None
+    return {key: value for key, value in precheck_result.items() if key != "audio_bytes"}
+
+
+# Test section
+if __name__ == "__main__":
+    rng = np.random.default_rng(1)
+    sr = 16000
+    t = np.arange(sr) / sr
+    tone = 8000 * np.sin(2 * np.pi * 200 * t)
+    padded = np.concatenate((rng.normal(0, 40, 2 * sr), tone, rng.normal(0, 40, 2 * sr))).astype(np.int16)
+
+    print("🧪 Testing precheck_audio with 2 s of silence on each side...")
+    result = precheck_audio(encode_wav(padded, sr))
+    print(f"Speech: {result['speech_ms']} ms, SNR: {result['snr_db']} dB, warnings: {result['warnings']}")
+
+    print("\n🧪 Testing precheck_audio with a clipped recording...")
+    clipped = np.clip(padded.astype(np.int32) * 8, -32768, 32767).astype(np.int16)
+    print(f"Warnings: {precheck_audio(encode_wav(clipped, sr))['warnings']}")
+
+    for label, clip in [("empty", b""), ("silent", encode_wav(rng.normal(0, 5, sr).astype(np.int16), sr))]:
+        try:
+            precheck_audio(clip)
+            print(f"❌ {label} clip was not rejected")
+        except HTTPException as e:
+            print(f"✅ {label} clip rejected: {e.status_code} {e.detail}")
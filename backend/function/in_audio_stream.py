@@ -0,0 +1,406 @@
+"""
+Streaming audio helpers: preallocated ring buffer, energy/zero-crossing VAD and WAV encoding.
+
+Used by the pronunciation WebSocket to detect the end of an utterance while the
+learner is still speaking, so scoring can start the moment they stop talking.
+"""
+
+import io
+import os
+import wave
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+# Audio format expected on the WebSocket: little-endian signed 16-bit mono PCM
+DEFAULT_SAMPLE_RATE = 16000
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 48000
+FRAME_MS = 20
+
+# Longest a stream may stay open before an endpoint (seconds), speech or not
+STREAM_MAX_SECONDS = float(os.getenv("AUDIO_STREAM_MAX_SECONDS", 60))
+
+
+def parse_sample_rate(value: Any) -> int:
+    """
+    Validate a client-supplied sample rate.
+
+    Args:
+        value: Sample rate from the stream config (int or numeric string)
+
+    Returns:
+        int: Sample rate in Hz
+
+    Raises:
+        ValueError: If the value is not an integer between MIN_SAMPLE_RATE and MAX_SAMPLE_RATE
+    """
+    try:
+        sample_rate = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"sample_rate must be an integer, got {value!r}")
+    if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+        raise ValueError(f"sample_rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE} Hz")
+    return sample_rate
+
+
+class AudioRingBuffer:
+    """Fixed-capacity int16 ring buffer addressed by absolute sample position."""
+
+    def __init__(self, capacity_samples: int):
+        """
+        Preallocate the buffer.
+
+        Args:
+            capacity_samples: Maximum number of samples kept in memory
+        """
+        self.capacity = int(capacity_samples)
+        self._data = np.zeros(self.capacity, dtype=np.int16)
+        self.total_written = 0  # Absolute number of samples written since creation
+
+    @property
+    def oldest_position(self) -> int:
+        """Absolute position of the oldest sample still held in the buffer."""
+        return max(0, self.total_written - self.capacity)
+
+    def write(self, samples: np.ndarray) -> None:
+        """
+        Append samples, overwriting the oldest ones once the buffer is full.
+
+        Args:
+            samples: int16 samples to append
+        """
+        samples = np.asarray(samples, dtype=np.int16)
+        if samples.size >= self.capacity:
+            # Only the tail fits; keep the write position consistent with total_written
+            self.total_written += samples.size - self.capacity
+            samples = samples[-self.capacity:]
+
+        start = self.total_written % self.capacity
+        end = start + samples.size
+        if end <= self.capacity:
+            self._data[start:end] = samples
+        else:
+            split = self.capacity - start
+            self._data[start:] = samples[:split]
+            self._data[:end - self.capacity] = samples[split:]
+        self.total_written += samples.size
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        """
+        Copy the samples between two absolute positions.
+
+        Args:
+            start: Absolute start position (clamped to the oldest held sample)
+            end: Absolute end position (clamped to the newest sample)
+
+        Returns:
+            np.ndarray: int16 samples in chronological order
+        """
+        start = max(start, self.oldest_position)
+        end = min(end, self.total_written)
+        if end <= start:
+            return np.zeros(0, dtype=np.int16)
+
+        first = start % self.capacity
+        last = first + (end - start)
+        if last <= self.capacity:
+            return self._data[first:last].copy()
+        return np.concatenate((self._data[first:], self._data[:last - self.capacity]))
+
+    def clear(self) -> None:
+        """Forget all buffered audio without reallocating."""
+        self.total_written = 0
+
+
+def frame_features(samples: np.ndarray, frame_length: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute per-frame energy (dBFS) and zero-crossing rate for whole frames.
+
+    Args:
+        samples: int16 or float samples; a trailing partial frame is ignored
+        frame_length: Number of samples per frame
+
+    Returns:
+        Tuple of (energy_db, zero_crossing_rate) arrays, one value per frame
+    """
+    n_frames = len(samples) // frame_length
+    if n_frames == 0:
+        return np.zeros(0), np.zeros(0)
+
+    frames = np.asarray(samples[:n_frames * frame_length], dtype=np.float32).reshape(n_frames, frame_length)
+    if np.issubdtype(np.asarray(samples).dtype, np.integer):
+        frames /= 32768.0
+
+    energy = np.mean(frames * frames, axis=1)
+    energy_db = 10.0 * np.log10(energy + 1e-10)
+
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / float(frame_length - 1)
+    return energy_db, zcr
+
+
+class EnergyVAD:
+    """
+    Voice activity detector with an adaptive noise floor.
+
+    A frame counts as speech when its energy is well above the noise floor, or
+    moderately above it with a zero-crossing rate typical of fricatives
+    ("s", "ch", "f"), which are quiet but noisy. The end of the utterance is
+    reported after enough speech followed by a run of trailing silence.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = DEFAULT_SAMPLE_RATE,
+        frame_ms: int = FRAME_MS,
+        speech_margin_db: float = 12.0,
+        fricative_margin_db: float = 6.0,
+        fricative_zcr: Tuple[float, float] = (0.25, 0.65),
+        min_speech_ms: int = 200,
+        hangover_ms: int = 700,
+        pad_ms: int = 150,
+        initial_noise_floor_db: float = -60.0,
+        max_noise_floor_db: float = -40.0,
+    ):
+        """
+        Initialize the detector.
+
+        Args:
+            sample_rate: Sample rate of the incoming audio
+            frame_ms: Analysis frame size in milliseconds
+            speech_margin_db: Energy above the noise floor that marks speech
+            fricative_margin_db: Smaller margin accepted when the ZCR looks like a fricative
+            fricative_zcr: Zero-crossing rate range treated as fricative noise
+            min_speech_ms: Speech needed before an endpoint can be reported
+            hangover_ms: Trailing silence that ends the utterance
+            pad_ms: Audio kept around the detected speech span when trimming
+            initial_noise_floor_db: Noise floor used before any audio is seen
+            max_noise_floor_db: Upper bound on the floor, so a take that starts mid-word isn't mistaken for noise
+        """
+        self.sample_rate = sample_rate
+        self.frame_length = int(sample_rate * frame_ms / 1000)
+        self.speech_margin_db = speech_margin_db
+        self.fricative_margin_db = fricative_margin_db
+        self.fricative_zcr = fricative_zcr
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.pad_samples = int(sample_rate * pad_ms / 1000)
+        self.initial_noise_floor_db = initial_noise_floor_db
+        self.max_noise_floor_db = max_noise_floor_db
+        self.reset()
+
+    def reset(self) -> None:
+        """Reset detection state for a new utterance."""
+        self.noise_floor_db = None
+        self.frames_seen = 0
+        self.speech_frames = 0
+        self.trailing_silence = 0
+        self.speech_start: Optional[int] = None  # Absolute sample position
+        self.speech_end: Optional[int] = None
+        self._pending = np.zeros(0, dtype=np.int16)
+        self._pending_start = 0
+
+    def classify(self, energy_db: np.ndarray, zcr: np.ndarray) -> np.ndarray:
+        """
+        Label frames as speech/non-speech against the current noise floor.
+
+        Args:
+            energy_db: Per-frame energy in dBFS
+            zcr: Per-frame zero-crossing rate
+
+        Returns:
+            np.ndarray: Boolean mask, True for speech frames
+        """
+        floor = self.noise_floor_db if self.noise_floor_db is not None else self.initial_noise_floor_db
+        loud = energy_db > floor + self.speech_margin_db
+        fricative = (
+            (energy_db > floor + self.fricative_margin_db)
+            & (zcr >= self.fricative_zcr[0])
+            & (zcr <= self.fricative_zcr[1])
+        )
+        return loud | fricative
+
+    def process(self, samples: np.ndarray) -> bool:
+        """
+        Feed new samples and update the utterance state.
+
+        Args:
+            samples: int16 samples, contiguous with the previous call
+
+        Returns:
+            bool: True once the end of the utterance has been detected
+        """
+        samples = np.concatenate((self._pending, np.asarray(samples, dtype=np.int16)))
+        energy_db, zcr = frame_features(samples, self.frame_length)
+        consumed = len(energy_db) * self.frame_length
+        frame_origin = self._pending_start
+        self._pending = samples[consumed:]
+        self._pending_start += consumed
+
+        if len(energy_db) == 0:
+            return self.is_endpoint()
+
+        if self.noise_floor_db is None:
+            # Bootstrap the floor from the quietest frames of the first chunk
+            self.noise_floor_db = min(float(np.percentile(energy_db, 10)), self.max_noise_floor_db)
+
+        speech = self.classify(energy_db, zcr)
+
+        # Track the noise floor slowly on non-speech frames only
+        quiet = energy_db[~speech]
+        if quiet.size:
+            updated = 0.95 * self.noise_floor_db + 0.05 * float(np.median(quiet))
+            self.noise_floor_db = min(updated, self.max_noise_floor_db)
+
+        speech_idx = np.flatnonzero(speech)
+        if speech_idx.size:
+            if self.speech_start is None:
+                self.speech_start = frame_origin + int(speech_idx[0]) * self.frame_length
+            self.speech_end = frame_origin + (int(speech_idx[-1]) + 1) * self.frame_length
+            self.speech_frames += int(speech_idx.size)
+            self.trailing_silence = len(speech) - 1 - int(speech_idx[-1])
+        elif self.speech_start is not None:
+            self.trailing_silence += len(speech)
+
+        self.frames_seen += len(speech)
+        return self.is_endpoint()
+
+    def is_endpoint(self) -> bool:
+        """Whether enough speech was followed by enough silence."""
+        return (
+            self.speech_start is not None
+            and self.speech_frames >= self.min_speech_frames
+            and self.trailing_silence >= self.hangover_frames
+        )
+
+    def speech_span(self) -> Optional[Tuple[int, int]]:
+        """
+        Absolute sample span of the detected speech, padded on both sides.
+
+        Returns:
+            Optional[Tuple[int, int]]: (start, end) positions, or None if no speech was heard
+        """
+        if self.speech_start is None or self.speech_end is None:
+            return None
+        return max(0, self.speech_start - self.pad_samples), self.speech_end + self.pad_samples
+
+
+def pcm16_from_bytes(payload: bytes) -> np.ndarray:
+    """
+    Interpret a binary WebSocket frame as little-endian int16 samples.
+
+    Args:
+        payload: Raw PCM bytes; a trailing odd byte is dropped
+
+    Returns:
+        np.ndarray: int16 samples
+    """
+    usable = len(payload) - (len(payload) % 2)
+    return np.frombuffer(payload[:usable], dtype="<i2").astype(np.int16, copy=False)
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int = DEFAULT_SAMPLE_RATE) -> bytes:
+    """
+    Encode mono int16 samples as an in-memory WAV file.
+
+    Args:
+        samples: int16 samples
+        sample_rate: Sample rate in Hz
+
+    Returns:
+        bytes: Complete WAV file
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(np.asarray(samples, dtype="<i2").tobytes())
+    return buffer.getvalue()
+
+
+class UtteranceEndpointer:
+    """Ring buffer plus VAD: collects a live stream and returns the trimmed utterance."""
+
+    def __init__(self, sample_rate: int = DEFAULT_SAMPLE_RATE, max_seconds: float = 30.0, **vad_options):
+        """
+        Initialize the endpointer.
+
+        Args:
+            sample_rate: Sample rate of the incoming audio
+            max_seconds: Ring buffer capacity; reaching it forces an endpoint
+            **vad_options: Extra keyword arguments forwarded to EnergyVAD
+        """
+        self.sample_rate = sample_rate
+        self.buffer = AudioRingBuffer(int(sample_rate * max_seconds))
+        self.vad = EnergyVAD(sample_rate=sample_rate, **vad_options)
+
+    def feed(self, payload: bytes) -> bool:
+        """
+        Buffer a binary PCM frame and run the VAD on it.
+
+        Args:
+            payload: Raw little-endian int16 PCM bytes
+
+        Returns:
+            bool: True when the utterance is over (silence or full buffer)
+        """
+        samples = pcm16_from_bytes(payload)
+        if samples.size == 0:
+            return False
+        self.buffer.write(samples)
+        endpoint = self.vad.process(samples)
+
+        # Don't let speech start slide out of the buffer: stop at capacity
+        span = self.vad.speech_span()
+        buffer_full = span is not None and self.buffer.total_written - span[0] >= self.buffer.capacity
+        return endpoint or buffer_full
+
+    def utterance_samples(self) -> np.ndarray:
+        """
+        Samples of the detected utterance, trimmed of leading/trailing silence.
+
+        Returns:
+            np.ndarray: int16 samples (empty if no speech was detected)
+        """
+        span = self.vad.speech_span()
+        if span is None:
+            return np.zeros(0, dtype=np.int16)
+        return self.buffer.read(*span)
+
+    def utterance_wav(self) -> bytes:
+        """Trimmed utterance encoded as a WAV file."""
+        return encode_wav(self.utterance_samples(), self.sample_rate)
+
+    def duration_ms(self) -> int:
+        """Duration of the trimmed utterance in milliseconds."""
+        return int(1000 * len(self.utterance_samples()) / self.sample_rate)
+
+    def reset(self) -> None:
+        """Prepare for the next utterance on the same connection."""
+        self.buffer.clear()
+        self.vad.reset()
+
+
+# Test section
+if __name__ == "__main__":
+    # Synthetic take: 0.5 s room noise, 1.2 s "speech", 1 s silence
+    rng = np.random.default_rng(0)
+    sr = DEFAULT_SAMPLE_RATE
+    noise = rng.normal(0, 30, int(0.5 * sr))
+    t = np.arange(int(1.2 * sr)) / sr
+    speech = 6000 * np.sin(2 * np.pi * 220 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t))
+    silence = rng.normal(0, 30, int(1.0 * sr))
+    take = np.concatenate((noise, speech, silence)).astype(np.int16)
+
+    endpointer = UtteranceEndpointer(sr)
+    chunk = int(0.1 * sr)  # Client sends 100 ms frames
+    for offset in range(0, len(take), chunk):
+        if endpointer.feed(take[offset:offset + chunk].tobytes()):
+            print(f"✅ Endpoint detected after {(offset + chunk) / sr:.2f}s of audio")
+            break
+    else:
+        print("❌ No endpoint detected")
+
+    print(f"Trimmed utterance: {endpointer.duration_ms()} ms, {len(endpointer.utterance_wav())} WAV bytes")
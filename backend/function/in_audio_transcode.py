@@ -0,0 +1,298 @@
+"""
+Audio format sniffing and normalization to the provider-preferred format (16 kHz mono PCM WAV).
+
+Browsers upload webm/opus, 48 kHz stereo WAV or mp3. The container is detected
+from magic bytes rather than trusted from the filename or content type, and
+CPU-bound conversion runs in a process pool so it never blocks the event loop.
+"""
+
+import asyncio
+import io
+import os
+import shutil
+import subprocess
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .in_audio_stream import encode_wav
+except ImportError:
+    from in_audio_stream import encode_wav
+
+# Provider-preferred format
+PROVIDER_SAMPLE_RATE = 16000
+
+# Container -> (file extension, MIME type)
+AUDIO_FORMATS = {
+    "wav": ("wav", "audio/wav"),
+    "webm": ("webm", "audio/webm"),
+    "ogg": ("ogg", "audio/ogg"),
+    "mp3": ("mp3", "audio/mpeg"),
+    "mp4": ("m4a", "audio/mp4"),
+    "flac": ("flac", "audio/flac"),
+    "aac": ("aac", "audio/aac"),
+}
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def sniff_audio_format(audio_bytes: bytes) -> Optional[str]:
+    """
+    Detect the audio container from its magic bytes.
+
+    Args:
+        audio_bytes (bytes): Audio file content
+
+    Returns:
+        Optional[str]: One of the AUDIO_FORMATS keys, or None if unrecognized
+    """
+    head = audio_bytes[:64]
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"\x1a\x45\xdf\xa3":  # EBML header (webm / matroska)
+        return "webm"
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[:4] == b"fLaC":
+        return "flac"
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    if head[:3] == b"ID3":
+        return "mp3"
+    if len(head) >= 2 and head[0] == 0xFF:
+        if head[1] & 0xF6 == 0xF0:  # ADTS sync word, layer bits 00
+            return "aac"
+        if head[1] & 0xE0 == 0xE0:  # MPEG audio frame sync
+            return "mp3"
+    return None
+
+
+def audio_file_info(audio_bytes: bytes, default: str = "wav") -> Tuple[str, str]:
+    """
+    File extension and MIME type matching the actual container.
+
+    Args:
+        audio_bytes (bytes): Audio file content
+        default (str): Format assumed when sniffing fails (default: "wav")
+
+    Returns:
+        Tuple[str, str]: (extension, mime_type)
+    """
+    return AUDIO_FORMATS[sniff_audio_format(audio_bytes) or default]
+
+
+def _decode_wav(audio_bytes: bytes) -> Optional[Tuple[np.ndarray, int]]:
+    """Decode PCM WAV to mono int16 samples; None if not a readable PCM WAV."""
+    try:
+        with wave.open(io.BytesIO(audio_bytes), "rb") as wav_file:
+            channels = wav_file.getnchannels()
+            sample_width = wav_file.getsampwidth()
+            sample_rate = wav_file.getframerate()
+            raw = wav_file.readframes(wav_file.getnframes())
+    except (wave.Error, EOFError):
+        return None
+
+    if sample_width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.int16) - 128) << 8
+    elif sample_width == 2:
+        samples = np.frombuffer(raw, dtype="<i2")
+    elif sample_width == 3:
+        # Keep the two most significant bytes of each 24-bit sample
+        samples = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)[:, 1:].copy().view("<i2").ravel()
+    elif sample_width == 4:
+        samples = (np.frombuffer(raw, dtype="<i4") >> 16).astype(np.int16)
+    else:
+        return None
+
+    if channels > 1:
+        usable = len(samples) - (len(samples) % channels)
+        samples = samples[:usable].reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return np.asarray(samples, dtype=np.int16), sample_rate
+
+
+def _decode_with_ffmpeg(audio_bytes: bytes, sample_rate: int) -> Optional[Tuple[np.ndarray, int]]:
+    """Decode any container ffmpeg understands to mono int16; None if unavailable."""
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return None
+    try:
+        process = subprocess.run(
+            [ffmpeg, "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+             "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"],
+            input=audio_bytes,
+            capture_output=True,
+            timeout=30,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"⚠️ ffmpeg decode failed: {e}")
+        return None
+    if process.returncode != 0:
+        print(f"⚠️ ffmpeg decode failed: {process.stderr.decode(errors='ignore').strip()}")
+        return None
+    return np.frombuffer(process.stdout, dtype="<i2").astype(np.int16), sample_rate
+
+
+def resample(samples: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """
+    Resample mono int16 audio with a windowed-sinc low-pass and linear interpolation.
+
+    Args:
+        samples (np.ndarray): Mono int16 samples
+        source_rate (int): Input sample rate in Hz
+        target_rate (int): Output sample rate in Hz
+
+    Returns:
+        np.ndarray: Resampled int16 samples
+    """
+    if source_rate == target_rate or len(samples) == 0:
+        return samples
+
+    signal = samples.astype(np.float32)
+    if target_rate < source_rate:
+        # Anti-aliasing filter below the new Nyquist frequency
+        cutoff = 0.45 * target_rate / source_rate
+        taps = np.arange(-32, 33)
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(len(taps))
+        signal = np.convolve(signal, kernel / kernel.sum(), mode="same")
+
+    n_out = int(round(len(signal) * target_rate / source_rate))
+    positions = np.arange(n_out) * (source_rate / target_rate)
+    resampled = np.interp(positions, np.arange(len(signal)), signal)
+    return np.clip(np.round(resampled), -32768, 32767).astype(np.int16)
+
+
+def decode_audio(audio_bytes: bytes, target_rate: Optional[int] = None) -> Optional[Tuple[np.ndarray, int]]:
+    """
+    Decode an audio clip to mono int16 samples.
+
+    Args:
+        audio_bytes (bytes): Audio file content (WAV natively, other formats via ffmpeg)
+        target_rate (Optional[int]): Resample to this rate if given
+
+    Returns:
+        Optional[Tuple[np.ndarray, int]]: (samples, sample_rate), or None if the clip can't be decoded here
+    """
+    if not audio_bytes:
+        return np.zeros(0, dtype=np.int16), target_rate or PROVIDER_SAMPLE_RATE
+
+    decoded = _decode_wav(audio_bytes)
+    if decoded is None:
+        return _decode_with_ffmpeg(audio_bytes, target_rate or PROVIDER_SAMPLE_RATE)
+
+    samples, sample_rate = decoded
+    if target_rate and sample_rate != target_rate:
+        samples, sample_rate = resample(samples, sample_rate, target_rate), target_rate
+    return samples, sample_rate
+
+
+def transcode_audio(audio_bytes: bytes) -> Dict[str, Any]:
+    """
+    Convert a clip to 16 kHz mono PCM WAV.
+
+    Args:
+        audio_bytes (bytes): Audio file content in any supported container
+
+    Returns:
+        Dict[str, Any]: audio_bytes, extension, content_type, source_format, transcoded flag and
+        timings. When the clip can't be decoded here, the original bytes are returned with the
+        extension/content type of their real container.
+    """
+    start = time.perf_counter()
+    source_format = sniff_audio_format(audio_bytes)
+    decoded = decode_audio(audio_bytes, PROVIDER_SAMPLE_RATE) if audio_bytes else None
+
+    if decoded is None:
+        extension, content_type = AUDIO_FORMATS[source_format or "wav"]
+        output, transcoded = audio_bytes, False
+    else:
+        extension, content_type = AUDIO_FORMATS["wav"]
+        output, transcoded = encode_wav(decoded[0], PROVIDER_SAMPLE_RATE), True
+
+    return {
+        "audio_bytes": output,
+        "extension": extension,
+        "content_type": content_type,
+        "source_format": source_format,
+        "transcoded": transcoded,
+        "original_bytes": len(audio_bytes),
+        "output_bytes": len(output),
+        "transcode_ms": round(1000 * (time.perf_counter() - start), 1),
+    }
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Create the shared transcoding process pool on first use."""
+    global _process_pool
+    if _process_pool is None:
+        workers = int(os.getenv("AUDIO_TRANSCODE_WORKERS", min(4, os.cpu_count() or 1)))
+        _process_pool = ProcessPoolExecutor(max_workers=max(1, workers))
+    return _process_pool
+
+
+def transcode_audio_in_pool(audio_bytes: bytes) -> Dict[str, Any]:
+    """
+    Run transcode_audio in the process pool and wait for it (for sync callers in worker threads).
+
+    Args:
+        audio_bytes (bytes): Audio file content
+
+    Returns:
+        Dict[str, Any]: Same as transcode_audio
+    """
+    return _get_process_pool().submit(transcode_audio, audio_bytes).result()
+
+
+async def transcode_audio_async(audio_bytes: bytes) -> Dict[str, Any]:
+    """
+    Run transcode_audio in the process pool without blocking the event loop.
+
+    Args:
+        audio_bytes (bytes): Audio file content
+
+    Returns:
+        Dict[str, Any]: Same as transcode_audio
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_process_pool(), transcode_audio, audio_bytes)
+
+
+# Benchmark section
+if __name__ == "__main__":
+    uplink_kbps = 1000  # Typical mobile uplink used to estimate upload time saved
+
+    print("🧪 Benchmarking 48 kHz stereo WAV -> 16 kHz mono WAV")
+    print(f"Upload time estimated at {uplink_kbps} kbit/s")
+    print("-" * 78)
+    print(f"{'clip':>6} {'in bytes':>10} {'out bytes':>10} {'saved':>10} {'transcode ms':>13} {'net ms saved':>13}")
+
+    rng = np.random.default_rng(0)
+    for seconds in (2, 5, 10, 20):
+        n = 48000 * seconds
+        t = np.arange(n) / 48000
+        voice = 5000 * np.sin(2 * np.pi * 180 * t) + rng.normal(0, 200, n)
+        stereo = np.stack((voice, voice * 0.9), axis=1).astype("<i2")
+
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav_file:
+            wav_file.setnchannels(2)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(48000)
+            wav_file.writeframes(stereo.tobytes())
+        clip = buffer.getvalue()
+
+        result = transcode_audio(clip)
+        saved = result["original_bytes"] - result["output_bytes"]
+        upload_ms_saved = 1000 * saved * 8 / (uplink_kbps * 1000)
+        print(
+            f"{seconds:>5}s {result['original_bytes']:>10} {result['output_bytes']:>10} {saved:>10} "
+            f"{result['transcode_ms']:>13} {upload_ms_saved - result['transcode_ms']:>13.0f}"
+        )
+
+    print("-" * 78)
+    for label, sample in [("webm", b"\x1a\x45\xdf\xa3" + b"\x00" * 8), ("ogg", b"OggS" + b"\x00" * 8),
+                          ("mp3", b"ID3" + b"\x00" * 8), ("m4a", b"\x00\x00\x00\x20ftypM4A ")]:
+        print(f"Sniffed {label}: {audio_file_info(sample)}")
@@ -0,0 +1,227 @@
+"""
+Persistent key/value cache backed by SQLite, with TTL and size-bounded LRU eviction.
+
+One database file holds several namespaces (SpeechAce results, LLM outputs...),
+each with its own TTL, size limit and hit/miss statistics.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+try:
+    from .in_metrics import increment
+except ImportError:
+    from in_metrics import increment
+
+DEFAULT_CACHE_PATH = Path(__file__).parent.parent / "data" / "cache.sqlite3"
+
+_connection: Optional[sqlite3.Connection] = None
+# Serializes every use of the shared connection (and cache creation) across namespaces and threads
+_db_lock = threading.RLock()
+_caches: Dict[str, "PersistentCache"] = {}
+
+
+def _get_connection() -> sqlite3.Connection:
+    """Open the shared cache database on first use (callers hold _db_lock)."""
+    global _connection
+    with _db_lock:
+        if _connection is None:
+            path = Path(os.getenv("CACHE_DB_PATH", DEFAULT_CACHE_PATH))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _connection = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+            _connection.execute("PRAGMA journal_mode=WAL")
+            _connection.execute("PRAGMA synchronous=NORMAL")
+            _connection.execute(
+                """CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )"""
+            )
+            _connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_lru ON cache_entries (namespace, last_access)"
+            )
+        return _connection
+
+
+class PersistentCache:
+    """A namespace in the shared cache database."""
+
+    def __init__(self, namespace: str, ttl_seconds: float, max_entries: int, max_bytes: Optional[int] = None):
+        """
+        Initialize the cache namespace.
+
+        Args:
+            namespace: Name isolating these entries from other caches
+            ttl_seconds: Lifetime of an entry after it is written
+            max_entries: Maximum number of entries kept (least recently used are evicted)
+            max_bytes: Optional limit on the total size of stored values
+        """
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Look up a value.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cached value, or None on a miss or expired entry
+        """
+        now = time.time()
+        with _db_lock:
+            connection = _get_connection()
+            row = connection.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+
+            if row is None or row[1] < now:
+                if row is not None:
+                    connection.execute(
+                        "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key)
+                    )
+                self.misses += 1
+                increment(f"cache.{self.namespace}.misses")
+                return None
+
+            connection.execute(
+                "UPDATE cache_entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+            self.hits += 1
+            increment(f"cache.{self.namespace}.hits")
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Store a JSON-serializable value and evict old entries if over the limits.
+
+        Args:
+            key: Cache key
+            value: Value to store
+        """
+        payload = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with _db_lock:
+            connection = _get_connection()
+            connection.execute(
+                """INSERT OR REPLACE INTO cache_entries
+                   (namespace, key, value, size, created_at, expires_at, last_access)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (self.namespace, key, payload, len(payload), now, now + self.ttl_seconds, now),
+            )
+            self._evict(connection, now)
+
+    def delete(self, key: str) -> None:
+        """Remove a single entry."""
+        with _db_lock:
+            _get_connection().execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key)
+            )
+
+    def clear(self) -> None:
+        """Remove every entry of this namespace."""
+        with _db_lock:
+            _get_connection().execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> None:
+        """Drop expired entries, then least recently used ones until under the limits."""
+        connection.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at < ?", (self.namespace, now)
+        )
+        count, total_bytes = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?",
+            (self.namespace,),
+        ).fetchone()
+
+        excess = max(0, count - self.max_entries)
+        if self.max_bytes is not None and total_bytes > self.max_bytes:
+            # Walk the LRU order until enough bytes are freed
+            freed, extra = 0, 0
+            for (size,) in connection.execute(
+                "SELECT size FROM cache_entries WHERE namespace = ? ORDER BY last_access ASC",
+                (self.namespace,),
+            ):
+                if total_bytes - freed <= self.max_bytes:
+                    break
+                freed += size
+                extra += 1
+            excess = max(excess, extra)
+
+        if excess:
+            connection.execute(
+                """DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                       SELECT key FROM cache_entries WHERE namespace = ?
+                       ORDER BY last_access ASC LIMIT ?)""",
+                (self.namespace, self.namespace, excess),
+            )
+            self.evictions += excess
+            increment(f"cache.{self.namespace}.evictions", excess)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Hit-rate and size statistics for this namespace.
+
+        Returns:
+            Dict[str, Any]: hits, misses, hit_rate, evictions, entries and bytes
+        """
+        with _db_lock:
+            count, total_bytes = _get_connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?",
+                (self.namespace,),
+            ).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": count,
+                "bytes": total_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "max_entries": self.max_entries,
+            }
+
+
+def get_cache(namespace: str, ttl_seconds: float, max_entries: int, max_bytes: Optional[int] = None) -> PersistentCache:
+    """
+    Return the cache for a namespace, creating it on first use.
+
+    Args:
+        namespace (str): Cache namespace
+        ttl_seconds (float): Entry lifetime
+        max_entries (int): Maximum number of entries
+        max_bytes (Optional[int]): Optional limit on stored bytes
+
+    Returns:
+        PersistentCache: The shared cache instance for this namespace
+    """
+    with _db_lock:
+        if namespace not in _caches:
+            _caches[namespace] = PersistentCache(namespace, ttl_seconds, max_entries, max_bytes)
+        return _caches[namespace]
+
+
+def all_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Statistics of every cache namespace used by this process."""
+    with _db_lock:
+        caches = list(_caches.items())
+    return {namespace: cache.stats() for namespace, cache in caches}
@@ -0,0 +1,116 @@
+"""
+In-process metrics registry: counters and latency/size observations.
+
+Exposed through the /api/metrics endpoint.
+"""
+
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+# Number of recent observations kept per metric for percentiles
+WINDOW_SIZE = 500
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_observations: Dict[str, deque] = defaultdict(lambda: deque(maxlen=WINDOW_SIZE))
+_totals: Dict[str, list] = defaultdict(lambda: [0, 0.0])  # name -> [count, sum]
+
+
+def increment(name: str, value: float = 1) -> None:
+    """
+    Add to a counter.
+
+    Args:
+        name (str): Metric name, dot-separated (e.g. "speechace.api_calls")
+        value (float): Amount to add (default: 1)
+    """
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name: str, value: float) -> None:
+    """
+    Record one observation (latency in ms, token count, bytes...).
+
+    Args:
+        name (str): Metric name
+        value (float): Observed value
+    """
+    with _lock:
+        _observations[name].append(value)
+        totals = _totals[name]
+        totals[0] += 1
+        totals[1] += value
+
+
+@contextmanager
+def timer(name: str) -> Iterator[None]:
+    """
+    Observe the duration of a block in milliseconds.
+
+    Args:
+        name (str): Metric name
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, 1000 * (time.perf_counter() - start))
+
+
+def percentile(name: str, q: float) -> float:
+    """
+    Percentile of the recent observations of a metric.
+
+    Args:
+        name (str): Metric name
+        q (float): Percentile between 0 and 100
+
+    Returns:
+        float: The percentile, or 0.0 if nothing was observed yet
+    """
+    with _lock:
+        values = sorted(_observations.get(name, ()))
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def snapshot() -> Dict[str, Any]:
+    """
+    Current value of every metric.
+
+    Returns:
+        Dict[str, Any]: counters plus count/avg/p50/p95/max for each observed metric
+    """
+    with _lock:
+        counters = dict(_counters)
+        observations = {name: sorted(values) for name, values in _observations.items()}
+        totals = {name: tuple(values) for name, values in _totals.items()}
+
+    summaries = {}
+    for name, values in observations.items():
+        if not values:
+            continue
+        count, total = totals[name]
+        summaries[name] = {
+            "count": count,
+            "avg": round(total / count, 2),
+            "p50": round(values[len(values) // 2], 2),
+            "p95": round(values[min(len(values) - 1, int(0.95 * len(values)))], 2),
+            "max": round(values[-1], 2),
+        }
+
+    return {"counters": counters, "observations": summaries}
+
+
+def reset() -> None:
+    """Clear all metrics."""
+    with _lock:
+        _counters.clear()
+        _observations.clear()
+        _totals.clear()
@@ -0,0 +1,66 @@
+"""
+In-process sliding-window rate limiter, keyed by client (e.g. IP address).
+
+Used to cap endpoints that spend provider credits per call.
+"""
+
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict
+
+try:
+    from .in_metrics import increment
+except ImportError:
+    from in_metrics import increment
+
+
+# Clients tracked before idle ones are pruned
+MAX_TRACKED_CLIENTS = 10000
+
+
+class RateLimiter:
+    """At most `limit` calls per client within any `window_seconds` window."""
+
+    def __init__(self, name: str, limit: int, window_seconds: float):
+        """
+        Initialize the limiter.
+
+        Args:
+            name: Metric name prefix ("ratelimit.<name>.rejected")
+            limit: Calls allowed per window (0 disables the limit)
+            window_seconds: Window length in seconds
+        """
+        self.name = name
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._calls: Dict[str, deque] = defaultdict(deque)
+
+    def allow(self, client: str) -> bool:
+        """
+        Record a call for a client if it is within its limit.
+
+        Args:
+            client: Client key
+
+        Returns:
+            bool: True if the call is allowed, False if the client is over the limit
+        """
+        if self.limit <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            calls = self._calls[client]
+            while calls and calls[0] <= now - self.window_seconds:
+                calls.popleft()
+            if len(calls) >= self.limit:
+                increment(f"ratelimit.{self.name}.rejected")
+                return False
+            calls.append(now)
+            # Forget clients with no call inside the window so the table doesn't grow without bound
+            if len(self._calls) > MAX_TRACKED_CLIENTS:
+                cutoff = now - self.window_seconds
+                for key in [key for key, value in self._calls.items() if value[-1] <= cutoff]:
+                    del self._calls[key]
+            return True
@@ -0,0 +1,363 @@
+"""
+Recording store: sharded on-disk layout with an indexed SQLite manifest and retention.
+
+Recordings are written to <root>/<first two hex chars of the UUID>/<uuid>.<ext>, so
+no directory grows past a few hundred files. The manifest holds size, duration,
+SHA-256 and creation time, which makes listing a paginated index query instead of
+a directory scan. A background thread deletes recordings older than the retention
+age and the oldest ones while the total size is over budget.
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+import wave
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Union
+
+try:
+    from .in_audio_transcode import AUDIO_FORMATS, sniff_audio_format
+    from .in_metrics import increment
+except ImportError:
+    from in_audio_transcode import AUDIO_FORMATS, sniff_audio_format
+    from in_metrics import increment
+
+DEFAULT_RECORDINGS_DIR = Path(__file__).parent.parent / "data" / "recordings"
+# Flat directories used before the store existed (the old AudioHandler default)
+LEGACY_RECORDINGS_DIRS = (Path(__file__).parent.parent / "core" / "data" / "recordings",)
+
+RECORDINGS_MAX_AGE_DAYS = float(os.getenv("RECORDINGS_MAX_AGE_DAYS", 30))
+RECORDINGS_MAX_BYTES = int(os.getenv("RECORDINGS_MAX_BYTES", 1024 * 1024 * 1024))  # 1 GB
+RECORDINGS_GC_INTERVAL = float(os.getenv("RECORDINGS_GC_INTERVAL", 600))            # seconds between GC passes
+
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".m4a", ".ogg", ".webm"}
+SHARD_WIDTH = 2  # hex characters of the UUID used as bucket name (256 buckets)
+
+
+def _wav_duration(audio_bytes: bytes) -> Optional[float]:
+    """Duration in seconds read from a WAV header, None for other containers."""
+    try:
+        with wave.open(io.BytesIO(audio_bytes), "rb") as wav_file:
+            return round(wav_file.getnframes() / float(wav_file.getframerate()), 3)
+    except (wave.Error, EOFError, ZeroDivisionError):
+        return None
+
+
+class RecordingStore:
+    """Sharded recording directory indexed by a SQLite manifest."""
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        max_age_days: float = RECORDINGS_MAX_AGE_DAYS,
+        max_bytes: int = RECORDINGS_MAX_BYTES,
+        legacy_dirs: Iterable[Union[str, Path]] = ()
+    ):
+        """
+        Open (or create) the store and index any recordings left in the flat legacy layout.
+
+        Args:
+            root: Recordings directory
+            max_age_days: Recordings older than this are deleted by gc() (0 disables)
+            max_bytes: Oldest recordings are deleted while the total exceeds this (0 disables)
+            legacy_dirs: Other flat directories whose recordings are moved into the store
+        """
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._gc_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self._connection = sqlite3.connect(str(self.root / "manifest.sqlite3"), check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS recordings (
+                id TEXT PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                extension TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                duration REAL,
+                sha256 TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )"""
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_recordings_created ON recordings (created_at)")
+        self._import_flat_files(self.root)
+        for legacy_dir in legacy_dirs:
+            legacy_dir = Path(legacy_dir).resolve()
+            if legacy_dir != self.root and legacy_dir.is_dir():
+                self._import_flat_files(legacy_dir)
+
+    def _shard_path(self, recording_id: str, extension: str) -> Path:
+        return self.root / recording_id[:SHARD_WIDTH] / f"{recording_id}.{extension}"
+
+    def _insert(self, recording_id: str, path: Path, audio_bytes: bytes, extension: str, created_at: float) -> Dict[str, Any]:
+        record = {
+            "id": recording_id,
+            "path": str(path),
+            "extension": extension,
+            "size": len(audio_bytes),
+            "duration": _wav_duration(audio_bytes) if extension == "wav" else None,
+            "sha256": hashlib.sha256(audio_bytes).hexdigest(),
+            "created_at": created_at,
+        }
+        with self._lock:
+            self._connection.execute(
+                """INSERT OR REPLACE INTO recordings (id, path, extension, size, duration, sha256, created_at)
+                   VALUES (:id, :path, :extension, :size, :duration, :sha256, :created_at)""",
+                record,
+            )
+        return record
+
+    def _import_flat_files(self, directory: Path) -> None:
+        """Move recordings saved directly under a directory (pre-sharding layout) into their buckets."""
+        moved = 0
+        for file_path in directory.iterdir():
+            if not file_path.is_file() or file_path.suffix.lower() not in AUDIO_EXTENSIONS:
+                continue
+            recording_id = file_path.stem
+            try:
+                uuid.UUID(recording_id)
+            except ValueError:
+                recording_id = str(uuid.uuid4())
+            target = self._shard_path(recording_id, file_path.suffix.lower().lstrip("."))
+            target.parent.mkdir(exist_ok=True)
+            created_at = file_path.stat().st_mtime
+            shutil.move(str(file_path), str(target))
+            self._insert(recording_id, target, target.read_bytes(), target.suffix.lstrip("."), created_at)
+            moved += 1
+        if moved:
+            print(f"📁 Indexed {moved} recordings from the flat layout in {directory} into {self.root}")
+
+    def save(self, audio: Union[bytes, BinaryIO], extension: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Write a recording to its shard and index it.
+
+        Args:
+            audio: Audio bytes or a readable file object (rewound afterwards if seekable)
+            extension: File extension (sniffed from the content if None)
+
+        Returns:
+            Dict[str, Any]: Manifest record (id, path, extension, size, duration, sha256, created_at)
+
+        Raises:
+            ValueError: If the audio is empty
+        """
+        if isinstance(audio, (bytes, bytearray)):
+            audio_bytes = bytes(audio)
+        else:
+            audio_bytes = audio.read()
+            if hasattr(audio, "seek"):
+                audio.seek(0)
+        if not audio_bytes:
+            raise ValueError("Recording is empty")
+
+        extension = (extension or AUDIO_FORMATS.get(sniff_audio_format(audio_bytes) or "wav")[0]).lstrip(".").lower()
+        recording_id = str(uuid.uuid4())
+        path = self._shard_path(recording_id, extension)
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(audio_bytes)
+        increment("recordings.saved")
+        increment("recordings.bytes_written", len(audio_bytes))
+        return self._insert(recording_id, path, audio_bytes, extension, time.time())
+
+    def list_recordings(self, limit: int = 50, offset: int = 0, before: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Recordings, newest first.
+
+        Args:
+            limit: Page size
+            offset: Records to skip
+            before: Only recordings created before this timestamp (keyset cursor: pass the
+                created_at of the last record of the previous page)
+
+        Returns:
+            List[Dict[str, Any]]: Manifest records
+        """
+        query = "SELECT id, path, extension, size, duration, sha256, created_at FROM recordings"
+        params: list = []
+        if before is not None:
+            query += " WHERE created_at < ?"
+            params.append(before)
+        query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+        with self._lock:
+            rows = self._connection.execute(query, params).fetchall()
+        keys = ("id", "path", "extension", "size", "duration", "sha256", "created_at")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def get(self, recording_id: str) -> Optional[Dict[str, Any]]:
+        """Manifest record of a recording by id, or None."""
+        return self._get_where("id = ?", recording_id)
+
+    def get_by_path(self, path: Union[str, Path]) -> Optional[Dict[str, Any]]:
+        """Manifest record of a recording by file path, or None."""
+        return self._get_where("path = ?", str(Path(path).resolve()))
+
+    def _get_where(self, condition: str, value: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT id, path, extension, size, duration, sha256, created_at FROM recordings WHERE {condition}",
+                (value,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("id", "path", "extension", "size", "duration", "sha256", "created_at"), row))
+
+    def delete(self, recording_id: str) -> bool:
+        """
+        Delete a recording and its manifest entry.
+
+        Args:
+            recording_id: Recording UUID
+
+        Returns:
+            bool: True if the recording existed
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT path FROM recordings WHERE id = ?", (recording_id,)).fetchone()
+            if row is None:
+                return False
+            self._connection.execute("DELETE FROM recordings WHERE id = ?", (recording_id,))
+        try:
+            os.remove(row[0])
+        except FileNotFoundError:
+            pass
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Size of the store.
+
+        Returns:
+            Dict[str, Any]: recordings, bytes, oldest (timestamp) and the retention limits
+        """
+        with self._lock:
+            count, total_bytes, oldest = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(created_at) FROM recordings"
+            ).fetchone()
+        return {
+            "recordings": count,
+            "bytes": total_bytes,
+            "oldest": oldest,
+            "max_age_days": self.max_age_days,
+            "max_bytes": self.max_bytes,
+        }
+
+    def gc(self) -> Dict[str, int]:
+        """
+        Enforce the retention policy: drop expired recordings, then the oldest until under max_bytes.
+
+        Returns:
+            Dict[str, int]: deleted (count) and freed_bytes
+        """
+        victims = []
+        with self._lock:
+            if self.max_age_days:
+                cutoff = time.time() - self.max_age_days * 86400
+                victims.extend(self._connection.execute(
+                    "SELECT id, path, size FROM recordings WHERE created_at < ?", (cutoff,)
+                ).fetchall())
+            if self.max_bytes:
+                expired = {row[0] for row in victims}
+                total_bytes = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM recordings").fetchone()[0]
+                total_bytes -= sum(row[2] for row in victims)
+                if total_bytes > self.max_bytes:
+                    for row in self._connection.execute("SELECT id, path, size FROM recordings ORDER BY created_at ASC"):
+                        if total_bytes <= self.max_bytes:
+                            break
+                        if row[0] in expired:
+                            continue
+                        victims.append(row)
+                        total_bytes -= row[2]
+            if victims:
+                self._connection.executemany("DELETE FROM recordings WHERE id = ?", [(row[0],) for row in victims])
+
+        for _, path, _ in victims:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        freed = sum(row[2] for row in victims)
+        if victims:
+            increment("recordings.gc_deleted", len(victims))
+            increment("recordings.gc_freed_bytes", freed)
+            print(f"🧹 Recording GC: deleted {len(victims)} recordings ({freed} bytes)")
+        return {"deleted": len(victims), "freed_bytes": freed}
+
+    def start_gc(self, interval_seconds: float = RECORDINGS_GC_INTERVAL) -> None:
+        """Run gc() now and then every interval_seconds in a daemon thread (idempotent)."""
+        if self._gc_thread is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.gc()
+                except Exception as e:
+                    print(f"⚠️ Recording GC failed: {e}")
+                if self._stop.wait(interval_seconds):
+                    return
+
+        self._gc_thread = threading.Thread(target=loop, name="recordings-gc", daemon=True)
+        self._gc_thread.start()
+
+    def stop_gc(self) -> None:
+        """Stop the background GC thread."""
+        self._stop.set()
+
+
+_store: Optional[RecordingStore] = None
+_store_lock = threading.Lock()
+
+
+def get_recording_store() -> RecordingStore:
+    """
+    Shared recording store (RECORDINGS_DIR or backend/data/recordings), with background GC running.
+
+    Recordings in LEGACY_RECORDINGS_DIRS (the old backend/core/data/recordings) are moved in on first use.
+
+    Returns:
+        RecordingStore: The process-wide store
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RecordingStore(Path(os.getenv("RECORDINGS_DIR", DEFAULT_RECORDINGS_DIR)).resolve(), legacy_dirs=LEGACY_RECORDINGS_DIRS)
+            _store.start_gc()
+        return _store
+
+
+# Benchmark section
+if __name__ == "__main__":
+    import tempfile
+
+    try:
+        from .in_audio_stream import encode_wav
+    except ImportError:
+        from in_audio_stream import encode_wav
+    import numpy as np
+
+    clip = encode_wav(np.zeros(16000, dtype=np.int16), 16000)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = RecordingStore(tmp, max_age_days=0, max_bytes=len(clip) * 1500)
+
+        start = time.perf_counter()
+        for _ in range(2000):
+            store.save(clip, "wav")
+        print(f"✅ Saved 2000 recordings in {1000 * (time.perf_counter() - start):.0f} ms")
+
+        start = time.perf_counter()
+        for _ in range(100):
+            store.list_recordings(limit=20)
+        print(f"✅ Listed a page of 20 in {10 * (time.perf_counter() - start):.2f} ms")
+
+        print(f"🧹 GC: {store.gc()} -> {store.stats()}")
@@ -1,23 +1,37 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
+import asyncio
 import sys
 import os
+import json
+import time
+import uuid
 
 
 
 # Import required functions
 try:
     from sb_pref import save_preference, get_preferences
-    from sb_session import create_session, get_all_sessions, update_question_status, get_next_question
+    from sb_session import create_session, get_all_sessions, update_question_status, get_next_question, get_session_with_content, next_question_cursor, ensure_question_audio, prefetch_question_audio
     from sb_add_audio import save_audio_file
-    from sb_message import save_message, get_all_messages_from_session
-    from sa_analysis import analyze_pronunciation_from_url, create_simplified_analysis
+    from sb_message import save_message, get_all_messages_from_session, get_recent_messages
+    from sa_analysis import analyze_pronunciation_from_url, analyze_pronunciation_from_bytes, create_simplified_analysis, stream_simplified_analysis, get_word_feedback, record_analysis_latency, ANALYSIS_DETAIL_LEVELS
+    from in_audio_stream import UtteranceEndpointer, DEFAULT_SAMPLE_RATE, STREAM_MAX_SECONDS, parse_sample_rate
+    from in_audio_transcode import sniff_audio_format, transcode_audio_async, AUDIO_FORMATS
+    from in_metrics import snapshot as metrics_snapshot
+    from in_cache import all_cache_stats
+    from oa_routing import routing_snapshot
     from oa_generate_pronunciation_summary import generate_pronunciation_summary
     from sb_pronunciation import save_pronunciation_analysis, get_pronunciation_analyses, get_latest_pronunciation_analysis
-    from oa_generate_greeting import generate_greeting_message
+    from oa_generate_greeting import start_greeting, get_greeting, greeting_id_for
     from el_stt import speech_to_text
+    from el_tts import stream_text_to_audio, get_cached_audio_url, TTS_MAX_TEXT_CHARS
+    from in_rate_limit import RateLimiter
+    from el_client import negotiate_audio_format
     from oa_conversational import generate_conversational_response
 except ImportError as e:
     print(f"❌ Import error: {e}")
@@ -39,6 +53,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Uncached syntheses per client IP on the public streaming TTS endpoint
+tts_stream_limiter = RateLimiter(
+    "tts_stream",
+    int(os.getenv("TTS_STREAM_RATE_LIMIT", 20)),
+    float(os.getenv("TTS_STREAM_RATE_WINDOW", 60))
+)
+
 # Pydantic models
 class UserPreferenceRequest(BaseModel):
     learning: str
@@ -54,7 +75,9 @@ class CreateSessionRequest(BaseModel):
     mode: str = "repeat"
 
 class SessionResponse(BaseModel):
-    questions: List[Dict[str, str]]
+    questions: List[Dict[str, Any]]
+    session_id: Optional[str] = None
+    greeting: Optional[Dict[str, Any]] = None  # see /api/greeting/{greeting_id}
 
 # Health check endpoint
 @app.get("/")
@@ -68,6 +91,21 @@ async def health_check():
         "message": "API is operational"
     }
 
+# Metrics endpoint
+@app.get("/api/metrics")
+async def get_metrics():
+    """
+    Get in-process counters, latency observations, cache hit rates and LLM routing state.
+    """
+    return {
+        "success": True,
+        "data": {
+            "metrics": metrics_snapshot(),
+            "caches": all_cache_stats(),
+            "llm_routing": routing_snapshot()
+        }
+    }
+
 # Save user preferences endpoint
 @app.post("/api/save_preferences")
 async def save_user_preferences(request: UserPreferenceRequest):
@@ -98,9 +136,12 @@ async def save_user_preferences(request: UserPreferenceRequest):
 
 # Create session endpoint
 @app.post("/api/create_session", response_model=SessionResponse)
-async def create_learning_session(request: CreateSessionRequest):
+async def create_learning_session(request: CreateSessionRequest, http_request: Request):
     """
     Create a new learning session with questions and audio.
+    
+    Question audio is synthesized in the format negotiated from the client hints
+    (Sec-CH-UA-Mobile, Save-Data, ECT, Accept), or ?format=<profile> if given.
     """
     try:
         # Validate level
@@ -120,9 +161,12 @@ async def create_learning_session(request: CreateSessionRequest):
             )
         
         # Create session
-        questions = create_session(request.user_id, request.level, request.mode)
+        audio_format = negotiate_audio_format(http_request.headers, http_request.query_params.get("format"))
+        session_id = str(uuid.uuid4())
+        questions = await run_in_threadpool(create_session, request.user_id, request.level, request.mode, audio_format, session_id)
         
-        return SessionResponse(questions=questions)
+        # Started inside create_session: the template greeting, or the personalized one if already done
+        return SessionResponse(questions=questions, session_id=session_id, greeting=get_greeting(session_id))
         
     except HTTPException:
         raise
@@ -248,22 +292,27 @@ async def upload_audio(
         # Read file content
         audio_data = await file.read()
         
-        # Determine file extension from content type or filename
-        if file.content_type:
-            if 'wav' in file.content_type:
-                file_extension = 'wav'
-            elif 'mp3' in file.content_type:
-                file_extension = 'mp3'
-            elif 'mpeg' in file.content_type:
-                file_extension = 'mp3'
-            else:
-                # Fallback to filename extension
-                file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'mp3'
+        # Determine the real container from magic bytes rather than the declared type
+        original_size = len(audio_data)
+        source_format = sniff_audio_format(audio_data)
+        
+        if source_format == 'wav':
+            # Uncompressed uploads (often 48 kHz stereo) shrink a lot at 16 kHz mono
+            transcoded = await transcode_audio_async(audio_data)
+            if transcoded['transcoded'] and transcoded['output_bytes'] < original_size:
+                audio_data = transcoded['audio_bytes']
+            file_extension = 'wav'
+        elif source_format:
+            # Compressed uploads are kept as-is but stored under their real format
+            file_extension = AUDIO_FORMATS[source_format][0]
+        elif file.content_type and 'wav' in file.content_type:
+            file_extension = 'wav'
         else:
-            file_extension = 'mp3'
+            # Fallback to filename extension
+            file_extension = file.filename.split('.')[-1] if file.filename and '.' in file.filename else 'mp3'
         
         print(f"Uploading audio file: {file.filename} ({file.content_type})")
-        print(f"File size: {len(audio_data)} bytes")
+        print(f"File size: {original_size} bytes -> {len(audio_data)} bytes stored as {file_extension}")
         print(f"User ID: {user_id}")
         print(f"Session ID: {session_id}")
         
@@ -283,6 +332,8 @@ async def upload_audio(
                 "audio_url": public_url,
                 "filename": file.filename,
                 "file_size": len(audio_data),
+                "original_file_size": original_size,
+                "format": file_extension,
                 "content_type": file.content_type,
                 "user_id": user_id,
                 "session_id": session_id
@@ -294,6 +345,53 @@ async def upload_audio(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading audio: {str(e)}")
 
+# Streaming text-to-speech endpoint
+@app.get("/api/tts/stream")
+async def stream_tts(
+    request: Request,
+    text: str = Query(..., max_length=TTS_MAX_TEXT_CHARS),
+    voice_id: Optional[str] = None,
+    format: Optional[str] = None
+):
+    """
+    Stream synthesized speech as the provider produces it, for use directly as an <audio> source.
+    
+    The output format is negotiated from the client hints unless ?format=<profile> is given.
+    Clips synthesized before are served from storage (redirect); new clips are uploaded
+    in the background once streaming completes. New syntheses are rate-limited per client
+    (TTS_STREAM_RATE_LIMIT per TTS_STREAM_RATE_WINDOW seconds), and text is capped at
+    TTS_MAX_TEXT_CHARS characters.
+    """
+    if not text.strip():
+        raise HTTPException(status_code=422, detail="Text is required")
+    
+    audio_format = negotiate_audio_format(request.headers, format)
+    negotiation_headers = {
+        "Accept-CH": "Sec-CH-UA-Mobile, Save-Data, ECT",
+        "Vary": "Accept, Sec-CH-UA, Sec-CH-UA-Mobile, Save-Data, ECT",
+        "X-Audio-Format": audio_format
+    }
+    
+    cached_url = await run_in_threadpool(get_cached_audio_url, text, voice_id, audio_format)
+    if cached_url:
+        return RedirectResponse(cached_url, headers=negotiation_headers)
+    
+    client = request.client.host if request.client else "unknown"
+    if not tts_stream_limiter.allow(client):
+        raise HTTPException(status_code=429, detail="Too many speech synthesis requests, try again later")
+    
+    # Opening the stream waits for the first chunk, so keep it off the event loop
+    speech = await run_in_threadpool(stream_text_to_audio, text, voice_id, audio_format)
+    if not speech:
+        raise HTTPException(status_code=502, detail="No speech provider could synthesize the text")
+    
+    return StreamingResponse(
+        speech["chunks"],
+        media_type=speech["content_type"],
+        headers={**negotiation_headers, "Cache-Control": "no-store", "X-TTS-Backend": speech["backend"],
+                 "X-Audio-Format": speech["format"]}
+    )
+
 
 # Message Management Endpoints
 
@@ -309,6 +407,16 @@ class PronunciationAnalysisRequest(BaseModel):
     session_id: str
     analysis_language: str = "fr-fr"
     native_language: str = "en"
+    stream: Optional[str] = None  # "sse" or "ndjson" to stream scores and word feedback as they are ready
+    word_feedback: bool = True  # False: no LLM feedback, words keep their phones for /api/word_feedback
+    detail: str = "full"  # "scores", "rules" or "full" (see analyze_pronunciation_endpoint)
+
+class WordFeedbackRequest(BaseModel):
+    word: str
+    quality_score: float
+    phones: Dict[str, Dict[str, Any]] = {}
+    overall_score: int = 0
+    native_language: str = "en"
 
 class SavePronunciationAnalysisRequest(BaseModel):
     user_id: str
@@ -321,6 +429,8 @@ class GenerateGreetingRequest(BaseModel):
     learning_language: str
     session_content: list
     level: str
+    session_id: Optional[str] = None  # greeting id to poll; derived from the other fields if missing
+    personalize: bool = True
 
 class SpeechToTextRequest(BaseModel):
     audio_url: str
@@ -389,18 +499,100 @@ async def get_messages_from_session(session_id: str):
         raise HTTPException(status_code=500, detail=f"Error retrieving messages: {str(e)}")
 
 
+ANALYSIS_STREAM_TYPES = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _analysis_stream_format(request: PronunciationAnalysisRequest, http_request: Request) -> Optional[str]:
+    """Streaming format requested through the body or the Accept header, if any."""
+    if request.stream:
+        if request.stream not in ANALYSIS_STREAM_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unsupported stream format: {request.stream}")
+        return request.stream
+    accept = http_request.headers.get("accept", "")
+    for stream_format, content_type in ANALYSIS_STREAM_TYPES.items():
+        if content_type in accept:
+            return stream_format
+    return None
+
+
+def _analysis_payload(simplified_analysis: Dict[str, Any], analysis_result: Dict[str, Any], native_language: str, detail: str) -> Dict[str, Any]:
+    """
+    Result payload of an analysis, with the summary for its detail level.
+    
+    Only "full" calls the LLM for the summary; "rules" uses the default messages and
+    "scores" has none. The summary is built from the full analysis, whose word phones
+    refine the summary cache key.
+    """
+    summary_data = generate_pronunciation_summary(analysis_result, native_language) if detail == "full" else {}
+    return {
+        "analysis": simplified_analysis,
+        "summary": summary_data.get("summary", "Great job! Let's continue with the next question.") if detail != "scores" else None,
+        "next_question_prompt": summary_data.get("next_question_prompt", "Please provide the next question for the user to practice.") if detail != "scores" else None,
+        "audio_quality": analysis_result.get("audio_quality"),
+        "detail": detail
+    }
+
+
+def _analysis_events(analysis_result: Dict[str, Any], native_language: str, stream_format: str, detail: str = "full", word_detail: str = "full", started: Optional[float] = None):
+    """
+    Encode the analysis events for a streaming response.
+    
+    Yields "scores", one "word_feedback" per word, then "result" with the same payload as
+    the non-streaming endpoint (the summary is generated once all word feedback is in).
+    """
+    def encode(event: str, data: Any) -> str:
+        if stream_format == "sse":
+            return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        return json.dumps({"type": event, "data": data}, ensure_ascii=False) + "\n"
+    
+    try:
+        simplified_analysis = None
+        for item in stream_simplified_analysis(analysis_result, native_language, word_detail):
+            if item["event"] == "analysis":
+                simplified_analysis = item["data"]
+            else:
+                yield encode(item["event"], item["data"])
+        
+        yield encode("result", _analysis_payload(simplified_analysis, analysis_result, native_language, detail))
+        if started is not None:
+            record_analysis_latency(detail, 1000 * (time.perf_counter() - started))
+    except Exception as e:
+        # Headers are already sent: report the failure in-band
+        print(f"❌ Error streaming pronunciation analysis: {e}")
+        yield encode("error", {"detail": f"Error analyzing pronunciation: {str(e)}"})
+
+
 @app.post("/api/analyze_pronunciation")
-async def analyze_pronunciation_endpoint(request: PronunciationAnalysisRequest):
+async def analyze_pronunciation_endpoint(request: PronunciationAnalysisRequest, http_request: Request):
     """
     Analyze pronunciation and generate summary with next question prompt.
+    
+    "detail" selects the cost of the analysis:
+    - "scores": SpeechAce scores only (words keep their phones, no summary)
+    - "rules": plus score-band word feedback computed locally
+    - "full": plus LLM word feedback and summary
+    
+    With "stream": "sse" / "ndjson" in the body (or an Accept header of text/event-stream /
+    application/x-ndjson), the SpeechAce scores are sent as soon as they are available, then
+    each word's feedback as the LLM completes it, then the full result.
     """
     try:
-        print(f"🎯 Analyzing pronunciation for session: {request.session_id}")
+        started = time.perf_counter()
+        if request.detail not in ANALYSIS_DETAIL_LEVELS:
+            raise HTTPException(status_code=400, detail=f"Invalid detail. Must be one of: {list(ANALYSIS_DETAIL_LEVELS)}")
+        stream_format = _analysis_stream_format(request, http_request)
+        word_detail = request.detail if request.word_feedback else "scores"
+
+        print(f"🎯 Analyzing pronunciation for session: {request.session_id} (detail: {request.detail})")
         print(f"Audio URL: {request.audio_url}")
         print(f"Target text: {request.target_text}")
         
-        # Perform pronunciation analysis
-        analysis_result = analyze_pronunciation_from_url(
+        # Perform pronunciation analysis (blocking I/O, off the event loop)
+        analysis_result = await run_in_threadpool(
+            analyze_pronunciation_from_url,
             audio_url=request.audio_url,
             target_text=request.target_text,
             analysis_language=request.analysis_language,
@@ -413,20 +605,28 @@ async def analyze_pronunciation_endpoint(request: PronunciationAnalysisRequest):
                 detail="Failed to analyze pronunciation"
             )
         
-        # Create simplified analysis with AI feedback
-        simplified_analysis = create_simplified_analysis(analysis_result, request.native_language)
+        if stream_format:
+            return StreamingResponse(
+                _analysis_events(analysis_result, request.native_language, stream_format, request.detail, word_detail, started),
+                media_type=ANALYSIS_STREAM_TYPES[stream_format],
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+        
+        # Create simplified analysis with the requested word feedback
+        simplified_analysis = await run_in_threadpool(
+            create_simplified_analysis, analysis_result, request.native_language, word_detail
+        )
         
         # Generate pronunciation summary and next question prompt
-        summary_data = generate_pronunciation_summary(simplified_analysis, request.native_language)
+        data = await run_in_threadpool(
+            _analysis_payload, simplified_analysis, analysis_result, request.native_language, request.detail
+        )
+        record_analysis_latency(request.detail, 1000 * (time.perf_counter() - started))
         
         return {
             "success": True,
             "message": "Pronunciation analysis completed",
-            "data": {
-                "analysis": simplified_analysis,
-                "summary": summary_data.get("summary", "Great job! Let's continue with the next question."),
-                "next_question_prompt": summary_data.get("next_question_prompt", "Please provide the next question for the user to practice.")
-            }
+            "data": data
         }
         
     except HTTPException:
@@ -435,6 +635,144 @@ async def analyze_pronunciation_endpoint(request: PronunciationAnalysisRequest):
         raise HTTPException(status_code=500, detail=f"Error analyzing pronunciation: {str(e)}")
 
 
+@app.post("/api/word_feedback")
+async def word_feedback_endpoint(request: WordFeedbackRequest):
+    """
+    Generate feedback for one word on demand, from its phone-level data.
+    
+    Meant for analyses requested with "word_feedback": false, when the learner opens a word.
+    """
+    try:
+        feedback = await run_in_threadpool(
+            get_word_feedback,
+            {"word": request.word, "quality_score": request.quality_score, "phones": request.phones},
+            request.overall_score,
+            request.native_language
+        )
+        
+        return {
+            "success": True,
+            "data": feedback
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating word feedback: {str(e)}")
+
+
+@app.websocket("/ws/analyze_pronunciation")
+async def analyze_pronunciation_stream(websocket: WebSocket):
+    """
+    Stream microphone audio and start scoring as soon as the learner stops talking.
+    
+    Protocol:
+    1. Client sends a JSON text frame: {"target_text", "analysis_language", "native_language", "sample_rate", "detail"}
+    2. Client streams binary frames of little-endian 16-bit mono PCM
+    3. Server detects the end of the utterance (or the client sends {"type": "end"}),
+       replies {"type": "endpoint"}, then {"type": "scores"} and finally {"type": "result"}
+       with the same payload as /api/analyze_pronunciation
+    
+    Streams without an endpoint after STREAM_MAX_SECONDS are closed with an error.
+    """
+    await websocket.accept()
+    
+    try:
+        config = await websocket.receive_json()
+        target_text = config.get('target_text')
+        analysis_language = config.get('analysis_language', 'fr-fr')
+        native_language = config.get('native_language', 'en')
+        detail = config.get('detail', 'full')
+        
+        if not target_text:
+            await websocket.send_json({"type": "error", "detail": "target_text is required"})
+            await websocket.close(code=1008)
+            return
+        if detail not in ANALYSIS_DETAIL_LEVELS:
+            await websocket.send_json({"type": "error", "detail": f"Invalid detail. Must be one of: {list(ANALYSIS_DETAIL_LEVELS)}"})
+            await websocket.close(code=1008)
+            return
+        
+        try:
+            sample_rate = parse_sample_rate(config.get('sample_rate', DEFAULT_SAMPLE_RATE))
+        except ValueError as e:
+            await websocket.send_json({"type": "error", "detail": str(e)})
+            await websocket.close(code=1008)
+            return
+        
+        endpointer = UtteranceEndpointer(sample_rate)
+        await websocket.send_json({"type": "ready"})
+        
+        # Buffer frames until the VAD reports the end of the utterance
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        while True:
+            try:
+                message = await asyncio.wait_for(websocket.receive(), timeout=max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                await websocket.send_json({"type": "error", "detail": f"No utterance endpoint within {STREAM_MAX_SECONDS:.0f} seconds"})
+                await websocket.close(code=1008)
+                return
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                if endpointer.feed(message["bytes"]):
+                    break
+            elif message.get("text") and json.loads(message["text"]).get("type") == "end":
+                break
+        
+        duration_ms = endpointer.duration_ms()
+        if duration_ms == 0:
+            await websocket.send_json({"type": "error", "detail": "No speech detected"})
+            await websocket.close()
+            return
+        
+        print(f"🎙️ Utterance endpoint detected ({duration_ms} ms), scoring: {target_text}")
+        await websocket.send_json({"type": "endpoint", "duration_ms": duration_ms})
+        started = time.perf_counter()
+        
+        # Score the trimmed clip right away
+        analysis_result = await run_in_threadpool(
+            analyze_pronunciation_from_bytes,
+            endpointer.utterance_wav(),
+            target_text,
+            analysis_language
+        )
+        
+        if not analysis_result:
+            await websocket.send_json({"type": "error", "detail": "Failed to analyze pronunciation"})
+            await websocket.close()
+            return
+        
+        await websocket.send_json({
+            "type": "scores",
+            "data": {
+                "overall_score": analysis_result.get('overall_score'),
+                "cefr_score": analysis_result.get('cefr_score', {}),
+                "word_analysis": analysis_result.get('word_analysis', []),
+                "audio_quality": analysis_result.get('audio_quality')
+            }
+        })
+        
+        # Same feedback and summary as the REST endpoint
+        simplified_analysis = await run_in_threadpool(create_simplified_analysis, analysis_result, native_language, detail)
+        data = await run_in_threadpool(_analysis_payload, simplified_analysis, analysis_result, native_language, detail)
+        record_analysis_latency(detail, 1000 * (time.perf_counter() - started))
+        
+        await websocket.send_json({"type": "result", "data": data})
+        await websocket.close()
+        
+    except WebSocketDisconnect:
+        print("🔌 Client disconnected during pronunciation stream")
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "status_code": e.status_code, "detail": e.detail})
+        await websocket.close()
+    except Exception as e:
+        print(f"❌ Error in pronunciation stream: {str(e)}")
+        try:
+            await websocket.send_json({"type": "error", "detail": f"Error analyzing pronunciation: {str(e)}"})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+
+
 @app.post("/api/update_question_status")
 async def update_question_status_endpoint(request: dict):
     """
@@ -476,7 +814,8 @@ async def get_next_question_endpoint(session_id: str):
     Get the next question that is not done in a session.
     """
     try:
-        next_question_data = get_next_question(session_id)
+        # May synthesize the question's deferred audio, so keep it off the event loop
+        next_question_data = await run_in_threadpool(get_next_question, session_id)
         
         if next_question_data:
             return {
@@ -494,6 +833,86 @@ async def get_next_question_endpoint(session_id: str):
         raise HTTPException(status_code=500, detail=f"Error getting next question: {str(e)}")
 
 
+async def _no_messages() -> Dict[str, Any]:
+    return {"messages": [], "has_more": False}
+
+
+async def _cursor_with_audio(session: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Next-question cursor of a session, with the question's audio ready and the following one prefetched."""
+    content = session.get('content') or []
+    cursor = next_question_cursor(content)
+    if not cursor:
+        return None
+    i = cursor['index']
+    if not cursor['question'].get('audio_url'):
+        cursor['question']['audio_url'] = await run_in_threadpool(ensure_question_audio, session['id'], i, cursor['question'])
+    if i + 1 < len(content):
+        prefetch_question_audio(session['id'], i + 1, content[i + 1])
+    return cursor
+
+
+@app.get("/api/bootstrap/{user_id}")
+async def bootstrap_endpoint(user_id: str, session_id: Optional[str] = None, messages_limit: int = 20):
+    """
+    Everything the client needs at startup, in one round trip.
+    
+    Preferences, the session header (latest session, or session_id), the next-question
+    cursor and the last messages_limit messages are read concurrently. With session_id all
+    reads start at once; otherwise the message tail waits for the latest session lookup.
+    """
+    try:
+        messages_limit = max(0, min(messages_limit, 100))
+        
+        def tail(sid: str):
+            return run_in_threadpool(get_recent_messages, sid, messages_limit) if messages_limit else _no_messages()
+        
+        reads = [
+            run_in_threadpool(get_preferences, user_id),
+            run_in_threadpool(get_session_with_content, user_id, session_id),
+        ]
+        if session_id:
+            reads.append(tail(session_id))
+        preferences, session, *known_tail = await asyncio.gather(*reads)
+        
+        if session_id and not session:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Session {session_id} not found for user {user_id}"
+            )
+        
+        cursor = None
+        recent = known_tail[0] if known_tail else await _no_messages()
+        if session:
+            if known_tail:
+                cursor = await _cursor_with_audio(session)
+            else:
+                cursor, recent = await asyncio.gather(_cursor_with_audio(session), tail(session['id']))
+        
+        content = (session or {}).get('content') or []
+        return {
+            "success": True,
+            "data": {
+                "preferences": preferences[0] if preferences else None,
+                "session": {
+                    "id": session['id'],
+                    "level": session.get('level'),
+                    "type": session.get('type'),
+                    "created_at": session.get('created_at'),
+                    "total_questions": len(content),
+                    "completed_questions": sum(1 for q in content if q.get('status') == 'done')
+                } if session else None,
+                "next_question": {"index": cursor['index'], "question": cursor['question']} if cursor else None,
+                "messages": recent['messages'],
+                "has_more_messages": recent['has_more']
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error bootstrapping session: {str(e)}")
+
+
 @app.post("/api/save_pronunciation_analysis")
 async def save_pronunciation_analysis_endpoint(request: SavePronunciationAnalysisRequest):
     """
@@ -570,28 +989,61 @@ async def get_latest_pronunciation_analysis_endpoint(user_id: str):
 @app.post("/api/generate_greeting")
 async def generate_greeting_endpoint(request: GenerateGreetingRequest):
     """
-    Generate a personalized greeting message for the learning session.
+    Greeting message for the learning session.
+    
+    Returns a template greeting instantly (or the personalized one if it is already cached);
+    the LLM-personalized version is generated in the background and fetched with
+    GET /api/greeting/{greeting_id}.
     """
     try:
-        greeting_message = generate_greeting_message(
+        greeting_id = request.session_id or greeting_id_for(
+            request.user_name, request.learning_language, request.session_content, request.level
+        )
+        # Cache I/O, and an inline LLM call for languages without a template: keep it off the event loop
+        greeting = await run_in_threadpool(
+            start_greeting,
+            greeting_id,
             user_name=request.user_name,
             learning_language=request.learning_language,
             session_content=request.session_content,
-            level=request.level
+            level=request.level,
+            personalize=request.personalize
         )
         
         return {
             "success": True,
             "message": "Greeting generated successfully",
-            "data": {
-                "greeting": greeting_message
-            }
+            "data": greeting
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating greeting: {str(e)}")
 
 
+@app.get("/api/greeting/{greeting_id}")
+async def get_greeting_endpoint(greeting_id: str, wait: float = 0):
+    """
+    Poll a session greeting.
+    
+    With ?wait=<seconds>, waits (up to GREETING_MAX_WAIT) for a pending personalization
+    before answering.
+    """
+    try:
+        greeting = await run_in_threadpool(get_greeting, greeting_id, wait)
+        if not greeting:
+            raise HTTPException(status_code=404, detail=f"Greeting {greeting_id} not found")
+        
+        return {
+            "success": True,
+            "data": greeting
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving greeting: {str(e)}")
+
+
 @app.post("/api/speech_to_text")
 async def speech_to_text_endpoint(request: SpeechToTextRequest):
     """
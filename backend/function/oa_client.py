@@ -0,0 +1,555 @@
+"""
+LLM gateway shared by every OpenAI call site.
+
+One pooled client (sync and async) per process, per-call timeouts, retries with
+jittered exponential backoff, token/latency accounting and tier-based model routing
+(see oa_routing).
+The backend is pluggable: LLM_BACKEND=local swaps OpenAI for a deterministic local
+model so the API can run without network access or an API key.
+
+chat_completion_json requests JSON-schema-constrained output and validates it, so
+a malformed response no longer wastes the whole paid call.
+
+chat_completion_stream yields content deltas as they are generated, so callers can
+start working on the first part of a long answer before the rest has arrived.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import openai
+from dotenv import load_dotenv
+
+try:
+    from .in_metrics import increment, observe
+    from .oa_json import json_schema_format, repair_json, validate_json
+    from .oa_routing import escalation_tier, record_tier_call, resolve_tier, routing_snapshot, tier_model
+except ImportError:
+    from in_metrics import increment, observe
+    from oa_json import json_schema_format, repair_json, validate_json
+    from oa_routing import escalation_tier, record_tier_call, resolve_tier, routing_snapshot, tier_model
+
+load_dotenv()
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 30))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8.0))
+LOCAL_STREAM_DELAY = float(os.getenv("LLM_LOCAL_STREAM_DELAY", 0))  # seconds per chunk, to mimic generation speed offline
+
+# Errors worth retrying: timeouts, connection resets, rate limits and 5xx
+RETRYABLE_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+
+class LLMError(Exception):
+    """Raised when an LLM call fails after all retries."""
+
+
+def resolve_model(route: str) -> str:
+    """
+    Model for the next call of a route.
+
+    Args:
+        route (str): Route name from the routing policy (see oa_routing)
+
+    Returns:
+        str: Model name
+    """
+    return resolve_tier(route)[1]
+
+
+class OpenAIBackend:
+    """OpenAI chat completions through shared, connection-pooled clients."""
+
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    def client(self) -> openai.OpenAI:
+        """Shared sync client (retries are handled by the gateway)."""
+        with self._lock:
+            if self._client is None:
+                self._client = openai.OpenAI(api_key=self.api_key, max_retries=0, timeout=LLM_TIMEOUT)
+            return self._client
+
+    def async_client(self) -> openai.AsyncOpenAI:
+        """Shared async client."""
+        with self._lock:
+            if self._async_client is None:
+                self._async_client = openai.AsyncOpenAI(api_key=self.api_key, max_retries=0, timeout=LLM_TIMEOUT)
+            return self._async_client
+
+    @staticmethod
+    def _result(response) -> Dict[str, Any]:
+        usage = getattr(response, "usage", None)
+        content = response.choices[0].message.content if response.choices else None
+        return {
+            "content": (content or "").strip(),
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        }
+
+    def complete(self, model: str, messages: List[Dict[str, str]], timeout: float, **params) -> Dict[str, Any]:
+        response = self.client().chat.completions.create(model=model, messages=messages, timeout=timeout, **params)
+        return self._result(response)
+
+    async def acomplete(self, model: str, messages: List[Dict[str, str]], timeout: float, **params) -> Dict[str, Any]:
+        response = await self.async_client().chat.completions.create(model=model, messages=messages, timeout=timeout, **params)
+        return self._result(response)
+
+    def stream(self, model: str, messages: List[Dict[str, str]], timeout: float, usage: Dict[str, int], **params) -> Iterator[str]:
+        """Yield content deltas; token counts are written into usage once the stream ends."""
+        response = self.client().chat.completions.create(
+            model=model, messages=messages, timeout=timeout, stream=True,
+            stream_options={"include_usage": True}, **params
+        )
+        for chunk in response:
+            if chunk.usage:
+                usage["prompt_tokens"] = chunk.usage.prompt_tokens or 0
+                usage["completion_tokens"] = chunk.usage.completion_tokens or 0
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+def _local_questions(messages: List[Dict[str, str]]) -> str:
+    return json.dumps({"content": [
+        {"learning": f"Phrase d'exercice numéro {i + 1}.", "native": f"Practice sentence number {i + 1}."}
+        for i in range(10)
+    ]}, ensure_ascii=False)
+
+
+def _local_questions_lite(messages: List[Dict[str, str]]) -> str:
+    return json.dumps({"content": [
+        {"fr": f"Question d'exercice numéro {i + 1} ?", "en": f"Practice question number {i + 1}?"}
+        for i in range(10)
+    ]}, ensure_ascii=False)
+
+
+def _local_word_feedback(messages: List[Dict[str, str]]) -> str:
+    # Echo the rows of the prompt's word table (id|word|score|... or word|score|...) back with a fixed tip
+    words = []
+    for line in messages[-1]["content"].splitlines():
+        cells = [cell.strip() for cell in line.split("|")]
+        if len(cells) >= 3 and cells[0].isdigit() and cells[2].isdigit():
+            words.append({"id": int(cells[0]), "word": cells[1], "quality_score": int(cells[2])})
+        elif len(cells) >= 2 and cells[1].isdigit():
+            words.append({"word": cells[0], "quality_score": int(cells[1])})
+    return json.dumps({"words": [
+        {**word, "ai_feedback": "Keep practicing this word slowly, syllable by syllable."}
+        for word in words
+    ]}, ensure_ascii=False)
+
+
+# Deterministic responses of the local backend, per route
+LOCAL_RESPONSES: Dict[str, Callable[[List[Dict[str, str]]], str]] = {
+    "questions": _local_questions,
+    "questions_lite": _local_questions_lite,
+    "greeting": lambda messages: "Bonjour! Je suis Madame AI, votre assistante Francoflex. Commençons la pratique de la prononciation!",
+    "conversation": lambda messages: json.dumps({
+        "learning": "Très bien, continuons la conversation.",
+        "native": "Very good, let's continue the conversation.",
+        "context": "conversational"
+    }, ensure_ascii=False),
+    "pronunciation_summary": lambda messages: json.dumps({
+        "summary": "Good effort! Your pronunciation is getting clearer.",
+        "next_question_prompt": "Well done, let's move on to the next question."
+    }),
+    "word_feedback": _local_word_feedback,
+    "word_tip": lambda messages: json.dumps({
+        "cheering_message": "Great effort! Keep practicing!",
+        "feedback": "Repeat the word slowly and focus on the sounds with the lowest scores."
+    }),
+    "syllable_feedback": lambda messages: "In your weakest syllable, slow down and exaggerate the target sound before blending it back in.",
+    "ai_answer": lambda messages: "Merci pour votre question. Voici une réponse concise en français.",
+}
+
+
+class LocalBackend:
+    """Deterministic offline model: same messages, same answer, no network."""
+
+    name = "local"
+
+    def is_configured(self) -> bool:
+        return True
+
+    def complete(self, model: str, messages: List[Dict[str, str]], timeout: float, route: str = "default", **params) -> Dict[str, Any]:
+        responder = LOCAL_RESPONSES.get(route)
+        if responder is not None:
+            content = responder(messages)
+        else:
+            digest = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+            content = f"local-response-{digest}"
+        prompt_tokens = sum(len(message.get("content", "")) for message in messages) // 4
+        return {"content": content, "prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4}
+
+    async def acomplete(self, model: str, messages: List[Dict[str, str]], timeout: float, **params) -> Dict[str, Any]:
+        return self.complete(model, messages, timeout, **params)
+
+    def stream(self, model: str, messages: List[Dict[str, str]], timeout: float, usage: Dict[str, int], **params) -> Iterator[str]:
+        result = self.complete(model, messages, timeout, **params)
+        usage.update(prompt_tokens=result["prompt_tokens"], completion_tokens=result["completion_tokens"])
+        content = result["content"]
+        for start in range(0, len(content), 16):
+            if LOCAL_STREAM_DELAY:
+                time.sleep(LOCAL_STREAM_DELAY)
+            yield content[start:start + 16]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    The process-wide LLM backend, chosen by LLM_BACKEND ("openai" or "local").
+
+    Returns:
+        OpenAIBackend or LocalBackend
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = LocalBackend() if os.getenv("LLM_BACKEND", "openai").lower() == "local" else OpenAIBackend()
+        return _backend
+
+
+def set_backend(backend) -> None:
+    """
+    Replace the LLM backend (e.g. LocalBackend() in tests).
+
+    Args:
+        backend: Object with is_configured, complete and acomplete
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def is_llm_configured() -> bool:
+    """Whether LLM calls can be made (API key set, or the local backend is active)."""
+    return get_backend().is_configured()
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+def _record(route: str, tier: str, model: str, result: Dict[str, Any], latency_ms: float) -> None:
+    """Token, latency and cost accounting for one successful call."""
+    increment("llm.calls")
+    increment(f"llm.{route}.calls")
+    increment("llm.prompt_tokens", result["prompt_tokens"])
+    increment("llm.completion_tokens", result["completion_tokens"])
+    increment(f"llm.{route}.tokens", result["prompt_tokens"] + result["completion_tokens"])
+    observe("llm.latency_ms", latency_ms)
+    observe(f"llm.{route}.latency_ms", latency_ms)
+    record_tier_call(route, tier, model, latency_ms, result["prompt_tokens"], result["completion_tokens"])
+    print(f"🤖 LLM {route} ({tier}/{model}): {latency_ms:.0f} ms, {result['prompt_tokens']}+{result['completion_tokens']} tokens")
+
+
+def _call_params(backend, route: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    if isinstance(backend, LocalBackend):
+        return {**params, "route": route}
+    return params
+
+
+def chat_completion(
+    route: str,
+    messages: List[Dict[str, str]],
+    timeout: Optional[float] = None,
+    max_retries: Optional[int] = None,
+    tier: Optional[str] = None,
+    **params
+) -> str:
+    """
+    Run a chat completion through the gateway.
+
+    Args:
+        route (str): Route name, selects the tier and model (see oa_routing)
+        messages (List[Dict[str, str]]): Chat messages
+        timeout (Optional[float]): Per-attempt timeout in seconds (default: LLM_TIMEOUT)
+        max_retries (Optional[int]): Retries on transient errors (default: LLM_MAX_RETRIES)
+        tier (Optional[str]): Force a tier instead of the route's policy
+        **params: Extra completion parameters (temperature, max_tokens, response_format...)
+
+    Returns:
+        str: The stripped message content
+
+    Raises:
+        LLMError: If the call fails after all retries
+    """
+    backend = get_backend()
+    resolved_tier, model = resolve_tier(route)
+    if tier is None:
+        tier = resolved_tier
+    elif tier != resolved_tier:
+        model = tier_model(tier)
+    model = params.pop("model", None) or model
+    timeout = timeout or LLM_TIMEOUT
+    retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        try:
+            result = backend.complete(model, messages, timeout, **_call_params(backend, route, params))
+        except RETRYABLE_ERRORS as e:
+            if attempt >= retries:
+                increment(f"llm.{route}.errors")
+                raise LLMError(f"{route} failed after {attempt + 1} attempts: {e}") from e
+            delay = _backoff_delay(attempt)
+            increment("llm.retries")
+            print(f"⚠️ LLM {route} attempt {attempt + 1} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+            continue
+        except Exception as e:
+            increment(f"llm.{route}.errors")
+            raise LLMError(f"{route} failed: {e}") from e
+
+        _record(route, tier, model, result, 1000 * (time.perf_counter() - start))
+        return result["content"]
+
+
+async def achat_completion(
+    route: str,
+    messages: List[Dict[str, str]],
+    timeout: Optional[float] = None,
+    max_retries: Optional[int] = None,
+    tier: Optional[str] = None,
+    **params
+) -> str:
+    """
+    Async version of chat_completion, using the shared async client.
+
+    Args:
+        route (str): Route name, selects the tier and model (see oa_routing)
+        messages (List[Dict[str, str]]): Chat messages
+        timeout (Optional[float]): Per-attempt timeout in seconds (default: LLM_TIMEOUT)
+        max_retries (Optional[int]): Retries on transient errors (default: LLM_MAX_RETRIES)
+        tier (Optional[str]): Force a tier instead of the route's policy
+        **params: Extra completion parameters
+
+    Returns:
+        str: The stripped message content
+
+    Raises:
+        LLMError: If the call fails after all retries
+    """
+    backend = get_backend()
+    resolved_tier, model = resolve_tier(route)
+    if tier is None:
+        tier = resolved_tier
+    elif tier != resolved_tier:
+        model = tier_model(tier)
+    model = params.pop("model", None) or model
+    timeout = timeout or LLM_TIMEOUT
+    retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        try:
+            result = await backend.acomplete(model, messages, timeout, **_call_params(backend, route, params))
+        except RETRYABLE_ERRORS as e:
+            if attempt >= retries:
+                increment(f"llm.{route}.errors")
+                raise LLMError(f"{route} failed after {attempt + 1} attempts: {e}") from e
+            delay = _backoff_delay(attempt)
+            increment("llm.retries")
+            print(f"⚠️ LLM {route} attempt {attempt + 1} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+        except Exception as e:
+            increment(f"llm.{route}.errors")
+            raise LLMError(f"{route} failed: {e}") from e
+
+        _record(route, tier, model, result, 1000 * (time.perf_counter() - start))
+        return result["content"]
+
+
+def chat_completion_stream(
+    route: str,
+    messages: List[Dict[str, str]],
+    timeout: Optional[float] = None,
+    max_retries: Optional[int] = None,
+    tier: Optional[str] = None,
+    **params
+) -> Iterator[str]:
+    """
+    Stream a chat completion through the gateway, yielding content deltas as they arrive.
+
+    Transient errors are retried only until the first delta has been yielded; after that
+    a failure is raised to the caller, who may already have consumed part of the answer.
+
+    Args:
+        route (str): Route name, selects the tier and model (see oa_routing)
+        messages (List[Dict[str, str]]): Chat messages
+        timeout (Optional[float]): Per-attempt timeout in seconds (default: LLM_TIMEOUT)
+        max_retries (Optional[int]): Retries before the first delta (default: LLM_MAX_RETRIES)
+        tier (Optional[str]): Force a tier instead of the route's policy
+        **params: Extra completion parameters (temperature, max_tokens, response_format...)
+
+    Yields:
+        str: Content deltas
+
+    Raises:
+        LLMError: If the call fails
+    """
+    backend = get_backend()
+    resolved_tier, model = resolve_tier(route)
+    if tier is None:
+        tier = resolved_tier
+    elif tier != resolved_tier:
+        model = tier_model(tier)
+    model = params.pop("model", None) or model
+    timeout = timeout or LLM_TIMEOUT
+    retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        usage = {"prompt_tokens": 0, "completion_tokens": 0}
+        received = []
+        try:
+            for delta in backend.stream(model, messages, timeout, usage, **_call_params(backend, route, params)):
+                if not received:
+                    observe(f"llm.{route}.first_token_ms", 1000 * (time.perf_counter() - start))
+                received.append(delta)
+                yield delta
+        except RETRYABLE_ERRORS as e:
+            if received or attempt >= retries:
+                increment(f"llm.{route}.errors")
+                raise LLMError(f"{route} stream failed after {attempt + 1} attempts: {e}") from e
+            delay = _backoff_delay(attempt)
+            increment("llm.retries")
+            print(f"⚠️ LLM {route} stream attempt {attempt + 1} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+            continue
+        except Exception as e:
+            increment(f"llm.{route}.errors")
+            raise LLMError(f"{route} stream failed: {e}") from e
+
+        _record(route, tier, model, {"content": "".join(received), **usage}, 1000 * (time.perf_counter() - start))
+        return
+
+
+def _decode_structured(route: str, content: str, schema: Dict[str, Any]) -> Any:
+    """Decode and validate structured output, recovering fenced or truncated JSON."""
+    try:
+        value = json.loads(content)
+    except json.JSONDecodeError:
+        value = None
+
+    if value is not None and not validate_json(value, schema):
+        increment("llm.json.valid")
+        return value
+
+    repaired = repair_json(content, schema)
+    if repaired is not None:
+        # The plain json.loads path would have failed this call
+        increment("llm.json.parse_failures_avoided")
+        increment(f"llm.{route}.parse_failures_avoided")
+        return repaired
+
+    increment("llm.json.parse_failures")
+    increment(f"llm.{route}.parse_failures")
+    errors = validate_json(value, schema) if value is not None else ["not valid JSON"]
+    raise LLMError(f"{route} returned invalid JSON: {'; '.join(errors[:3])}")
+
+
+def chat_completion_json(
+    route: str,
+    messages: List[Dict[str, str]],
+    schema: Dict[str, Any],
+    schema_name: Optional[str] = None,
+    **params
+) -> Any:
+    """
+    Run a chat completion constrained to a JSON schema and return the decoded value.
+
+    If the output fails validation, the call is retried once on the route's escalation tier.
+
+    Args:
+        route (str): Route name, selects the tier and model (see oa_routing)
+        messages (List[Dict[str, str]]): Chat messages
+        schema (Dict[str, Any]): Strict JSON schema (root object, all properties required)
+        schema_name (Optional[str]): Name of the schema (default: the route)
+        **params: Extra parameters for chat_completion
+
+    Returns:
+        Any: The validated JSON value
+
+    Raises:
+        LLMError: If the call fails or the output cannot be decoded into a valid value
+    """
+    response_format = json_schema_format(schema_name or route, schema)
+    tier, _ = resolve_tier(route)
+    content = chat_completion(route, messages, response_format=response_format, tier=tier, **params)
+    try:
+        return _decode_structured(route, content, schema)
+    except LLMError:
+        larger = escalation_tier(route, tier)
+        if not larger:
+            raise
+    increment(f"llm.{route}.escalations")
+    print(f"⬆️ LLM {route}: {tier} output failed validation, escalating to {larger}")
+    content = chat_completion(route, messages, response_format=response_format, tier=larger, **params)
+    return _decode_structured(route, content, schema)
+
+
+async def achat_completion_json(
+    route: str,
+    messages: List[Dict[str, str]],
+    schema: Dict[str, Any],
+    schema_name: Optional[str] = None,
+    **params
+) -> Any:
+    """
+    Async version of chat_completion_json.
+
+    Args:
+        route (str): Route name, selects the tier and model (see oa_routing)
+        messages (List[Dict[str, str]]): Chat messages
+        schema (Dict[str, Any]): Strict JSON schema
+        schema_name (Optional[str]): Name of the schema (default: the route)
+        **params: Extra parameters for achat_completion
+
+    Returns:
+        Any: The validated JSON value
+
+    Raises:
+        LLMError: If the call fails or the output cannot be decoded into a valid value
+    """
+    response_format = json_schema_format(schema_name or route, schema)
+    tier, _ = resolve_tier(route)
+    content = await achat_completion(route, messages, response_format=response_format, tier=tier, **params)
+    try:
+        return _decode_structured(route, content, schema)
+    except LLMError:
+        larger = escalation_tier(route, tier)
+        if not larger:
+            raise
+    increment(f"llm.{route}.escalations")
+    print(f"⬆️ LLM {route}: {tier} output failed validation, escalating to {larger}")
+    content = await achat_completion(route, messages, response_format=response_format, tier=larger, **params)
+    return _decode_structured(route, content, schema)
+
+
+# Test section
+if __name__ == "__main__":
+    set_backend(LocalBackend())
+    print("🧪 Testing chat_completion with the local backend...")
+    print(chat_completion("greeting", [{"role": "user", "content": "Bonjour"}]))
+    print(asyncio.run(achat_completion("ai_answer", [{"role": "user", "content": "Question?"}])))
+    print(f"Routing: {json.dumps(routing_snapshot(), indent=2)}")
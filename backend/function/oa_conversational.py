@@ -1,11 +1,26 @@
-import os
 import json
 from typing import Dict, Any, List
-import openai
 from dotenv import load_dotenv
 
+try:
+    from .oa_client import chat_completion_json, is_llm_configured
+except ImportError:
+    from oa_client import chat_completion_json, is_llm_configured
+
 load_dotenv()
 
+# Structured output schema for generate_conversational_response
+CONVERSATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "learning": {"type": "string"},
+        "native": {"type": "string"},
+        "context": {"type": "string"}
+    },
+    "required": ["learning", "native", "context"],
+    "additionalProperties": False
+}
+
 def generate_conversational_response(
     user_message: str, 
     conversation_history: List[Dict[str, str]], 
@@ -26,8 +41,7 @@ def generate_conversational_response(
     Returns:
         Dict[str, str]: Response with learning text, native translation, and context
     """
-    openai_api_key = os.getenv('OPENAI_API_KEY')
-    if not openai_api_key:
+    if not is_llm_configured():
         print("❌ OpenAI API key not configured for conversational response")
         return {
             "learning": "Désolé, je ne peux pas répondre en ce moment.",
@@ -35,8 +49,6 @@ def generate_conversational_response(
             "context": "system_error"
         }
     
-    client = openai.OpenAI(api_key=openai_api_key)
-    
     # Map language codes to full names
     language_map = {
         "fr": "French",
@@ -99,19 +111,17 @@ def generate_conversational_response(
     """
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4",
+        response_data = chat_completion_json(
+            "conversation",
             messages=[
                 {"role": "system", "content": f"You are Madame AI, a friendly French language learning assistant. Always respond with valid JSON only."},
                 {"role": "user", "content": prompt}
             ],
+            schema=CONVERSATION_SCHEMA,
             temperature=0.7,
             max_tokens=300
         )
         
-        ai_response_content = response.choices[0].message.content.strip()
-        response_data = json.loads(ai_response_content)
-        
         print(f"✅ Generated conversational response: {response_data.get('learning', '')}")
         return response_data
         
@@ -1,55 +1,161 @@
-import os
+"""
+Session greetings.
+
+A greeting is rendered instantly from a template in the learning language (name, level,
+session topics). The LLM-personalized version is generated in the background and cached
+per greeting id (the session id), where clients poll for it with get_greeting. Languages
+without a template get the LLM greeting inline instead.
+"""
+
+import hashlib
 import json
-from typing import Dict, Any
-import openai
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
 
+try:
+    from .in_cache import get_cache
+    from .in_metrics import increment
+    from .oa_client import chat_completion, is_llm_configured
+except ImportError:
+    from in_cache import get_cache
+    from in_metrics import increment
+    from oa_client import chat_completion, is_llm_configured
+
 load_dotenv()
 
-def generate_greeting_message(user_name: str, learning_language: str, session_content: list, level: str) -> str:
+GREETING_CACHE_TTL = float(os.getenv("GREETING_CACHE_TTL", 24 * 3600))
+GREETING_CACHE_MAX_ENTRIES = int(os.getenv("GREETING_CACHE_MAX_ENTRIES", 10000))
+GREETING_MAX_WAIT = float(os.getenv("GREETING_MAX_WAIT", 10))  # longest get_greeting wait (seconds)
+
+LANGUAGE_NAMES = {
+    "en": "English",
+    "fr": "French",
+    "es": "Spanish",
+    "de": "German",
+    "it": "Italian",
+    "pt": "Portuguese",
+    "nl": "Dutch",
+}
+
+# Language used when a greeting can be neither templated nor generated
+FALLBACK_GREETING_LANGUAGE = "fr"
+
+# Template greetings by learning language and level group ({name}, {topics})
+GREETING_TEMPLATES = {
+    "fr": {
+        "A": "Bonjour {name}! Je suis Madame AI, votre assistante Francoflex. Aujourd'hui, nous pratiquons la prononciation avec des phrases simples: {topics}. On commence?",
+        "B": "Bonjour {name}! Je suis Madame AI, votre assistante Francoflex. Aujourd'hui, nous allons travailler votre prononciation sur des phrases comme {topics}. Prêt(e) à commencer?",
+        "C": "Bonjour {name}! Je suis Madame AI, votre assistante Francoflex. Au programme aujourd'hui: une prononciation soignée sur des sujets exigeants, comme {topics}. Allons-y!",
+    },
+    "en": {
+        "A": "Hello {name}! I'm Madame AI, your Francoflex assistant. Today we'll practice pronunciation with simple sentences: {topics}. Shall we start?",
+        "B": "Hello {name}! I'm Madame AI, your Francoflex assistant. Today we'll work on your pronunciation with sentences like {topics}. Ready to begin?",
+        "C": "Hello {name}! I'm Madame AI, your Francoflex assistant. On today's agenda: polished pronunciation on demanding topics, such as {topics}. Let's go!",
+    },
+    "es": {
+        "A": "¡Hola {name}! Soy Madame AI, tu asistente de Francoflex. Hoy practicamos la pronunciación con frases sencillas: {topics}. ¿Empezamos?",
+        "B": "¡Hola {name}! Soy Madame AI, tu asistente de Francoflex. Hoy vamos a trabajar tu pronunciación con frases como {topics}. ¿Listo(a) para empezar?",
+        "C": "¡Hola {name}! Soy Madame AI, tu asistente de Francoflex. Hoy toca una pronunciación cuidada sobre temas exigentes, como {topics}. ¡Vamos!",
+    },
+    "de": {
+        "A": "Hallo {name}! Ich bin Madame AI, deine Francoflex-Assistentin. Heute üben wir die Aussprache mit einfachen Sätzen: {topics}. Wollen wir anfangen?",
+        "B": "Hallo {name}! Ich bin Madame AI, deine Francoflex-Assistentin. Heute arbeiten wir an deiner Aussprache mit Sätzen wie {topics}. Bereit?",
+        "C": "Hallo {name}! Ich bin Madame AI, deine Francoflex-Assistentin. Heute steht eine gepflegte Aussprache bei anspruchsvollen Themen auf dem Programm, etwa {topics}. Los geht's!",
+    },
+    "it": {
+        "A": "Ciao {name}! Sono Madame AI, la tua assistente Francoflex. Oggi pratichiamo la pronuncia con frasi semplici: {topics}. Cominciamo?",
+        "B": "Ciao {name}! Sono Madame AI, la tua assistente Francoflex. Oggi lavoriamo sulla tua pronuncia con frasi come {topics}. Pronto(a) a cominciare?",
+        "C": "Ciao {name}! Sono Madame AI, la tua assistente Francoflex. Oggi in programma: una pronuncia curata su temi impegnativi, come {topics}. Andiamo!",
+    },
+}
+
+# {topics} when the session has no questions to quote (e.g. conversational sessions)
+GREETING_DEFAULT_TOPICS = {
+    "fr": "des situations de votre quotidien professionnel",
+    "en": "situations from your working day",
+    "es": "situaciones de tu día a día profesional",
+    "de": "Situationen aus deinem Berufsalltag",
+    "it": "situazioni della tua giornata lavorativa",
+}
+
+_greeting_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="greeting")
+_greeting_lock = threading.Lock()
+_greetings_inflight: Dict[str, threading.Event] = {}
+
+
+def extract_session_topics(session_content: list, limit: int = 3) -> List[str]:
     """
-    Generate a personalized greeting message for the learning session.
-    
+    Short topic snippets (first 5 words) of the first questions of a session.
+
     Args:
-        user_name (str): The user's name
-        learning_language (str): The language being learned (e.g., "fr", "en", "es")
-        session_content (list): List of questions/topics in the session
-        level (str): The learning level (A1, A2, B1, B2, C1, C2)
-        
+        session_content (list): Session questions ({"learning": ...})
+        limit (int): Number of questions to use
+
     Returns:
-        str: Personalized greeting message in the learning language
+        List[str]: Topic snippets
     """
-    openai_api_key = os.getenv('OPENAI_API_KEY')
-    if not openai_api_key:
-        print("❌ OpenAI API key not configured for greeting generation")
-        return f"Bonjour {user_name}! Je suis Madame AI, votre assistante Francoflex. Commençons cette session d'apprentissage!"
-    
-    client = openai.OpenAI(api_key=openai_api_key)
-    
-    
-    
-    # Extract topics from session content
     topics = []
-    for item in session_content[:3]:  # Take first 3 topics
+    for item in session_content[:limit]:
         if isinstance(item, dict) and 'learning' in item:
-            # Extract key words from the learning sentence
-            sentence = item['learning']
-            # Simple word extraction (you can make this more sophisticated)
-            words = sentence.split()[:5]  # Take first 5 words
+            words = item['learning'].split()[:5]
             topics.append(' '.join(words))
-    
+    return topics
+
+
+def render_greeting(user_name: str, session_content: list, level: str, learning_language: str = "fr") -> Optional[str]:
+    """
+    Instant greeting from the templates, without an LLM call.
+
+    Args:
+        user_name (str): The user's name
+        session_content (list): Session questions
+        level (str): The learning level (A1 ... C2)
+        learning_language (str): The language being learned (e.g., "fr", "en", "es")
+
+    Returns:
+        Optional[str]: Greeting in the learning language, or None if there is no template for it
+    """
+    language = (learning_language or "").lower()[:2]
+    templates = GREETING_TEMPLATES.get(language)
+    if not templates:
+        return None
+    topics = extract_session_topics(session_content)
+    quote = "« {} »" if language == "fr" else "“{}”"
+    topics_text = ", ".join(quote.format(topic.rstrip('.?!,')) for topic in topics) if topics else GREETING_DEFAULT_TOPICS[language]
+    template = templates.get((level or "B")[:1].upper(), templates["B"])
+    return template.format(name=user_name, topics=topics_text)
+
+
+def _fallback_greeting(user_name: str, learning_language: str, session_content: list, level: str) -> str:
+    """Template greeting in the learning language, or in FALLBACK_GREETING_LANGUAGE if it has none."""
+    return (render_greeting(user_name, session_content, level, learning_language)
+            or render_greeting(user_name, session_content, level, FALLBACK_GREETING_LANGUAGE))
+
+
+def _llm_greeting(user_name: str, learning_language: str, session_content: list, level: str) -> str:
+    """
+    Personalized greeting written by the LLM.
+
+    Raises:
+        LLMError: If the call fails
+    """
+    learning_lang_name = LANGUAGE_NAMES.get(learning_language, learning_language)
+    topics = extract_session_topics(session_content)
     topics_text = ", ".join(topics) if topics else "various topics"
-    
+
     prompt = f"""
     You are Madame AI, a friendly and encouraging French language learning assistant for Francoflex.
-    Generate a personalized greeting message in {learning_language} for a language learning session.
-    
+    Generate a personalized greeting message in {learning_lang_name} for a language learning session.
+
     User details:
     - Name: {user_name}
-    - Learning language: {learning_language}
+    - Learning language: {learning_lang_name}
     - Level: {level}
     - Session topics: {topics_text}
-    
+
     The message should:
     1. Greet the user by name warmly
     2. Introduce yourself as "Madame AI, Francoflex assistant"
@@ -59,31 +165,164 @@ def generate_greeting_message(user_name: str, learning_language: str, session_co
     6. Be written entirely in {learning_lang_name}
     7. Be conversational and friendly
     8. Be approximately 2-3 sentences long
-    
+
     Example structure:
     "Bonjour [Name]! Je suis Madame AI, votre assistante Francoflex. Aujourd'hui, nous allons nous concentrer sur la prononciation de [topics], en travaillant particulièrement sur [specific sounds]. Prêt(e) à commencer?"
-    
-    Generate the greeting message now in the learning language ({learning_language}):
+
+    Generate the greeting message now in the learning language ({learning_lang_name}):
+    """
+
+    return chat_completion(
+        "greeting",
+        messages=[
+            {"role": "system", "content": f"You are Madame AI, a friendly French language learning assistant. Always respond in {learning_lang_name} only."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.7,
+        max_tokens=200
+    )
+
+
+def generate_greeting_message(user_name: str, learning_language: str, session_content: list, level: str) -> str:
+    """
+    Generate a personalized greeting message for the learning session.
+
+    Args:
+        user_name (str): The user's name
+        learning_language (str): The language being learned (e.g., "fr", "en", "es")
+        session_content (list): List of questions/topics in the session
+        level (str): The learning level (A1, A2, B1, B2, C1, C2)
+
+    Returns:
+        str: Personalized greeting message in the learning language
     """
-    
+    if not is_llm_configured():
+        print("❌ OpenAI API key not configured for greeting generation")
+        return _fallback_greeting(user_name, learning_language, session_content, level)
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": f"You are Madame AI, a friendly French language learning assistant. Always respond in {learning_lang_name} only."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=200
-        )
-        
-        greeting_message = response.choices[0].message.content.strip()
-        return greeting_message
-        
+        return _llm_greeting(user_name, learning_language, session_content, level)
+
     except Exception as e:
         print(f"❌ Error generating greeting message: {e}")
         # Fallback greeting
-        return f"Bonjour {user_name}! Je suis Madame AI, votre assistante Francoflex. Commençons cette session d'apprentissage de la prononciation!"
+        return _fallback_greeting(user_name, learning_language, session_content, level)
+
+
+def greeting_id_for(user_name: str, learning_language: str, session_content: list, level: str) -> str:
+    """Greeting id derived from the inputs, for greetings requested without a session id."""
+    payload = json.dumps([user_name, learning_language, level, extract_session_topics(session_content)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def _greeting_cache():
+    return get_cache("greeting", GREETING_CACHE_TTL, GREETING_CACHE_MAX_ENTRIES)
+
+
+def _greeting_response(greeting_id: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "greeting_id": greeting_id,
+        "greeting": entry.get('personalized') or entry['template'],
+        "personalized": bool(entry.get('personalized')),
+        "status": entry['status'],
+    }
+
+
+def _personalize_greeting(greeting_id: str, template: str, user_name: str, learning_language: str, session_content: list, level: str) -> None:
+    """Background job storing the LLM greeting in the cache."""
+    try:
+        personalized = _llm_greeting(user_name, learning_language, session_content, level)
+        _greeting_cache().set(greeting_id, {"template": template, "personalized": personalized, "status": "ready"})
+        increment("greeting.personalized")
+    except Exception as e:
+        print(f"⚠️ Could not personalize greeting {greeting_id}: {e}")
+        _greeting_cache().set(greeting_id, {"template": template, "personalized": None, "status": "failed"})
+    finally:
+        with _greeting_lock:
+            event = _greetings_inflight.pop(greeting_id, None)
+        if event:
+            event.set()
+
+
+def start_greeting(
+    greeting_id: str,
+    user_name: str,
+    learning_language: str,
+    session_content: list,
+    level: str,
+    personalize: bool = True
+) -> Dict[str, Any]:
+    """
+    Greeting available right now, and start its personalization in the background.
+
+    Args:
+        greeting_id (str): Cache id of the greeting (the session id)
+        user_name (str): The user's name
+        learning_language (str): The language being learned
+        session_content (list): Session questions
+        level (str): The learning level
+        personalize (bool): Generate the LLM version in the background
+
+    Returns:
+        Dict[str, Any]: greeting_id, greeting (personalized if already cached, template
+            otherwise), personalized, status ("pending" while the LLM version is generated)
+    """
+    cache = _greeting_cache()
+    entry = cache.get(greeting_id)
+    if entry and (entry['status'] == "ready" or (entry['status'] == "pending" and greeting_id in _greetings_inflight)):
+        return _greeting_response(greeting_id, entry)
+
+    template = render_greeting(user_name, session_content, level, learning_language)
+    if template is None:
+        # No template in this language: the LLM greeting is the only one in the right language,
+        # so it is generated inline
+        personalized = None
+        if is_llm_configured():
+            try:
+                personalized = _llm_greeting(user_name, learning_language, session_content, level)
+                increment("greeting.inline")
+            except Exception as e:
+                print(f"⚠️ Could not generate greeting {greeting_id}: {e}")
+        entry = {"template": _fallback_greeting(user_name, learning_language, session_content, level),
+                 "personalized": personalized, "status": "ready"}
+        cache.set(greeting_id, entry)
+        return _greeting_response(greeting_id, entry)
+
+    if not personalize or not is_llm_configured():
+        entry = {"template": template, "personalized": None, "status": "ready"}
+        cache.set(greeting_id, entry)
+        return _greeting_response(greeting_id, entry)
+
+    entry = {"template": template, "personalized": None, "status": "pending"}
+    cache.set(greeting_id, entry)
+    with _greeting_lock:
+        schedule = greeting_id not in _greetings_inflight
+        if schedule:
+            _greetings_inflight[greeting_id] = threading.Event()
+    if schedule:
+        _greeting_pool.submit(_personalize_greeting, greeting_id, template, user_name, learning_language, session_content, level)
+    return _greeting_response(greeting_id, entry)
+
+
+def get_greeting(greeting_id: str, wait: float = 0) -> Optional[Dict[str, Any]]:
+    """
+    Current greeting of a greeting id, optionally waiting for its personalization.
+
+    Args:
+        greeting_id (str): Greeting id (the session id)
+        wait (float): Seconds to wait for a pending personalization (capped at GREETING_MAX_WAIT)
+
+    Returns:
+        Optional[Dict[str, Any]]: Same fields as start_greeting, or None if unknown
+    """
+    if wait > 0:
+        with _greeting_lock:
+            event = _greetings_inflight.get(greeting_id)
+        if event:
+            event.wait(min(wait, GREETING_MAX_WAIT))
+
+    entry = _greeting_cache().get(greeting_id)
+    return _greeting_response(greeting_id, entry) if entry else None
 
 
 # Test section
@@ -97,9 +336,9 @@ if __name__ == "__main__":
         {"learning": "Je travaille dans une entreprise internationale."}
     ]
     test_level = "B1"
-    
+
     print("Testing generate_greeting_message function...")
-    
+
     try:
         greeting = generate_greeting_message(
             user_name=test_user_name,
@@ -107,8 +346,12 @@ if __name__ == "__main__":
             session_content=test_session_content,
             level=test_level
         )
-        
+
         print(f"✅ Generated greeting: {greeting}")
-        
+
+        greeting_id = greeting_id_for(test_user_name, test_learning_language, test_session_content, test_level)
+        print(f"⚡ Instant greeting: {start_greeting(greeting_id, test_user_name, test_learning_language, test_session_content, test_level)}")
+        print(f"✨ Personalized greeting: {get_greeting(greeting_id, wait=GREETING_MAX_WAIT)}")
+
     except Exception as e:
         print(f"❌ Error in main execution: {str(e)}")
@@ -1,65 +1,213 @@
 import os
-import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional
 from dotenv import load_dotenv
 
+try:
+    from .in_cache import get_cache
+    from .in_metrics import increment
+    from .oa_client import chat_completion_json, is_llm_configured
+    from .oa_prompt import compact_word_table, WEAK_PHONE_THRESHOLD
+except ImportError:
+    from in_cache import get_cache
+    from in_metrics import increment
+    from oa_client import chat_completion_json, is_llm_configured
+    from oa_prompt import compact_word_table, WEAK_PHONE_THRESHOLD
+
 # Load environment variables
 load_dotenv()
 
+# Summaries are cached by a coarse signature of the attempt (see summary_signature). Each
+# entry keeps up to SUMMARY_CACHE_VARIANTS messages served in rotation; missing variants are
+# generated in the background, and the entry is regenerated after SUMMARY_CACHE_TTL.
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", 7 * 24 * 3600))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", 5000))
+SUMMARY_CACHE_VARIANTS = int(os.getenv("SUMMARY_CACHE_VARIANTS", 3))
+
+# Upper bounds of the weak-word count bands (0, 1, 2-3, 4-6, 7+)
+WEAK_COUNT_BANDS = (0, 1, 3, 6)
+
+_variant_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary-variants")
+_variant_lock = threading.Lock()
+_variants_inflight = set()
+# Guards read-update-write of summary cache entries (rotation vs. background variant fills)
+_entry_lock = threading.Lock()
+
+# Structured output schema for generate_pronunciation_summary
+SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "next_question_prompt": {"type": "string"}
+    },
+    "required": ["summary", "next_question_prompt"],
+    "additionalProperties": False
+}
+
+def summary_signature(analysis_result: Dict[str, Any], native_language: str = "en") -> str:
+    """
+    Coarse signature of an attempt, used as the summary cache key.
+    
+    Combines the 10-point score band, the weak-word count band, the two most frequent weak
+    phones (when the words carry phones) and the native language.
+    
+    Args:
+        analysis_result: Analysis with overall_score and word_analysis
+        native_language: User's native language
+    
+    Returns:
+        str: Cache key
+    """
+    overall_score = analysis_result.get('overall_score') or 0
+    word_analysis = analysis_result.get('word_analysis', [])
+    
+    weak_count = sum(1 for word in word_analysis if word.get('quality_score', 0) < 80)
+    weak_band = next((f"<={bound}" for bound in WEAK_COUNT_BANDS if weak_count <= bound), f">{WEAK_COUNT_BANDS[-1]}")
+    
+    weak_phones = Counter(
+        phone
+        for word in word_analysis
+        for phone, data in (word.get('phones') or {}).items()
+        if data.get('quality_score', 0) < WEAK_PHONE_THRESHOLD
+    )
+    top_phones = ",".join(sorted(phone for phone, _ in sorted(weak_phones.items(), key=lambda item: (-item[1], item[0]))[:2]))
+    
+    return f"{native_language}:{int(overall_score) // 10 * 10}:{weak_band}:{top_phones}"
+
+def _summary_cache():
+    return get_cache("pronunciation_summary", SUMMARY_CACHE_TTL, SUMMARY_CACHE_MAX_ENTRIES)
+
+def _add_summary_variant(key: str, summary_data: Dict[str, Any]) -> None:
+    """Append a generated summary to a cache entry (starting a new entry if it expired)."""
+    cache = _summary_cache()
+    with _entry_lock:
+        entry = cache.get(key)
+        if not entry or time.time() - entry.get('created_at', 0) > SUMMARY_CACHE_TTL:
+            entry = {"variants": [], "next": 0, "generated": 0, "created_at": time.time()}
+        # Generations are counted even when the model repeats itself, so filling stops after
+        # SUMMARY_CACHE_VARIANTS calls
+        entry['generated'] = entry.get('generated', 0) + 1
+        if summary_data not in entry['variants']:
+            entry['variants'] = (entry['variants'] + [summary_data])[-SUMMARY_CACHE_VARIANTS:]
+        cache.set(key, entry)
+
+def _generate_variant(key: str, analysis_result: Dict[str, Any], native_language: str) -> None:
+    """Background job adding one more variant to a cache entry."""
+    try:
+        _add_summary_variant(key, _generate_summary(analysis_result, native_language))
+        increment("summary.variants_generated")
+    except Exception as e:
+        print(f"⚠️ Could not generate summary variant: {str(e)}")
+    finally:
+        with _variant_lock:
+            _variants_inflight.discard(key)
+
 def generate_pronunciation_summary(analysis_result: Dict[str, Any], native_language: str = "en") -> Dict[str, Any]:
     """
     Generate a supportive pronunciation summary and next question prompt.
     
+    Served from the summary cache when an attempt with the same signature was summarized
+    before (variants rotate between calls); the LLM is only called on a miss.
+    
     Args:
-        analysis_result: The pronunciation analysis result from SpeechAce
+        analysis_result: The pronunciation analysis result from SpeechAce (word phones, when
+            present, refine the cache key)
         native_language: User's native language for feedback (default: "en")
     
     Returns:
         Dict containing summary feedback and next question prompt
     """
     try:
-        import openai
-        
         # Check if OpenAI API key is available
-        openai_api_key = os.getenv('OPENAI_API_KEY')
-        if not openai_api_key:
+        if not is_llm_configured():
             print("❌ OpenAI API key not configured")
             return {
                 "summary": "Great job! Let's continue with the next question.",
                 "next_question_prompt": "Please provide the next question for the user to practice."
             }
         
-        # Map language codes to full names for better prompting
-        language_map = {
-            "en": "English",
-            "fr": "French", 
-            "es": "Spanish",
-            "de": "German",
-            "it": "Italian",
-            "pt": "Portuguese",
-            "nl": "Dutch",
-            "pl": "Polish",
-            "ru": "Russian",
-            "ja": "Japanese",
-            "ko": "Korean",
-            "zh": "Chinese",
-            "ar": "Arabic",
-            "hi": "Hindi",
-            "tr": "Turkish"
-        }
-        
-        native_lang_name = language_map.get(native_language, native_language)
-        
-        # Extract key information from analysis
-        overall_score = analysis_result.get('overall_score', 0)
-        word_analysis = analysis_result.get('word_analysis', [])
-        
-        # Count words with good scores (80+)
-        good_words = [word for word in word_analysis if word.get('quality_score', 0) >= 80]
-        improvement_words = [word for word in word_analysis if word.get('quality_score', 0) < 80]
+        key = summary_signature(analysis_result, native_language)
+        cache = _summary_cache()
+        with _entry_lock:
+            entry = cache.get(key)
+            fresh = entry and entry.get('variants') and time.time() - entry.get('created_at', 0) <= SUMMARY_CACHE_TTL
+            if fresh:
+                variants = entry['variants']
+                index = entry.get('next', 0) % len(variants)
+                entry['next'] = index + 1
+                cache.set(key, entry)
+        if fresh:
+            # Fill the entry up to SUMMARY_CACHE_VARIANTS off the request path
+            if entry.get('generated', len(variants)) < SUMMARY_CACHE_VARIANTS:
+                with _variant_lock:
+                    schedule = key not in _variants_inflight
+                    _variants_inflight.add(key)
+                if schedule:
+                    _variant_pool.submit(_generate_variant, key, analysis_result, native_language)
+            
+            print(f"⚡ Pronunciation summary served from cache ({key}, variant {index + 1}/{len(variants)})")
+            return dict(variants[index])
         
-        # Create prompt for ChatGPT
-        prompt = f"""
+        summary_data = _generate_summary(analysis_result, native_language)
+        _add_summary_variant(key, summary_data)
+        return summary_data
+            
+    except Exception as e:
+        print(f"❌ Error generating pronunciation summary: {str(e)}")
+        return {
+            "summary": "Great job! Let's continue with the next question.",
+            "next_question_prompt": "Please provide the next question for the user to practice."
+        }
+
+def _generate_summary(analysis_result: Dict[str, Any], native_language: str) -> Dict[str, Any]:
+    """
+    Generate a summary with the LLM (no cache).
+    
+    Args:
+        analysis_result: Analysis with overall_score and word_analysis
+        native_language: User's native language for feedback
+    
+    Returns:
+        Dict containing summary feedback and next question prompt
+    
+    Raises:
+        LLMError: If the call fails
+    """
+    # Map language codes to full names for better prompting
+    language_map = {
+        "en": "English",
+        "fr": "French", 
+        "es": "Spanish",
+        "de": "German",
+        "it": "Italian",
+        "pt": "Portuguese",
+        "nl": "Dutch",
+        "pl": "Polish",
+        "ru": "Russian",
+        "ja": "Japanese",
+        "ko": "Korean",
+        "zh": "Chinese",
+        "ar": "Arabic",
+        "hi": "Hindi",
+        "tr": "Turkish"
+    }
+    
+    native_lang_name = language_map.get(native_language, native_language)
+    
+    # Extract key information from analysis
+    overall_score = analysis_result.get('overall_score', 0)
+    word_analysis = analysis_result.get('word_analysis', [])
+    
+    # Count words with good scores (80+)
+    good_words = [word for word in word_analysis if word.get('quality_score', 0) >= 80]
+    improvement_words = [word for word in word_analysis if word.get('quality_score', 0) < 80]
+    weak_table = compact_word_table(word_analysis, include_phones=False, budget_tokens=120)['table'] or "(none)"
+    
+    # Create prompt for ChatGPT
+    prompt = f"""
 You are a supportive French pronunciation coach. Based on the pronunciation analysis, provide encouraging feedback and prepare for the next question.
 
 Analysis Results:
@@ -67,8 +215,8 @@ Analysis Results:
 - Words with good pronunciation (80+): {len(good_words)}/{len(word_analysis)}
 - Words needing improvement: {len(improvement_words)}
 
-Word Analysis:
-{json.dumps(word_analysis[:5], indent=2, ensure_ascii=False)}  # Show first 5 words
+Words needing improvement (weakest first):
+{weak_table}
 
 Please provide:
 
@@ -94,59 +242,31 @@ Make sure both messages are:
 - Supportive and encouraging
 - Brief but meaningful
 - Professional but warm
+- About sounds and progress rather than quoting specific words (the message is reused for similar attempts)
 """
-        
-        print("🤖 Generating pronunciation summary...")
-        
-        # Make ChatGPT request
-        client = openai.OpenAI(api_key=openai_api_key)
-        
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a supportive French pronunciation coach. Always respond with valid JSON only. Be encouraging and positive."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.7,
-            max_tokens=500
-        )
-        
-        # Parse ChatGPT response
-        if response.choices and len(response.choices) > 0:
-            ai_response = response.choices[0].message.content.strip()
-            print("✅ ChatGPT response received")
-            
-            # Parse JSON response
-            try:
-                summary_data = json.loads(ai_response)
-                print("📝 Pronunciation summary generated successfully")
-                return summary_data
-            except json.JSONDecodeError as e:
-                print(f"❌ Error parsing ChatGPT JSON response: {e}")
-                print(f"Raw response: {ai_response}")
-                return {
-                    "summary": "Great job! Let's continue with the next question.",
-                    "next_question_prompt": "Please provide the next question for the user to practice."
-                }
-        else:
-            print("❌ No response choices received from ChatGPT")
-            return {
-                "summary": "Great job! Let's continue with the next question.",
-                "next_question_prompt": "Please provide the next question for the user to practice."
+    
+    print("🤖 Generating pronunciation summary...")
+    
+    # Make ChatGPT request (schema-constrained, validated output)
+    summary_data = chat_completion_json(
+        "pronunciation_summary",
+        messages=[
+            {
+                "role": "system",
+                "content": "You are a supportive French pronunciation coach. Always respond with valid JSON only. Be encouraging and positive."
+            },
+            {
+                "role": "user",
+                "content": prompt
             }
-            
-    except Exception as e:
-        print(f"❌ Error generating pronunciation summary: {str(e)}")
-        return {
-            "summary": "Great job! Let's continue with the next question.",
-            "next_question_prompt": "Please provide the next question for the user to practice."
-        }
+        ],
+        schema=SUMMARY_SCHEMA,
+        temperature=0.7,
+        max_tokens=500
+    )
+    
+    print("📝 Pronunciation summary generated successfully")
+    return summary_data
 
 
 # Test section
@@ -1,23 +1,42 @@
-import os
 import json
-import openai
-from typing import Dict, List
+from typing import Dict, Iterator, List
 from fastapi import HTTPException
 from dotenv import load_dotenv
 
+try:
+    from .oa_client import chat_completion_json, chat_completion_stream, is_llm_configured, LLMError
+    from .oa_json import IncrementalArrayParser, json_schema_format, repair_json
+except ImportError:
+    from oa_client import chat_completion_json, chat_completion_stream, is_llm_configured, LLMError
+    from oa_json import IncrementalArrayParser, json_schema_format, repair_json
+
 # Load environment variables
 load_dotenv()
 
+# Structured output schema for generate_questions
+QUESTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "content": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "learning": {"type": "string"},
+                    "native": {"type": "string"}
+                },
+                "required": ["learning", "native"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["content"],
+    "additionalProperties": False
+}
 
-def generate_questions(industry: str, job_title: str, language: str, level: str, native: str) -> Dict[str, List[Dict[str, str]]]:
-    """Generate language learning sentences for specific industry, job title, language, level, and native language."""
-    
-    api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
-        raise HTTPException(status_code=500, detail="OPENAI_API_KEY not configured")
-    
-    client = openai.OpenAI(api_key=api_key)
-    
+
+def _question_messages(industry: str, job_title: str, language: str, level: str, native: str) -> List[Dict[str, str]]:
+    """Chat messages asking for the 10 learning sentences."""
     system_prompt = f"You are a {language} language learning assistant specialized in {industry} industry. Generate exactly 10 professional {language} sentences at {level} level with {native} translations, focusing on industry-specific scenarios and terminology. You MUST respond with valid JSON only, no other text."
     
     prompt = f"""Generate 10 highly specific {language} learning sentences for a {job_title} working in {industry} at {level} level.
@@ -62,17 +81,27 @@ Learning Language: {language}
 Native Language: {native}
 Level: {level}"""
     
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.7
-    )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def generate_questions(industry: str, job_title: str, language: str, level: str, native: str) -> Dict[str, List[Dict[str, str]]]:
+    """Generate language learning sentences for specific industry, job title, language, level, and native language."""
     
-    response_content = response.choices[0].message.content
-    questions_data = json.loads(response_content)
+    if not is_llm_configured():
+        raise HTTPException(status_code=500, detail="OPENAI_API_KEY not configured")
+    
+    try:
+        questions_data = chat_completion_json(
+            "questions",
+            messages=_question_messages(industry, job_title, language, level, native),
+            schema=QUESTIONS_SCHEMA,
+            temperature=0.7
+        )
+    except LLMError as e:
+        raise HTTPException(status_code=502, detail=f"Question generation failed: {e}")
     
     questions = questions_data.get('content', [])
     if not questions:
@@ -81,6 +110,57 @@ Level: {level}"""
     return {"content": questions}
 
 
+def stream_questions(industry: str, job_title: str, language: str, level: str, native: str) -> Iterator[Dict[str, str]]:
+    """
+    Generate the same sentences as generate_questions, yielding each one as soon as it is complete.
+    
+    The completion is streamed and parsed incrementally, so the first sentence is
+    available long before the model has written the last one.
+    
+    Args:
+        industry (str): User's industry
+        job_title (str): User's job title
+        language (str): Learning language
+        level (str): CEFR level
+        native (str): Native language
+        
+    Yields:
+        Dict[str, str]: {"learning": ..., "native": ...}
+        
+    Raises:
+        HTTPException: If generation fails or yields no sentence
+    """
+    if not is_llm_configured():
+        raise HTTPException(status_code=500, detail="OPENAI_API_KEY not configured")
+    
+    parser = IncrementalArrayParser("content", QUESTIONS_SCHEMA["properties"]["content"]["items"])
+    count = 0
+    try:
+        for delta in chat_completion_stream(
+            "questions",
+            _question_messages(industry, job_title, language, level, native),
+            response_format=json_schema_format("questions", QUESTIONS_SCHEMA),
+            temperature=0.7
+        ):
+            for question in parser.feed(delta):
+                count += 1
+                yield question
+    except LLMError as e:
+        if not count:
+            raise HTTPException(status_code=502, detail=f"Question generation failed: {e}")
+        print(f"⚠️ Question stream broke off after {count} sentences: {e}")
+        return
+    
+    if not count:
+        # Output the incremental parser could not split (e.g. wrapped in prose): decode it whole
+        repaired = repair_json(parser.text, QUESTIONS_SCHEMA) or {}
+        for question in repaired.get('content', []):
+            count += 1
+            yield question
+    if not count:
+        raise HTTPException(status_code=500, detail="No questions generated")
+
+
 # Test section
 if __name__ == "__main__":
     # Test parameters
@@ -0,0 +1,293 @@
+"""
+JSON helpers for structured LLM output.
+
+- json_schema_format: OpenAI response_format for a strict JSON schema
+- validate_json: minimal JSON-schema validator (the subset our schemas use), with a
+  partial mode for objects that are still streaming in
+- repair_json: streaming-tolerant parser that recovers the longest valid prefix of
+  truncated or fenced output instead of failing the whole call
+- IncrementalArrayParser: yields each element of a JSON array as soon as it is
+  complete, while the rest of the document is still streaming in
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "null": type(None),
+}
+
+
+def json_schema_format(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the response_format for a strict JSON-schema completion.
+
+    Args:
+        name (str): Schema name reported to the provider
+        schema (Dict[str, Any]): JSON schema (root must be an object)
+
+    Returns:
+        Dict[str, Any]: response_format parameter
+    """
+    return {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}
+
+
+def validate_json(value: Any, schema: Dict[str, Any], partial: bool = False, path: str = "$") -> List[str]:
+    """
+    Validate a value against a JSON schema.
+
+    Supports type, properties, required, additionalProperties, items, enum, minItems and maxItems.
+
+    Args:
+        value: Decoded JSON value
+        schema (Dict[str, Any]): JSON schema
+        partial (bool): Allow missing required properties and short arrays (output still streaming)
+        path (str): Location used in error messages
+
+    Returns:
+        List[str]: Validation errors (empty if valid)
+    """
+    errors = []
+    expected = schema.get("type")
+    if expected:
+        types = expected if isinstance(expected, list) else [expected]
+        python_types = tuple(t for name in types for t in (_TYPES[name] if isinstance(_TYPES[name], tuple) else (_TYPES[name],)))
+        # bool is an int subclass; only accept it where booleans are expected
+        if not isinstance(value, python_types) or (isinstance(value, bool) and "boolean" not in types):
+            return [f"{path}: expected {expected}, got {type(value).__name__}"]
+
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: {value!r} not in {schema['enum']}")
+
+    if isinstance(value, dict):
+        properties = schema.get("properties", {})
+        if not partial:
+            for key in schema.get("required", []):
+                if key not in value:
+                    errors.append(f"{path}: missing required property '{key}'")
+        for key, item in value.items():
+            if key in properties:
+                errors.extend(validate_json(item, properties[key], partial, f"{path}.{key}"))
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path}: unexpected property '{key}'")
+
+    if isinstance(value, list):
+        if not partial and len(value) < schema.get("minItems", 0):
+            errors.append(f"{path}: expected at least {schema['minItems']} items")
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            errors.append(f"{path}: expected at most {schema['maxItems']} items")
+        if "items" in schema:
+            for index, item in enumerate(value):
+                errors.extend(validate_json(item, schema["items"], partial, f"{path}[{index}]"))
+
+    return errors
+
+
+def _strip_wrapping(text: str) -> str:
+    """Remove markdown code fences and prose around the first JSON value."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    return text[min(starts):] if starts else text
+
+
+def _closing_candidates(text: str) -> List[str]:
+    """
+    Candidate completions of a truncated JSON document, longest first.
+
+    The first candidate closes every open structure at the end of the text; the others cut
+    back to each earlier top-level element boundary, dropping incomplete trailing items.
+    """
+    stack = []
+    in_string = False
+    escaped = False
+    boundaries = []  # (cut position, closers needed there)
+
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if stack:
+                stack.pop()
+            if stack:
+                boundaries.append((index + 1, "".join(reversed(stack))))
+        elif char == "," and stack:
+            boundaries.append((index, "".join(reversed(stack))))
+
+    candidates = []
+    if stack and not in_string:
+        candidates.append(text.rstrip().rstrip(",:") + "".join(reversed(stack)))
+    elif stack and in_string and not escaped:
+        candidates.append(text + '"' + "".join(reversed(stack)))
+    for position, closers in reversed(boundaries):
+        candidates.append(text[:position] + closers)
+    return candidates
+
+
+def repair_json(text: str, schema: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+    """
+    Parse JSON that may be fenced, wrapped in prose or truncated mid-stream.
+
+    Args:
+        text (str): Model output
+        schema (Optional[Dict[str, Any]]): If given, incomplete trailing items are dropped
+            until the value validates
+
+    Returns:
+        Optional[Any]: The decoded value (longest recoverable prefix), or None if nothing could be recovered
+    """
+    if not text:
+        return None
+    body = _strip_wrapping(text)
+
+    for candidate in [body] + _closing_candidates(body):
+        try:
+            value = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if schema is None or not validate_json(value, schema):
+            return value
+    return None
+
+
+class IncrementalArrayParser:
+    """
+    Incremental parser for the object elements of one JSON array in a streamed document.
+
+    Feed text chunks as they arrive; every element of the target array is decoded and
+    returned by the feed() call that completes it. Elements that are not objects or
+    arrays (bare strings, numbers) are skipped.
+    """
+
+    def __init__(self, array_key: Optional[str] = None, item_schema: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the parser.
+
+        Args:
+            array_key: Property holding the array (e.g. "content"); None for the first array found
+            item_schema: If given, elements failing validation are dropped and counted in rejected
+        """
+        self.array_key = array_key
+        self.item_schema = item_schema
+        self.rejected = 0
+        self.text = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._array_depth: Optional[int] = None  # depth of the target array's elements
+        self._item_start: Optional[int] = None
+        self.closed = False  # the target array has been fully read
+
+    def feed(self, chunk: str) -> List[Any]:
+        """
+        Consume a chunk of the document.
+
+        Args:
+            chunk: Next piece of streamed text
+
+        Returns:
+            List[Any]: Elements completed by this chunk, in order
+        """
+        self.text += chunk
+        items = []
+        text = self.text
+        for index in range(self._position, len(text)):
+            char = text[index]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._array_depth is None:
+                        self._last_string = text[self._string_start + 1:index]
+                continue
+            if self.closed:
+                break
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char in "{[":
+                if self._array_depth is None:
+                    if char == "[" and (self.array_key is None or self._last_string == self.array_key):
+                        self._array_depth = self._depth + 1
+                elif self._depth == self._array_depth and self._item_start is None:
+                    self._item_start = index
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._array_depth is not None:
+                    if self._depth == self._array_depth and self._item_start is not None:
+                        item = self._decode(text[self._item_start:index + 1])
+                        self._item_start = None
+                        if item is not None:
+                            items.append(item)
+                    elif self._depth == self._array_depth - 1:
+                        self.closed = True
+        self._position = len(text)
+        return items
+
+    def _decode(self, fragment: str) -> Optional[Any]:
+        try:
+            item = json.loads(fragment)
+        except json.JSONDecodeError:
+            self.rejected += 1
+            return None
+        if self.item_schema is not None and validate_json(item, self.item_schema):
+            self.rejected += 1
+            return None
+        return item
+
+
+# Test section
+if __name__ == "__main__":
+    schema = {
+        "type": "object",
+        "properties": {"content": {"type": "array", "items": {
+            "type": "object",
+            "properties": {"learning": {"type": "string"}, "native": {"type": "string"}},
+            "required": ["learning", "native"],
+            "additionalProperties": False
+        }}},
+        "required": ["content"],
+        "additionalProperties": False
+    }
+
+    samples = {
+        "fenced": '```json\n{"content": [{"learning": "Bonjour", "native": "Hello"}]}\n```',
+        "truncated": '{"content": [{"learning": "Bonjour", "native": "Hello"}, {"learning": "Merci", "nat',
+        "prose": 'Here you go: {"content": []}',
+    }
+    for label, text in samples.items():
+        value = repair_json(text, schema)
+        print(f"{label}: {value} errors={validate_json(value, schema)}")
+
+    document = '{"content": [{"learning": "Bonjour {toi} \\"là\\"", "native": "Hello"}, {"learning": "Merci", "native": "Thanks"}]}'
+    parser = IncrementalArrayParser("content", schema["properties"]["content"]["items"])
+    for start in range(0, len(document), 7):
+        for item in parser.feed(document[start:start + 7]):
+            print(f"streamed item after {start + 7} chars: {item}")
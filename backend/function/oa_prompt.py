@@ -0,0 +1,228 @@
+"""
+Token-budgeted compaction of pronunciation results for LLM prompts.
+
+Builds on the compact SpeechAce JSON (create_compact_pronunciation_json /
+SpeechAceResult.to_compact_json) but only keeps words, syllables and phones below
+threshold, encoded as a dense pipe-separated table, weakest first, cut to a
+per-call token budget.
+"""
+
+import json
+import math
+import os
+from typing import Any, Callable, Dict, List, Union
+
+try:
+    from .in_metrics import increment, observe
+    from .sa_parser import SpeechAceResult, parse_speechace_response
+except ImportError:
+    from in_metrics import increment, observe
+    from sa_parser import SpeechAceResult, parse_speechace_response
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+WEAK_WORD_THRESHOLD = int(os.getenv("PROMPT_WEAK_WORD_THRESHOLD", 80))
+WEAK_PHONE_THRESHOLD = int(os.getenv("PROMPT_WEAK_PHONE_THRESHOLD", 70))
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 400))
+# Also count the tokens of the full JSON the tables replace (debug only: costs a dump per call)
+PROMPT_BASELINE_METRICS = os.getenv("PROMPT_BASELINE_METRICS", "").lower() in ("1", "true", "yes")
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count prompt tokens.
+
+    Uses tiktoken (cl100k_base) when installed, otherwise estimates ~4 characters per token.
+
+    Args:
+        text (str): Prompt text
+
+    Returns:
+        int: Token count
+    """
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def _compact_words(source: Union[str, Dict[str, Any], List[Dict[str, Any]], SpeechAceResult]) -> List[Dict[str, Any]]:
+    """Word list in the compact format (word, quality_score, phones dict) from any supported input."""
+    if isinstance(source, SpeechAceResult):
+        return source.to_compact_json()["words"]
+    if isinstance(source, list):
+        return source
+    if isinstance(source, str):
+        source = json.loads(source)
+    if "word_analysis" in source:
+        return source["word_analysis"]
+    if "words" in source:
+        return source["words"]
+    return parse_speechace_response(source).to_compact_json()["words"]
+
+
+def _weak_phones(phones: Any, phone_threshold: int) -> str:
+    """'phone score>heard' entries for phones below threshold, worst first."""
+    if isinstance(phones, dict):
+        items = [(phone, data.get("quality_score", 0), data.get("sound_most_like")) for phone, data in phones.items()]
+    else:
+        items = [(phone.get("phone") or phone.get("target_phone", ""), phone.get("quality_score", 0), phone.get("sound_most_like"))
+                 for phone in phones or []]
+    weak = sorted((item for item in items if item[1] < phone_threshold), key=lambda item: item[1])
+    return ", ".join(
+        f"{phone} {round(score)}" + (f">{heard}" if heard and heard != phone else "")
+        for phone, score, heard in weak
+    )
+
+
+def is_weak_word(word: Dict[str, Any], word_threshold: int = WEAK_WORD_THRESHOLD, phone_threshold: int = WEAK_PHONE_THRESHOLD) -> bool:
+    """
+    Whether a word needs work: it scores below word_threshold or has a phone below phone_threshold.
+
+    Args:
+        word (Dict[str, Any]): Word in the compact format (word, quality_score, phones)
+        word_threshold (int): Word score threshold
+        phone_threshold (int): Phone score threshold
+
+    Returns:
+        bool: True if the word belongs in compact_word_table
+    """
+    return word.get("quality_score", 0) < word_threshold or bool(_weak_phones(word.get("phones"), phone_threshold))
+
+
+def _fit_rows(name: str, header: str, rows: List[tuple], budget_tokens: int,
+              baseline_text: Callable[[], str], measure_baseline: bool) -> Dict[str, Any]:
+    """Keep the weakest rows that fit the budget and, if measure_baseline, record the token savings."""
+    rows.sort(key=lambda row: row[0])
+    lines = [header]
+    tokens = count_tokens(header)
+    included = 0
+    for _, line in rows:
+        line_tokens = count_tokens(line) + 1
+        if tokens + line_tokens > budget_tokens:
+            break
+        lines.append(line)
+        tokens += line_tokens
+        included += 1
+
+    omitted = len(rows) - included
+    if omitted:
+        lines.append(f"(+{omitted} more omitted)")
+    table = "\n".join(lines) if rows else ""
+
+    table_tokens = count_tokens(table) if table else 0
+    observe(f"prompt.{name}.tokens", table_tokens)
+    baseline_tokens = None
+    if measure_baseline:
+        baseline_tokens = count_tokens(baseline_text())
+        increment(f"prompt.{name}.tokens_saved", max(0, baseline_tokens - table_tokens))
+
+    return {"table": table, "included": included, "omitted": omitted, "tokens": table_tokens, "baseline_tokens": baseline_tokens}
+
+
+def compact_word_table(
+    source: Union[str, Dict[str, Any], List[Dict[str, Any]], SpeechAceResult],
+    word_threshold: int = WEAK_WORD_THRESHOLD,
+    phone_threshold: int = WEAK_PHONE_THRESHOLD,
+    budget_tokens: int = PROMPT_TOKEN_BUDGET,
+    include_phones: bool = True,
+    include_ids: bool = False,
+    measure_baseline: bool = PROMPT_BASELINE_METRICS
+) -> Dict[str, Any]:
+    """
+    Dense table of the words that need work.
+
+    A word is kept if it scores below word_threshold or has a phone below phone_threshold.
+    With include_ids, each row starts with the word's id (its "id" key, or its position in
+    the list) so that answers can be matched back to the word by position.
+
+    Args:
+        source: Raw SpeechAce response, analysis result (word_analysis), compact JSON or word list
+        word_threshold (int): Keep words scoring below this
+        phone_threshold (int): Report phones scoring below this
+        budget_tokens (int): Maximum tokens for the table
+        include_phones (bool): Add the weak-phones column
+        include_ids (bool): Add the id column
+        measure_baseline (bool): Count the tokens of the full JSON too (benchmarks / debugging)
+
+    Returns:
+        Dict[str, Any]: table (str, empty if nothing needs work), included, omitted, tokens,
+            baseline_tokens (None unless measure_baseline)
+    """
+    words = _compact_words(source)
+    header = "word|score|weak phones (phone score>heard as)" if include_phones else "word|score"
+    if include_ids:
+        header = "id|" + header
+    rows = []
+    for position, word in enumerate(words):
+        score = word.get("quality_score", 0)
+        weak = _weak_phones(word.get("phones"), phone_threshold) if include_phones else ""
+        if score < word_threshold or weak:
+            line = f"{word.get('word', '')}|{round(score)}" + (f"|{weak}" if include_phones else "")
+            if include_ids:
+                line = f"{word.get('id', position)}|{line}"
+            rows.append((score, line))
+    return _fit_rows("word_table", header, rows, budget_tokens,
+                     lambda: json.dumps(words, indent=2, ensure_ascii=False), measure_baseline)
+
+
+def compact_syllable_table(
+    source: Union[str, Dict[str, Any], SpeechAceResult],
+    syllable_threshold: int = WEAK_WORD_THRESHOLD,
+    phone_threshold: int = WEAK_PHONE_THRESHOLD,
+    budget_tokens: int = PROMPT_TOKEN_BUDGET,
+    measure_baseline: bool = PROMPT_BASELINE_METRICS
+) -> Dict[str, Any]:
+    """
+    Dense table of the syllables that need work, from a raw SpeechAce response.
+
+    Phones are assigned to syllables in order using each syllable's phone_count.
+
+    Args:
+        source: Raw SpeechAce response (dict or JSON string) or SpeechAceResult
+        syllable_threshold (int): Keep syllables scoring below this
+        phone_threshold (int): Report phones scoring below this
+        budget_tokens (int): Maximum tokens for the table
+        measure_baseline (bool): Count the tokens of the full JSON too (benchmarks / debugging)
+
+    Returns:
+        Dict[str, Any]: table, included, omitted, tokens, baseline_tokens (None unless measure_baseline)
+    """
+    result = source if isinstance(source, SpeechAceResult) else parse_speechace_response(source)
+    rows = []
+    for word in result.words:
+        position = 0
+        for syllable in word.syllables:
+            phones = word.phones[position:position + syllable.phone_count]
+            position += syllable.phone_count
+            weak = _weak_phones([{"phone": p.phone, "quality_score": p.quality_score, "sound_most_like": p.sound_most_like}
+                                 for p in phones], phone_threshold)
+            if syllable.quality_score < syllable_threshold or weak:
+                rows.append((syllable.quality_score, f"{word.word}|{syllable.letters}|{round(syllable.quality_score)}|{weak}"))
+    header = "word|syllable|score|weak phones (phone score>heard as)"
+    return _fit_rows("syllable_table", header, rows, budget_tokens,
+                     lambda: json.dumps(result.raw, indent=2, ensure_ascii=False), measure_baseline)
+
+
+# Benchmark section
+if __name__ == "__main__":
+    from sa_parser import _synthetic_response
+
+    for n_words in (10, 40, 200):
+        response = _synthetic_response(n_words)
+        words = compact_word_table(response, measure_baseline=True)
+        syllables = compact_syllable_table(response, measure_baseline=True)
+        print(
+            f"{n_words:>4} words: word table {words['tokens']} tokens (was {words['baseline_tokens']}, "
+            f"{words['included']} rows, {words['omitted']} omitted); "
+            f"syllable table {syllables['tokens']} tokens (was {syllables['baseline_tokens']})"
+        )
+    print()
+    print(compact_word_table(_synthetic_response(6))["table"])
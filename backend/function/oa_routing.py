@@ -0,0 +1,214 @@
+"""
+Latency-aware model tiering for the LLM gateway.
+
+Each route (kind of call) maps to a tier ("fast", "large"...) and each tier to a model.
+A route can escalate to a larger tier when the fast tier's output fails validation,
+and downgrade to a faster tier while its recent latency exceeds the route's SLO.
+
+The policy is configurable without code changes:
+- LLM_MODEL_FAST / LLM_MODEL_LARGE (or OPENAI_MODEL) set the tier models
+- LLM_ROUTING_POLICY holds JSON (or the path of a JSON file) merged over the defaults:
+  {"tiers": {"fast": "gpt-4o-mini"}, "routes": {"conversation": {"tier": "large", "slo_ms": 3000}}}
+- OPENAI_MODEL_<ROUTE> pins a route to a specific model
+
+With the shipped policy every route that has an SLO already starts on the fast tier, so
+missing the SLO does not change its model; it only suspends escalation to the large tier.
+Downgrading is opt-in: put a route on a larger tier in LLM_ROUTING_POLICY and it falls
+back to downgrade_to while its p95 latency is over slo_ms.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from .in_metrics import increment, observe
+except ImportError:
+    from in_metrics import increment, observe
+
+DEFAULT_TIERS = {
+    "fast": os.getenv("LLM_MODEL_FAST", "gpt-4o-mini"),
+    "large": os.getenv("LLM_MODEL_LARGE", os.getenv("OPENAI_MODEL", "gpt-4o")),
+    "legacy": "gpt-3.5-turbo",
+}
+
+# tier: starting tier; escalate_to: tier retried when structured output fails validation;
+# slo_ms: latency objective, above which the route downgrades to downgrade_to (default "fast")
+# and stops escalating (routes below are fast-tier by default, so only escalation is affected)
+DEFAULT_ROUTES = {
+    "questions": {"tier": "large"},
+    "questions_lite": {"tier": "legacy"},
+    "greeting": {"tier": "fast", "slo_ms": 1500},
+    "conversation": {"tier": "fast", "escalate_to": "large", "slo_ms": 2500},
+    "pronunciation_summary": {"tier": "fast", "escalate_to": "large", "slo_ms": 2000},
+    "word_feedback": {"tier": "fast", "escalate_to": "large", "slo_ms": 4000},
+    "word_tip": {"tier": "fast", "slo_ms": 2000},
+    "syllable_feedback": {"tier": "fast", "slo_ms": 4000},
+    "ai_answer": {"tier": "fast"},
+    "default": {"tier": "large"},
+}
+
+# USD per 1M tokens (input, output), for cost accounting
+MODEL_COSTS = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+SLO_WINDOW = int(os.getenv("LLM_SLO_WINDOW", 20))                 # recent calls per route used for the SLO
+SLO_MIN_SAMPLES = int(os.getenv("LLM_SLO_MIN_SAMPLES", 5))
+DOWNGRADE_SECONDS = float(os.getenv("LLM_DOWNGRADE_SECONDS", 120))  # how long a downgrade lasts
+
+_lock = threading.Lock()
+_policy: Dict[str, Dict[str, Any]] = {}
+_latencies: Dict[str, deque] = defaultdict(lambda: deque(maxlen=SLO_WINDOW))
+_downgraded_until: Dict[str, float] = {}
+
+
+def load_routing_policy() -> Dict[str, Dict[str, Any]]:
+    """
+    (Re)load the routing policy from the defaults and LLM_ROUTING_POLICY.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: {"tiers": {...}, "routes": {...}}
+    """
+    global _policy
+    tiers = dict(DEFAULT_TIERS)
+    routes = {route: dict(config) for route, config in DEFAULT_ROUTES.items()}
+
+    raw = os.getenv("LLM_ROUTING_POLICY", "").strip()
+    if raw:
+        try:
+            if not raw.startswith("{"):
+                with open(raw, encoding="utf-8") as f:
+                    raw = f.read()
+            override = json.loads(raw)
+            tiers.update(override.get("tiers", {}))
+            for route, config in override.get("routes", {}).items():
+                routes.setdefault(route, {}).update(config)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring invalid LLM_ROUTING_POLICY: {e}")
+
+    with _lock:
+        _policy = {"tiers": tiers, "routes": routes}
+        _downgraded_until.clear()
+    return _policy
+
+
+def route_config(route: str) -> Dict[str, Any]:
+    """Policy entry of a route (falls back to "default")."""
+    routes = _policy["routes"]
+    return routes.get(route, routes["default"])
+
+
+def tier_model(tier: str) -> str:
+    """Model serving a tier (unknown tiers are treated as model names)."""
+    return _policy["tiers"].get(tier, tier)
+
+
+def is_downgraded(route: str) -> bool:
+    """Whether the route is currently downgraded for missing its latency SLO."""
+    return _downgraded_until.get(route, 0) > time.monotonic()
+
+
+def resolve_tier(route: str) -> Tuple[str, str]:
+    """
+    Tier and model for the next call of a route.
+
+    Args:
+        route (str): Route name
+
+    Returns:
+        Tuple[str, str]: (tier, model)
+    """
+    override = os.getenv(f"OPENAI_MODEL_{route.upper()}")
+    config = route_config(route)
+    tier = config.get("tier", "large")
+    if is_downgraded(route):
+        tier = config.get("downgrade_to", "fast")
+    return tier, override or tier_model(tier)
+
+
+def escalation_tier(route: str, current_tier: str) -> Optional[str]:
+    """
+    Tier to retry on after a validation failure, if the policy allows it.
+
+    Escalation is skipped while the route is downgraded, since a larger model would
+    only miss the latency SLO further.
+
+    Args:
+        route (str): Route name
+        current_tier (str): Tier that produced the invalid output
+
+    Returns:
+        Optional[str]: Tier to escalate to, or None
+    """
+    target = route_config(route).get("escalate_to")
+    if not target or target == current_tier or is_downgraded(route):
+        return None
+    return target
+
+
+def record_tier_call(route: str, tier: str, model: str, latency_ms: float, prompt_tokens: int, completion_tokens: int) -> None:
+    """
+    Record per-tier latency and cost, and update the route's SLO state.
+
+    Args:
+        route (str): Route name
+        tier (str): Tier used
+        model (str): Model used
+        latency_ms (float): Call latency
+        prompt_tokens (int): Input tokens
+        completion_tokens (int): Output tokens
+    """
+    input_cost, output_cost = MODEL_COSTS.get(model, (0.0, 0.0))
+    cost = (prompt_tokens * input_cost + completion_tokens * output_cost) / 1_000_000
+    observe(f"llm.tier.{tier}.latency_ms", latency_ms)
+    increment(f"llm.tier.{tier}.calls")
+    increment(f"llm.tier.{tier}.cost_usd", cost)
+    increment("llm.cost_usd", cost)
+
+    slo_ms = route_config(route).get("slo_ms")
+    if not slo_ms:
+        return
+    with _lock:
+        window = _latencies[route]
+        window.append(latency_ms)
+        if len(window) < SLO_MIN_SAMPLES or is_downgraded(route):
+            return
+        p95 = sorted(window)[min(len(window) - 1, int(0.95 * len(window)))]
+        if p95 > slo_ms and tier != route_config(route).get("downgrade_to", "fast"):
+            _downgraded_until[route] = time.monotonic() + DOWNGRADE_SECONDS
+            window.clear()
+            increment(f"llm.{route}.downgrades")
+            print(f"⚠️ LLM {route}: p95 {p95:.0f} ms over SLO {slo_ms} ms, downgrading for {DOWNGRADE_SECONDS:.0f}s")
+
+
+def routing_snapshot() -> Dict[str, Any]:
+    """Current policy with the routes that are downgraded right now."""
+    return {
+        "tiers": dict(_policy["tiers"]),
+        "routes": {route: {**config, "model": resolve_tier(route)[1], "downgraded": is_downgraded(route)}
+                   for route, config in _policy["routes"].items()},
+    }
+
+
+load_routing_policy()
+
+
+# SLO check section
+if __name__ == "__main__":
+    os.environ["LLM_ROUTING_POLICY"] = json.dumps({"routes": {"conversation": {"tier": "large", "slo_ms": 1000}}})
+    load_routing_policy()
+
+    tier, model = resolve_tier("conversation")
+    print(f"conversation before: {tier} -> {model}")
+    for _ in range(SLO_MIN_SAMPLES):
+        record_tier_call("conversation", tier, model, latency_ms=2500, prompt_tokens=500, completion_tokens=100)
+    downgraded_tier, downgraded_model = resolve_tier("conversation")
+    print(f"conversation after {SLO_MIN_SAMPLES} calls at 2500 ms: {downgraded_tier} -> {downgraded_model}")
+    assert downgraded_model != model, "SLO downgrade did not switch models"
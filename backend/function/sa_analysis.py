@@ -1,16 +1,43 @@
 import os
+import sys
+import json
+import hashlib
+import threading
+import time
+import numpy as np
 import requests
-import uuid
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Iterator
 from dotenv import load_dotenv
 from fastapi import UploadFile, File, Form, HTTPException
 
+try:
+    from .in_audio_precheck import precheck_audio, audio_quality_summary
+    from .in_audio_transcode import transcode_audio_in_pool
+    from .in_cache import get_cache
+    from .in_metrics import increment, observe, timer
+    from .sa_cache import get_cached_result, cache_result
+    from .sa_parser import parse_speechace_response, SpeechAceSchemaError
+    from .oa_client import chat_completion_json, chat_completion_stream, is_llm_configured
+    from .oa_json import IncrementalArrayParser, json_schema_format
+    from .oa_prompt import compact_word_table, count_tokens, is_weak_word, WEAK_PHONE_THRESHOLD
+except ImportError:
+    from in_audio_precheck import precheck_audio, audio_quality_summary
+    from in_audio_transcode import transcode_audio_in_pool
+    from in_cache import get_cache
+    from in_metrics import increment, observe, timer
+    from sa_cache import get_cached_result, cache_result
+    from sa_parser import parse_speechace_response, SpeechAceSchemaError
+    from oa_client import chat_completion_json, chat_completion_stream, is_llm_configured
+    from oa_json import IncrementalArrayParser, json_schema_format
+    from oa_prompt import compact_word_table, count_tokens, is_weak_word, WEAK_PHONE_THRESHOLD
+
 # Load environment variables
 load_dotenv()
 
 # Import existing functions (these should be available from the utils module)
 try:
-    from utils.pronunciation_analyzer import analyze_pronunciation, generate_word_feedback, convert_speechace_to_custom_response
+    from utils.pronunciation_analyzer import analyze_pronunciation, generate_word_feedback
 except ImportError:
     # Fallback if utils module is not available
     def analyze_pronunciation(audio_path, target_text):
@@ -18,244 +45,454 @@ except ImportError:
     
     def generate_word_feedback(word_data, overall_score):
         return "AI feedback not available"
-    
-    def convert_speechace_to_custom_response(speechace_response):
-        """
-        Convert SpeechAce API response to custom Francoflex response format.
-        
-        Args:
-            speechace_response: Raw SpeechAce API response (dict or JSON string)
-        
-        Returns:
-            dict: Custom response format with overall_score, word_analysis, and metadata
-        """
-        import json
-        
-        if isinstance(speechace_response, str):
-            data = json.loads(speechace_response)
-        else:
-            data = speechace_response
-        
-        # Extract overall pronunciation score from the correct nested location
-        overall_score = None
-        if 'text_score' in data and 'speechace_score' in data['text_score']:
-            speechace_data = data['text_score']['speechace_score']
-            if 'pronunciation' in speechace_data:
-                overall_score = round(speechace_data['pronunciation'])  # This is an int from 0-100
-        elif 'speechace_score' in data and 'pronunciation' in data['speechace_score']:
-            overall_score = round(data['speechace_score']['pronunciation'])
-        elif 'text_score' in data and 'quality_score' in data['text_score']:
-            overall_score = round(data['text_score']['quality_score'])
-        
-        # Extract CEFR score from the correct nested location
-        cefr_score = {}
-        if 'text_score' in data and 'cefr_score' in data['text_score']:
-            cefr_data = data['text_score']['cefr_score']
-            if 'pronunciation' in cefr_data:
-                cefr_score['level'] = cefr_data['pronunciation']  # This is a string like "B1", "B2", etc.
-        
-        # Process word analysis
-        word_analysis = []
-        if 'text_score' in data and 'word_score_list' in data['text_score']:
-            for word_data in data['text_score']['word_score_list']:
-                word_info = {
-                    'word': word_data['word'],
-                    'quality_score': round(word_data['quality_score']),
-                    'phones': {}
-                }
-                
-                # Process phones for this word
-                for phone in word_data['phone_score_list']:
-                    phone_key = phone['phone']
-                    word_info['phones'][phone_key] = {
-                        'quality_score': round(phone['quality_score']),
-                        'sound_most_like': phone.get('sound_most_like')
-                    }
-                
-                word_analysis.append(word_info)
-        
-        # Create custom response format
-        custom_response = {
-            'overall_score': overall_score,
-            'speechace_score': data.get('speechace_score', {}),
-            'cefr_score': cefr_score,
-            'word_analysis': word_analysis,
-            'metadata': {
-                'status': data.get('status', 'unknown'),
-                'api_version': 'v9',
-                'raw_api_response': data  # Include the complete raw API response
+
+# Shared cache of on-demand word feedback (get_word_feedback)
+WORD_FEEDBACK_CACHE_TTL = float(os.getenv("WORD_FEEDBACK_CACHE_TTL", 30 * 24 * 3600))
+WORD_FEEDBACK_CACHE_MAX_ENTRIES = int(os.getenv("WORD_FEEDBACK_CACHE_MAX_ENTRIES", 50000))
+
+# Analysis detail levels, cheapest first: SpeechAce scores only, plus score-band word
+# feedback computed locally, plus LLM word feedback and summary. Each has its own latency SLO.
+ANALYSIS_DETAIL_LEVELS = ("scores", "rules", "full")
+ANALYSIS_SLO_MS = {
+    "scores": float(os.getenv("ANALYSIS_SLO_MS_SCORES", 3000)),
+    "rules": float(os.getenv("ANALYSIS_SLO_MS_RULES", 3000)),
+    "full": float(os.getenv("ANALYSIS_SLO_MS_FULL", 12000)),
+}
+
+# Long sentences: weak words are split into chunks sent as parallel calls. The chunk size
+# adapts to the measured output speed so that each call finishes within the target.
+WORD_FEEDBACK_CHUNK_TARGET_MS = float(os.getenv("WORD_FEEDBACK_CHUNK_TARGET_MS", 2500))
+WORD_FEEDBACK_MIN_CHUNK = int(os.getenv("WORD_FEEDBACK_MIN_CHUNK", 3))
+WORD_FEEDBACK_MAX_CHUNK = int(os.getenv("WORD_FEEDBACK_MAX_CHUNK", 12))
+WORD_FEEDBACK_CONCURRENCY = int(os.getenv("WORD_FEEDBACK_CONCURRENCY", 4))
+THROUGHPUT_SMOOTHING = 0.3  # weight of the latest call in the moving averages
+
+_feedback_pool = ThreadPoolExecutor(max_workers=WORD_FEEDBACK_CONCURRENCY, thread_name_prefix="word-feedback")
+_throughput_lock = threading.Lock()
+_feedback_throughput = {
+    "tokens_per_second": float(os.getenv("WORD_FEEDBACK_INITIAL_TPS", 60)),
+    "tokens_per_word": 45.0,
+}
+
+# Score-band feedback for words without AI feedback: lower band edges and their messages
+FALLBACK_SCORE_BANDS = np.array([60, 80])
+FALLBACK_FEEDBACK = np.array([
+    "Practice more to improve your pronunciation.",
+    "Good pronunciation. Try to focus on clarity.",
+    "Excellent pronunciation! Keep up the good work.",
+], dtype=object)
+
+# Structured output schema for get_ai_feedback_for_words (strict mode needs an object root)
+WORD_FEEDBACK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "words": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "word": {"type": "string"},
+                    "quality_score": {"type": "number"},
+                    "ai_feedback": {"type": "string"}
+                },
+                "required": ["id", "word", "quality_score", "ai_feedback"],
+                "additionalProperties": False
             }
         }
-        
-        return custom_response
+    },
+    "required": ["words"],
+    "additionalProperties": False
+}
 
-def get_ai_feedback_for_words(word_analysis: list, overall_score: int, native_language: str = "en") -> list:
+
+def _word_feedback_request(word_analysis: list, overall_score: int, native_language: str = "en") -> Optional[Dict[str, Any]]:
     """
-    Get AI feedback for all words in a single ChatGPT request.
+    Build the word feedback completion request.
+    
+    Rows carry each word's id (see compact_word_table), which the model echoes back so
+    feedback is matched to words by position.
     
     Args:
         word_analysis: List of word analysis data
         overall_score: Overall pronunciation score
-        native_language: User's native language for feedback (default: "en")
+        native_language: User's native language for feedback
     
     Returns:
-        List of words with AI feedback
+        Dict with messages and max_tokens, or None if no word needs feedback or the LLM is not configured
     """
-    try:
-        import openai
-        from dotenv import load_dotenv
-        
-        # Load environment variables
-        load_dotenv()
-        
-        # Check if OpenAI API key is available
-        openai_api_key = os.getenv('OPENAI_API_KEY')
-        if not openai_api_key:
-            print("❌ OpenAI API key not configured")
-            return []
-        
-        # Prepare word list for ChatGPT with phone-level data
-        word_list = []
-        for word_data in word_analysis:
-            word_info = {
-                "word": word_data.get('word', ''),
-                "quality_score": word_data.get('quality_score', 0)
-            }
-            
-            # Add phone-level data if available
-            if 'phone_analysis' in word_data and word_data['phone_analysis']:
-                phone_issues = []
-                for phone in word_data['phone_analysis']:
-                    phone_score = phone.get('quality_score', 0)
-                    phone_symbol = phone.get('phone', '')
-                    if phone_score < 70:  # Highlight problematic phones
-                        phone_issues.append({
-                            "phone": phone_symbol,
-                            "score": phone_score,
-                            "issue": "needs improvement"
-                        })
-                
-                if phone_issues:
-                    word_info["problematic_phones"] = phone_issues
-            
-            word_list.append(word_info)
-        
-        # Map language codes to full names for better prompting
-        language_map = {
-            "en": "English",
-            "fr": "French", 
-            "es": "Spanish",
-            "de": "German",
-            "it": "Italian",
-            "pt": "Portuguese",
-            "nl": "Dutch",
-            "pl": "Polish",
-            "ru": "Russian",
-            "ja": "Japanese",
-            "ko": "Korean",
-            "zh": "Chinese",
-            "ar": "Arabic",
-            "hi": "Hindi",
-            "tr": "Turkish"
-        }
-        
-        native_lang_name = language_map.get(native_language, native_language)
-        
-        # Create prompt for ChatGPT
-        prompt = f"""
+    # Check if OpenAI API key is available
+    if not is_llm_configured():
+        print("❌ OpenAI API key not configured")
+        return None
+    
+    # Dense table of the words and phones below threshold, cut to the token budget
+    compacted = compact_word_table(word_analysis, include_ids=True)
+    if not compacted['table']:
+        print("✅ No words below threshold, skipping AI feedback request")
+        return None
+    print(f"🗜️ Word table: {compacted['tokens']} tokens, {compacted['included']} words")
+    
+    # Map language codes to full names for better prompting
+    language_map = {
+        "en": "English",
+        "fr": "French", 
+        "es": "Spanish",
+        "de": "German",
+        "it": "Italian",
+        "pt": "Portuguese",
+        "nl": "Dutch",
+        "pl": "Polish",
+        "ru": "Russian",
+        "ja": "Japanese",
+        "ko": "Korean",
+        "zh": "Chinese",
+        "ar": "Arabic",
+        "hi": "Hindi",
+        "tr": "Turkish"
+    }
+    
+    native_lang_name = language_map.get(native_language, native_language)
+    
+    # Create prompt for ChatGPT
+    prompt = f"""
 You are a French pronunciation expert. Analyze the following words and their pronunciation quality scores (0-100) and provide actionable feedback for each word.
 
 Overall pronunciation score: {overall_score}/100
 
-Word analysis with phone-level data:
-{json.dumps(word_list, indent=2, ensure_ascii=False)}
+Words that need work (weak phones as "phone score>sound it was heard as"):
+{compacted['table']}
 
-For each word, provide:
+For each word in the table (copy its id from the first column), provide:
 1. A brief assessment of the pronunciation quality
-2. If the word has "problematic_phones", focus on those specific sounds that need improvement
+2. If the word has weak phones, focus on those specific sounds that need improvement
 3. Give specific, actionable advice on how to improve pronunciation
-4. If the score is good (80+), provide encouragement and reinforcement
 
-IMPORTANT: When a word has "problematic_phones", focus your feedback on those specific sounds. For example:
-- If "problematic_phones" shows "n" with low score, suggest: "Focus on the 'n' sound - place your tongue against the roof of your mouth"
-- If "problematic_phones" shows "ou" with low score, suggest: "Work on the 'ou' sound - round your lips more"
+IMPORTANT: When a word has weak phones, focus your feedback on those specific sounds. For example:
+- If "n" has a low score, suggest: "Focus on the 'n' sound - place your tongue against the roof of your mouth"
+- If "u" was heard as "y", suggest: "Work on the 'ou' sound - round your lips more"
 
-Return ONLY a valid JSON array with this exact structure:
-[
-  {{
-    "word": "word_here",
-    "quality_score": score_here,
-    "ai_feedback": "Your actionable feedback here in {native_lang_name}"
-  }}
-]
+Return a JSON object with this exact structure:
+{{
+  "words": [
+    {{
+      "id": id_here,
+      "word": "word_here",
+      "quality_score": score_here,
+      "ai_feedback": "Your actionable feedback here in {native_lang_name}"
+    }}
+  ]
+}}
 
 Make sure the feedback is:
 - In {native_lang_name}
 - Actionable and specific (tell them HOW to improve)
-- Focus on problematic phones when available
+- Focus on weak phones when available
 - Constructive and encouraging
 - Brief but helpful (1-2 sentences max)
 """
+    
+    return {
+        "messages": [
+            {
+                "role": "system",
+                "content": "You are a French pronunciation expert specializing in actionable feedback. Focus on specific sounds (phones) that need improvement and provide clear instructions on how to fix them. Always respond with valid JSON only."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        "max_tokens": min(2000, 80 + 80 * compacted['included'])
+    }
+
+def word_feedback_chunk_size() -> int:
+    """
+    Weak words per word_feedback call, so that one call's output fits WORD_FEEDBACK_CHUNK_TARGET_MS
+    at the output speed measured so far.
+    
+    Returns:
+        Chunk size between WORD_FEEDBACK_MIN_CHUNK and WORD_FEEDBACK_MAX_CHUNK
+    """
+    with _throughput_lock:
+        tokens_per_second = _feedback_throughput['tokens_per_second']
+        tokens_per_word = _feedback_throughput['tokens_per_word']
+    size = int(WORD_FEEDBACK_CHUNK_TARGET_MS / 1000 * tokens_per_second / tokens_per_word)
+    return max(WORD_FEEDBACK_MIN_CHUNK, min(WORD_FEEDBACK_MAX_CHUNK, size))
+
+def _record_feedback_throughput(items: list, latency_ms: float) -> None:
+    """Update the moving averages of output tokens per second and per word from one call."""
+    if not items or latency_ms <= 0:
+        return
+    tokens = count_tokens(json.dumps(items, ensure_ascii=False))
+    with _throughput_lock:
+        for key, value in (('tokens_per_second', tokens / (latency_ms / 1000)), ('tokens_per_word', tokens / len(items))):
+            _feedback_throughput[key] += THROUGHPUT_SMOOTHING * (value - _feedback_throughput[key])
+        tokens_per_second = _feedback_throughput['tokens_per_second']
+    observe("word_feedback.tokens_per_second", tokens_per_second)
+
+def _word_feedback_call(word_analysis: list, overall_score: int, native_language: str) -> list:
+    """One word_feedback completion for a list of words; returns the feedback items."""
+    request = _word_feedback_request(word_analysis, overall_score, native_language)
+    if not request:
+        return []
+    
+    start = time.perf_counter()
+    feedback_data = chat_completion_json(
+        "word_feedback",
+        messages=request['messages'],
+        schema=WORD_FEEDBACK_SCHEMA,
+        temperature=0.7,
+        max_tokens=request['max_tokens']
+    )
+    _record_feedback_throughput(feedback_data["words"], 1000 * (time.perf_counter() - start))
+    return feedback_data["words"]
+
+def get_ai_feedback_for_words(word_analysis: list, overall_score: int, native_language: str = "en") -> list:
+    """
+    Get AI feedback for all words that need work.
+    
+    Short sentences use a single ChatGPT request. When there are more weak words than
+    word_feedback_chunk_size(), they are split into chunks sent as parallel requests and
+    merged back in sentence order, so latency stays roughly constant with sentence length.
+    
+    Args:
+        word_analysis: List of word analysis data
+        overall_score: Overall pronunciation score
+        native_language: User's native language for feedback (default: "en")
+    
+    Returns:
+        List of words with AI feedback and their id (position in word_analysis); only words
+        that need work, the others get score-based feedback in merge_word_feedback
+    """
+    try:
+        # Stable ids (sentence positions) survive chunking, so results merge back by position
+        word_analysis = [{**word_data, 'id': index} for index, word_data in enumerate(word_analysis)]
+        weak_words = [word_data for word_data in word_analysis if is_weak_word(word_data)]
+        chunk_size = word_feedback_chunk_size()
         
-        print("🤖 Sending word analysis to ChatGPT for AI feedback...")
-        
-        # Make ChatGPT request
-        client = openai.OpenAI(api_key=openai_api_key)
-        
-        try:
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a French pronunciation expert specializing in actionable feedback. Focus on specific sounds (phones) that need improvement and provide clear instructions on how to fix them. Always respond with valid JSON only."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.7,
-                max_tokens=2000
-            )
+        if len(weak_words) <= chunk_size:
+            print("🤖 Sending word analysis to ChatGPT for AI feedback...")
+            try:
+                ai_feedback_data = _word_feedback_call(word_analysis, overall_score, native_language)
+            except Exception as e:
+                print(f"❌ Error making ChatGPT request: {str(e)}")
+                return []
+        else:
+            chunks = [weak_words[i:i + chunk_size] for i in range(0, len(weak_words), chunk_size)]
+            print(f"🤖 Sending {len(weak_words)} words to ChatGPT in {len(chunks)} parallel chunks of up to {chunk_size}...")
+            increment("word_feedback.chunked_requests")
+            increment("word_feedback.chunks", len(chunks))
+            futures = [_feedback_pool.submit(_word_feedback_call, chunk, overall_score, native_language) for chunk in chunks]
             
-            # Parse ChatGPT response
-            if response.choices and len(response.choices) > 0:
-                ai_response = response.choices[0].message.content.strip()
-                print("✅ ChatGPT response received")
-                
-                # Parse JSON response
+            # Merge in chunk order; a failed chunk only loses its own words (they fall back)
+            ai_feedback_data = []
+            for future in futures:
                 try:
-                    ai_feedback_data = json.loads(ai_response)
-                    print(f"📝 AI feedback generated for {len(ai_feedback_data)} words")
-                    return ai_feedback_data
-                except json.JSONDecodeError as e:
-                    print(f"❌ Error parsing ChatGPT JSON response: {e}")
-                    print(f"Raw response: {ai_response}")
-                    return []
-            else:
-                print("❌ No response choices received from ChatGPT")
-                return []
-                
-        except Exception as e:
-            print(f"❌ Error making ChatGPT request: {str(e)}")
-            return []
+                    ai_feedback_data.extend(future.result())
+                except Exception as e:
+                    print(f"❌ Error making ChatGPT request for a chunk: {str(e)}")
+        
+        print(f"📝 AI feedback generated for {len(ai_feedback_data)} words")
+        return ai_feedback_data
             
     except Exception as e:
         print(f"❌ Error getting AI feedback: {str(e)}")
         return []
 
-def create_simplified_analysis(analysis_result: Dict[str, Any], native_language: str = "en") -> Dict[str, Any]:
+def stream_ai_feedback_for_words(word_analysis: list, overall_score: int, native_language: str = "en") -> Iterator[Dict[str, Any]]:
+    """
+    Stream AI feedback for the words that need work, one word at a time.
+    
+    Same request as get_ai_feedback_for_words, but the completion is streamed and each
+    element of the "words" array is yielded as soon as the model has finished writing it.
+    
+    Args:
+        word_analysis: List of word analysis data
+        overall_score: Overall pronunciation score
+        native_language: User's native language for feedback (default: "en")
+    
+    Yields:
+        Dict[str, Any]: word, quality_score and ai_feedback of each word, in completion order
+    """
+    try:
+        request = _word_feedback_request(word_analysis, overall_score, native_language)
+        if not request:
+            return
+        
+        print("🤖 Streaming AI feedback from ChatGPT...")
+        parser = IncrementalArrayParser("words", WORD_FEEDBACK_SCHEMA['properties']['words']['items'])
+        count = 0
+        for delta in chat_completion_stream(
+            "word_feedback",
+            request['messages'],
+            response_format=json_schema_format("word_feedback", WORD_FEEDBACK_SCHEMA),
+            temperature=0.7,
+            max_tokens=request['max_tokens']
+        ):
+            for item in parser.feed(delta):
+                count += 1
+                yield item
+        
+        if parser.rejected:
+            print(f"⚠️ Dropped {parser.rejected} malformed word feedback items")
+        print(f"📝 AI feedback streamed for {count} words")
+        
+    except Exception as e:
+        # Words already yielded keep their feedback; the caller falls back for the rest
+        print(f"❌ Error streaming AI feedback: {str(e)}")
+
+def fallback_word_feedback(quality_score: float) -> str:
+    """
+    Basic feedback for a word the LLM gave no feedback for, based on its score.
+    
+    Args:
+        quality_score: Word quality score (0-100)
+    
+    Returns:
+        Feedback text
+    """
+    return FALLBACK_FEEDBACK[np.searchsorted(FALLBACK_SCORE_BANDS, quality_score, side='right')]
+
+def fallback_feedback_for_scores(scores: list) -> list:
+    """
+    Score-band feedback for many words at once.
+    
+    Args:
+        scores: Word quality scores (0-100)
+    
+    Returns:
+        Feedback text for each score, in order
+    """
+    if not len(scores):
+        return []
+    bands = np.searchsorted(FALLBACK_SCORE_BANDS, np.asarray(scores, dtype=float), side='right')
+    return FALLBACK_FEEDBACK[bands].tolist()
+
+def _feedback_matches(ai_word: Dict[str, Any], index: int, word_data: Dict[str, Any]) -> bool:
+    """Whether a feedback item is for the word at this position (same id and same word)."""
+    return (ai_word.get('id') == index
+            and str(ai_word.get('word', '')).strip().lower() == str(word_data.get('word', '')).strip().lower())
+
+def merge_word_feedback(word_analysis: list, ai_feedback_data: list) -> list:
+    """
+    Merge AI feedback into the word list by word id, in O(n).
+    
+    Each feedback item's id is the position of its word in word_analysis; items whose id is
+    out of range or whose word doesn't match that position are ignored. Words left without
+    AI feedback get score-band feedback.
+    
+    Args:
+        word_analysis: List of word analysis data
+        ai_feedback_data: Items from get_ai_feedback_for_words (id, word, ai_feedback)
+    
+    Returns:
+        List of {word, quality_score, ai_feedback}, in sentence order
+    """
+    feedback = [None] * len(word_analysis)
+    for ai_word in ai_feedback_data:
+        index = ai_word.get('id')
+        if isinstance(index, int) and 0 <= index < len(word_analysis) and _feedback_matches(ai_word, index, word_analysis[index]):
+            feedback[index] = ai_word.get('ai_feedback')
+    
+    missing = [index for index, text in enumerate(feedback) if not text]
+    for index, text in zip(missing, fallback_feedback_for_scores([word_analysis[index].get('quality_score', 0) for index in missing])):
+        feedback[index] = text
+    
+    return [
+        {"word": word_data.get('word', ''), "quality_score": word_data.get('quality_score', 0), "ai_feedback": text}
+        for word_data, text in zip(word_analysis, feedback)
+    ]
+
+def _word_feedback_cache_key(word_data: Dict[str, Any], native_language: str) -> str:
+    """
+    Cache key of a word's feedback.
+    
+    Scores are bucketed by 10 points and only weak phones are kept, so learners with
+    near-identical mistakes on the same word share the entry.
+    """
+    phones = word_data.get('phones') or {}
+    if isinstance(phones, list):
+        phones = {phone.get('phone', ''): phone for phone in phones}
+    weak_phones = sorted(
+        (phone, int(data.get('quality_score', 0)) // 10, data.get('sound_most_like') or "")
+        for phone, data in phones.items()
+        if data.get('quality_score', 0) < WEAK_PHONE_THRESHOLD
+    )
+    signature = json.dumps([
+        str(word_data.get('word', '')).strip().lower(),
+        int(word_data.get('quality_score', 0)) // 10,
+        weak_phones
+    ], ensure_ascii=False)
+    return f"{native_language}:{hashlib.sha256(signature.encode('utf-8')).hexdigest()}"
+
+def get_word_feedback(word_data: Dict[str, Any], overall_score: int = 0, native_language: str = "en") -> Dict[str, Any]:
+    """
+    Feedback for a single word, generated on demand (e.g. when the learner opens the word).
+    
+    Results are served from the shared "word_feedback" cache when possible. Words that
+    don't need work get score-based feedback without an LLM call.
+    
+    Args:
+        word_data: Word from word_analysis (word, quality_score, phones)
+        overall_score: Overall pronunciation score for context
+        native_language: User's native language for feedback (default: "en")
+    
+    Returns:
+        Dict with word, quality_score, ai_feedback and source ("cache", "ai" or "fallback")
+    """
+    word = word_data.get('word', '')
+    quality_score = word_data.get('quality_score', 0)
+    cache = get_cache("word_feedback", WORD_FEEDBACK_CACHE_TTL, WORD_FEEDBACK_CACHE_MAX_ENTRIES)
+    cache_key = _word_feedback_cache_key(word_data, native_language)
+    
+    ai_feedback = cache.get(cache_key)
+    if ai_feedback:
+        return {"word": word, "quality_score": quality_score, "ai_feedback": ai_feedback, "source": "cache"}
+    
+    # The word is sent alone, so its id is 0; ignore items for any other word
+    ai_feedback_data = get_ai_feedback_for_words([word_data], overall_score, native_language) or []
+    ai_feedback = next((item.get('ai_feedback') for item in ai_feedback_data if _feedback_matches(item, 0, word_data)), None)
+    if ai_feedback:
+        cache.set(cache_key, ai_feedback)
+        return {"word": word, "quality_score": quality_score, "ai_feedback": ai_feedback, "source": "ai"}
+    
+    return {"word": word, "quality_score": quality_score, "ai_feedback": fallback_word_feedback(quality_score), "source": "fallback"}
+
+def record_analysis_latency(detail: str, latency_ms: float) -> None:
+    """
+    Record the latency of an analysis request against its detail level's SLO.
+    
+    Args:
+        detail: Detail level ("scores", "rules" or "full")
+        latency_ms: End-to-end latency in milliseconds
+    """
+    increment(f"analysis.{detail}.requests")
+    observe(f"analysis.{detail}.latency_ms", latency_ms)
+    slo_ms = ANALYSIS_SLO_MS.get(detail)
+    if slo_ms and latency_ms > slo_ms:
+        increment(f"analysis.{detail}.slo_misses")
+        print(f"⚠️ Analysis ({detail}) took {latency_ms:.0f} ms, over its {slo_ms:.0f} ms SLO")
+
+def create_simplified_analysis(analysis_result: Dict[str, Any], native_language: str = "en", detail: str = "full") -> Dict[str, Any]:
     """
     Create a simplified analysis with only essential data and AI feedback.
     
     Args:
         analysis_result: Full analysis result from convert_speechace_to_custom_response
         native_language: User's native language for feedback (default: "en")
+        detail: "full" for LLM feedback on every word, "rules" for score-band feedback
+            computed locally, "scores" for no feedback (words keep their phones instead,
+            for on-demand get_word_feedback calls)
     
     Returns:
         Simplified analysis with overall_score, cefr_score, and word list with AI feedback
     """
+    if detail == "scores":
+        return _scores_only_analysis(analysis_result)
+    if detail == "rules":
+        return _rules_analysis(analysis_result)
+    
     try:
         print("🔄 Creating simplified analysis with AI feedback...")
         
@@ -272,34 +509,8 @@ def create_simplified_analysis(analysis_result: Dict[str, Any], native_language:
         if not ai_feedback_data:
             print("⚠️ AI feedback generation failed, using fallback feedback")
         
-        # Create simplified word list
-        simplified_words = []
-        for word_data in word_analysis:
-            word = word_data.get('word', '')
-            quality_score = word_data.get('quality_score', 0)
-            
-            # Find corresponding AI feedback
-            ai_feedback = "Feedback non disponible"
-            if ai_feedback_data:
-                for ai_word in ai_feedback_data:
-                    if ai_word.get('word') == word:
-                        ai_feedback = ai_word.get('ai_feedback', 'Feedback non disponible')
-                        break
-            
-            # If still no feedback found, provide basic feedback based on score
-            if ai_feedback == "Feedback non disponible":
-                if quality_score >= 80:
-                    ai_feedback = "Excellent pronunciation! Keep up the good work."
-                elif quality_score >= 60:
-                    ai_feedback = "Good pronunciation. Try to focus on clarity."
-                else:
-                    ai_feedback = "Practice more to improve your pronunciation."
-            
-            simplified_words.append({
-                "word": word,
-                "quality_score": quality_score,
-                "ai_feedback": ai_feedback
-            })
+        # Create simplified word list (AI feedback by word id, score-band feedback for the rest)
+        simplified_words = merge_word_feedback(word_analysis, ai_feedback_data)
         
         # Create simplified response
         simplified_result = {
@@ -320,40 +531,132 @@ def create_simplified_analysis(analysis_result: Dict[str, Any], native_language:
             "error": str(e)
         }
 
-def analyze_pronunciation_from_url(audio_url: str, target_text: str, analysis_language: str = "fr-fr", native_language: str = "en") -> Optional[Dict[str, Any]]:
+def _scores_only_analysis(analysis_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Simplified analysis without feedback; words keep their phones for get_word_feedback."""
+    return {
+        "overall_score": analysis_result.get('overall_score', 0),
+        "cefr_score": analysis_result.get('cefr_score', {}),
+        "word_analysis": [
+            {
+                "word": word_data.get('word', ''),
+                "quality_score": word_data.get('quality_score', 0),
+                "phones": word_data.get('phones', {})
+            }
+            for word_data in analysis_result.get('word_analysis', [])
+        ]
+    }
+
+def _rules_analysis(analysis_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Simplified analysis with score-band feedback for every word, no LLM call."""
+    return {
+        "overall_score": analysis_result.get('overall_score', 0),
+        "cefr_score": analysis_result.get('cefr_score', {}),
+        "word_analysis": merge_word_feedback(analysis_result.get('word_analysis', []), [])
+    }
+
+def stream_simplified_analysis(analysis_result: Dict[str, Any], native_language: str = "en", detail: str = "full") -> Iterator[Dict[str, Any]]:
     """
-    Analyze pronunciation using SpeechAce API with audio from URL.
+    Incremental version of create_simplified_analysis, for streaming responses.
+    
+    Events, in order:
+    - {"event": "scores", "data": {overall_score, cefr_score, word_analysis (no feedback yet), audio_quality}}
+    - {"event": "word_feedback", "data": {index, word, quality_score, ai_feedback, source}} for each
+      word, as soon as the LLM finishes it (source "ai"), then score-based feedback for the rest
+      (source "fallback"); with detail "rules" all words get score-based feedback
+    - {"event": "analysis", "data": <same dict as create_simplified_analysis>}
     
     Args:
-        audio_url (str): URL of the audio file to analyze
+        analysis_result: Full analysis result from convert_speechace_to_custom_response
+        native_language: User's native language for feedback (default: "en")
+        detail: Detail level (see create_simplified_analysis); "scores" only sends "scores" and "analysis"
+    
+    Yields:
+        Dict[str, Any]: Events with "event" and "data" keys
+    """
+    if detail == "scores":
+        analysis = _scores_only_analysis(analysis_result)
+        yield {"event": "scores", "data": {**analysis, "audio_quality": analysis_result.get('audio_quality')}}
+        yield {"event": "analysis", "data": analysis}
+        return
+    
+    overall_score = analysis_result.get('overall_score', 0)
+    cefr_score = analysis_result.get('cefr_score', {})
+    word_analysis = analysis_result.get('word_analysis', [])
+    
+    simplified_words = [
+        {"word": word_data.get('word', ''), "quality_score": word_data.get('quality_score', 0), "ai_feedback": None}
+        for word_data in word_analysis
+    ]
+    yield {"event": "scores", "data": {
+        "overall_score": overall_score,
+        "cefr_score": cefr_score,
+        "word_analysis": [dict(word) for word in simplified_words],
+        "audio_quality": analysis_result.get('audio_quality')
+    }}
+    
+    # Feedback items carry their word's id (its position), see merge_word_feedback
+    ai_words = stream_ai_feedback_for_words(word_analysis, overall_score, native_language) if detail == "full" else ()
+    for ai_word in ai_words:
+        index = ai_word.get('id')
+        if not (isinstance(index, int) and 0 <= index < len(simplified_words)) or simplified_words[index]['ai_feedback']:
+            continue
+        if str(ai_word.get('word', '')).strip().lower() != simplified_words[index]['word'].strip().lower():
+            continue
+        simplified_words[index]['ai_feedback'] = ai_word['ai_feedback']
+        increment("analysis.stream.ai_words")
+        yield {"event": "word_feedback", "data": {"index": index, **simplified_words[index], "source": "ai"}}
+    
+    missing = [index for index, word in enumerate(simplified_words) if word['ai_feedback'] is None]
+    for index, text in zip(missing, fallback_feedback_for_scores([simplified_words[index]['quality_score'] for index in missing])):
+        simplified_words[index]['ai_feedback'] = text
+        yield {"event": "word_feedback", "data": {"index": index, **simplified_words[index], "source": "fallback"}}
+    
+    yield {"event": "analysis", "data": {
+        "overall_score": overall_score,
+        "cefr_score": cefr_score,
+        "word_analysis": simplified_words
+    }}
+
+def analyze_pronunciation_from_bytes(audio_bytes: bytes, target_text: str, analysis_language: str = "fr-fr") -> Optional[Dict[str, Any]]:
+    """
+    Analyze pronunciation using SpeechAce API with audio already in memory.
+    
+    Args:
+        audio_bytes (bytes): Audio file content in any supported container
         target_text (str): The text that should be pronounced
         analysis_language (str): Language/dialect for analysis (default: "fr-fr")
-        native_language (str): User's native language for AI feedback (default: "en")
     
     Returns:
         Dict containing pronunciation analysis results, or None if error
+    
+    Raises:
+        HTTPException: 422 if the audio is empty, silent or too short to score
     """
     try:
-        import openai
-        from dotenv import load_dotenv
-        
-        # Load environment variables
-        load_dotenv()
-        
         # Check if API key is available
         api_key = os.getenv('SPEECHACE_API_KEY')
         if not api_key:
             print("❌ SpeechAce API key not configured")
             return None
         
-        print(f"🎯 Analyzing pronunciation for: '{target_text}'")
-        print(f"🔗 Audio URL: {audio_url}")
-        print(f"🌍 Analysis language: {analysis_language}")
-        
-        # Download audio file from URL
-        print("📥 Downloading audio file...")
-        audio_response = requests.get(audio_url, timeout=30)
-        audio_response.raise_for_status()
+        # Same recording, text and dialect already scored: skip the paid call
+        cached_result = get_cached_result(audio_bytes, target_text, analysis_language)
+        if cached_result:
+            print("⚡ SpeechAce result served from cache")
+            return cached_result
+        original_audio = audio_bytes
+        
+        # Normalize to 16 kHz mono WAV in the process pool; if the container can't be
+        # decoded here, the original is sent labeled with its real format
+        transcoded = transcode_audio_in_pool(audio_bytes)
+        audio_bytes = transcoded['audio_bytes']
+        filename = f"audio.{transcoded['extension']}"
+        content_type = transcoded['content_type']
+        
+        # Reject unusable audio locally and only send the speech span
+        precheck = precheck_audio(audio_bytes)
+        if precheck:
+            audio_bytes = precheck['audio_bytes']
         
         # Prepare SpeechAce API request
         api_url = f"https://api.speechace.co/api/scoring/text/v9/json?key={api_key}&dialect={analysis_language}"
@@ -363,11 +666,13 @@ def analyze_pronunciation_from_url(audio_url: str, target_text: str, analysis_la
         }
         
         files = {
-            'user_audio_file': ('audio.wav', audio_response.content, 'audio/wav')
+            'user_audio_file': (filename, audio_bytes, content_type)
         }
         
         print("🚀 Sending request to SpeechAce API...")
-        api_response = requests.post(api_url, data=data, files=files, timeout=60)
+        increment("speechace.api_calls")
+        with timer("speechace.latency_ms"):
+            api_response = requests.post(api_url, data=data, files=files, timeout=60)
         api_response.raise_for_status()
         
         result = api_response.json()
@@ -378,12 +683,54 @@ def analyze_pronunciation_from_url(audio_url: str, target_text: str, analysis_la
             print(f"❌ SpeechAce API returned error: {result}")
             return None
         
-        # Parse and format the response using existing function
-        analysis_result = convert_speechace_to_custom_response(result)
+        # Validate and parse the response once, then format it
+        analysis_result = parse_speechace_response(result).to_custom_response()
+        analysis_result['audio_quality'] = audio_quality_summary(precheck)
+        cache_result(original_audio, target_text, analysis_language, analysis_result)
         print(f"📊 Analysis completed successfully")
         
         return analysis_result
         
+    except HTTPException:
+        raise
+    except SpeechAceSchemaError as e:
+        print(f"❌ Unexpected SpeechAce response: {str(e)}")
+        return None
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Network error: {str(e)}")
+        return None
+    except Exception as e:
+        print(f"❌ Analysis error: {str(e)}")
+        return None
+
+
+def analyze_pronunciation_from_url(audio_url: str, target_text: str, analysis_language: str = "fr-fr", native_language: str = "en") -> Optional[Dict[str, Any]]:
+    """
+    Analyze pronunciation using SpeechAce API with audio from URL.
+    
+    Args:
+        audio_url (str): URL of the audio file to analyze
+        target_text (str): The text that should be pronounced
+        analysis_language (str): Language/dialect for analysis (default: "fr-fr")
+        native_language (str): User's native language for AI feedback (default: "en")
+    
+    Returns:
+        Dict containing pronunciation analysis results, or None if error
+    """
+    try:
+        print(f"🎯 Analyzing pronunciation for: '{target_text}'")
+        print(f"🔗 Audio URL: {audio_url}")
+        print(f"🌍 Analysis language: {analysis_language}")
+        
+        # Download audio file from URL
+        print("📥 Downloading audio file...")
+        audio_response = requests.get(audio_url, timeout=30)
+        audio_response.raise_for_status()
+        
+        return analyze_pronunciation_from_bytes(audio_response.content, target_text, analysis_language)
+        
+    except HTTPException:
+        raise
     except requests.exceptions.RequestException as e:
         print(f"❌ Network error: {str(e)}")
         return None
@@ -403,22 +750,12 @@ def analyze_pronunciation_endpoint(
     if not api_key:
         raise HTTPException(status_code=500, detail="SpeechAce API key not configured")
     
-    # Save uploaded audio file
-    file_id = str(uuid.uuid4())
-    audio_path = UPLOAD_DIR / f"{file_id}.wav"
-    
     try:
-        with open(audio_path, "wb") as buffer:
-            shutil.copyfileobj(audio_file.file, buffer)
-        
-        # Analyze pronunciation
-        custom_response, error_message = analyze_pronunciation(str(audio_path), target_text)
-        
-        if error_message:
-            raise HTTPException(status_code=500, detail=error_message)
+        # The upload's spooled buffer (in memory below 1 MB) goes straight to SpeechAce
+        custom_response, raw_or_error = analyze_pronunciation(audio_file.file, target_text)
         
         if not custom_response:
-            raise HTTPException(status_code=500, detail="Failed to analyze pronunciation")
+            raise HTTPException(status_code=500, detail=raw_or_error or "Failed to analyze pronunciation")
         
         # Generate AI feedback for each word
         overall_score = custom_response.get('overall_score', 0)
@@ -432,12 +769,44 @@ def analyze_pronunciation_endpoint(
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis error: {str(e)}")
-    finally:
-        # Clean up uploaded file
-        if audio_path.exists():
-            audio_path.unlink()
 
 # Test section
+if __name__ == "__main__" and "--benchmark" in sys.argv:
+    # Benchmark section: merging feedback into sentences with many repeated tokens
+    # (python sa_analysis.py --benchmark)
+    import random
+    
+    def merge_by_word_match(word_analysis, ai_feedback_data):
+        # Previous approach: scan the feedback list for the first item with the same word
+        merged = []
+        for word_data in word_analysis:
+            ai_feedback = next((item['ai_feedback'] for item in ai_feedback_data if item.get('word') == word_data['word']), None)
+            merged.append(ai_feedback or fallback_word_feedback(word_data['quality_score']))
+        return merged
+    
+    random.seed(0)
+    function_words = ["de", "la", "le", "et", "les", "des", "un", "une"]
+    for n_words in (20, 200, 2000):
+        # Half repeated function words, half distinct words
+        words = [{"word": random.choice(function_words) if random.random() < 0.5 else f"mot{index}", "quality_score": random.randint(20, 100)}
+                 for index in range(n_words)]
+        feedback = [{"id": index, "word": word["word"], "ai_feedback": f"tip {index}"}
+                    for index, word in enumerate(words) if word["quality_score"] < 80]
+        
+        start = time.perf_counter()
+        legacy = merge_by_word_match(words, feedback)
+        legacy_ms = 1000 * (time.perf_counter() - start)
+        start = time.perf_counter()
+        merged = merge_word_feedback(words, feedback)
+        merged_ms = 1000 * (time.perf_counter() - start)
+        
+        expected = {item["id"]: item["ai_feedback"] for item in feedback}
+        legacy_wrong = sum(1 for index, text in expected.items() if legacy[index] != text)
+        merged_wrong = sum(1 for index, text in expected.items() if merged[index]["ai_feedback"] != text)
+        print(f"{n_words:>5} words, {len(feedback)} tips: word match {legacy_ms:8.2f} ms ({legacy_wrong} misassigned), "
+              f"by id {merged_ms:6.2f} ms ({merged_wrong} misassigned)")
+    sys.exit(0)
+
 if __name__ == "__main__":
     # Test the new function
     test_audio_url = "https://xwcuvekkgfxpjxemhwcp.supabase.co/storage/v1/object/public/Audio_file/025b6a0c-5b54-4b9a-bae2-f71f1603bc25.mp3"  # Replace with actual audio URL
@@ -474,7 +843,6 @@ if __name__ == "__main__":
             print("\n" + "="*60)
             print("🔄 SIMPLIFIED ANALYSIS WITH AI FEEDBACK:")
             print("="*60)
-            import json
             print(json.dumps(simplified_result, indent=2, ensure_ascii=False))
             print("="*60)
             
@@ -0,0 +1,85 @@
+"""
+SpeechAce result cache keyed by audio hash, target text and dialect.
+
+Client retries and Streamlit reruns score the exact same recording several
+times; with this cache only the first request pays for a SpeechAce call.
+"""
+
+import hashlib
+import os
+from typing import Any, Dict, Optional
+
+try:
+    from .in_cache import get_cache, PersistentCache
+except ImportError:
+    from in_cache import get_cache, PersistentCache
+
+SPEECHACE_CACHE_TTL = float(os.getenv("SPEECHACE_CACHE_TTL", 7 * 24 * 3600))
+SPEECHACE_CACHE_MAX_ENTRIES = int(os.getenv("SPEECHACE_CACHE_MAX_ENTRIES", 5000))
+SPEECHACE_CACHE_MAX_BYTES = int(os.getenv("SPEECHACE_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+
+
+def get_speechace_cache() -> PersistentCache:
+    """
+    Get the shared SpeechAce result cache.
+
+    Returns:
+        PersistentCache: Cache namespace "speechace"
+    """
+    return get_cache("speechace", SPEECHACE_CACHE_TTL, SPEECHACE_CACHE_MAX_ENTRIES, SPEECHACE_CACHE_MAX_BYTES)
+
+
+def speechace_cache_key(audio_bytes: bytes, target_text: str, dialect: str, kind: str = "analysis") -> str:
+    """
+    Build the cache key for a scoring request.
+
+    Args:
+        audio_bytes (bytes): Audio exactly as received (before any processing)
+        target_text (str): The text that should be pronounced
+        dialect (str): SpeechAce dialect, e.g. "fr-fr"
+        kind (str): What is cached ("analysis" for the converted result, "raw" for the API response)
+
+    Returns:
+        str: Key combining the SHA-256 of the audio with the text and dialect
+    """
+    audio_hash = hashlib.sha256(audio_bytes).hexdigest()
+    text_hash = hashlib.sha256(target_text.strip().encode("utf-8")).hexdigest()[:16]
+    return f"{kind}:{dialect.lower()}:{text_hash}:{audio_hash}"
+
+
+def get_cached_result(audio_bytes: bytes, target_text: str, dialect: str, kind: str = "analysis") -> Optional[Dict[str, Any]]:
+    """
+    Look up a previous scoring result for this exact recording.
+
+    Args:
+        audio_bytes (bytes): Audio exactly as received
+        target_text (str): The text that should be pronounced
+        dialect (str): SpeechAce dialect
+        kind (str): "analysis" or "raw"
+
+    Returns:
+        Optional[Dict[str, Any]]: The cached result, or None
+    """
+    try:
+        return get_speechace_cache().get(speechace_cache_key(audio_bytes, target_text, dialect, kind))
+    except Exception as e:
+        print(f"⚠️ SpeechAce cache lookup failed: {e}")
+        return None
+
+
+def cache_result(audio_bytes: bytes, target_text: str, dialect: str, result: Dict[str, Any], kind: str = "analysis") -> None:
+    """
+    Store a successful scoring result.
+
+    Args:
+        audio_bytes (bytes): Audio exactly as received
+        target_text (str): The text that should be pronounced
+        dialect (str): SpeechAce dialect
+        result (Dict[str, Any]): Result to cache
+        kind (str): "analysis" or "raw"
+    """
+    try:
+        get_speechace_cache().set(speechace_cache_key(audio_bytes, target_text, dialect, kind), result)
+    except Exception as e:
+        # A cache failure must never fail the scoring request
+        print(f"⚠️ Failed to cache SpeechAce result: {e}")
@@ -0,0 +1,427 @@
+"""
+Typed parser for SpeechAce v9 scoring responses.
+
+The response is validated once and decoded into compact __slots__ objects
+(word -> syllables / phones). Every consumer derives its view from this model:
+the API response (to_custom_response), the legacy Streamlit analysis
+(to_analysis_data) and the compact LLM input (to_compact_json).
+"""
+
+import json
+from typing import Any, Dict, Optional, Tuple, Union
+
+# Phones scoring below this are flagged as needing work
+NEEDS_WORK_THRESHOLD = 70
+
+
+class SpeechAceSchemaError(ValueError):
+    """Raised when a response does not match the SpeechAce v9 schema."""
+
+
+class PhoneScore:
+    """Score of one phone within a word."""
+
+    __slots__ = ("phone", "quality_score", "sound_most_like")
+
+    def __init__(self, phone: str, quality_score: float, sound_most_like: Optional[str]):
+        self.phone = phone
+        self.quality_score = quality_score
+        self.sound_most_like = sound_most_like
+
+    @property
+    def needs_work(self) -> bool:
+        """Whether the phone scored below the needs-work threshold."""
+        return self.quality_score < NEEDS_WORK_THRESHOLD
+
+
+class SyllableScore:
+    """Score of one syllable within a word."""
+
+    __slots__ = ("letters", "quality_score", "phone_count")
+
+    def __init__(self, letters: str, quality_score: float, phone_count: int):
+        self.letters = letters
+        self.quality_score = quality_score
+        self.phone_count = phone_count
+
+
+class WordScore:
+    """Score of one word with its syllables and phones."""
+
+    __slots__ = ("word", "quality_score", "syllables", "phones")
+
+    def __init__(self, word: str, quality_score: float, syllables: Tuple[SyllableScore, ...], phones: Tuple[PhoneScore, ...]):
+        self.word = word
+        self.quality_score = quality_score
+        self.syllables = syllables
+        self.phones = phones
+
+
+class SpeechAceResult:
+    """Validated SpeechAce v9 response."""
+
+    __slots__ = ("status", "overall_score", "speechace_score", "cefr_score", "cefr_level", "words", "raw")
+
+    def __init__(
+        self,
+        status: str,
+        overall_score: Optional[float],
+        speechace_score: Dict[str, Any],
+        cefr_score: Dict[str, Any],
+        cefr_level: Optional[str],
+        words: Tuple[WordScore, ...],
+        raw: Dict[str, Any],
+    ):
+        self.status = status
+        self.overall_score = overall_score
+        self.speechace_score = speechace_score
+        self.cefr_score = cefr_score
+        self.cefr_level = cefr_level
+        self.words = words
+        self.raw = raw
+
+    def to_custom_response(self, include_raw: bool = True) -> Dict[str, Any]:
+        """
+        Francoflex API response format (overall_score, cefr_score, word_analysis, metadata).
+
+        Args:
+            include_raw: Include the complete raw API response under metadata
+
+        Returns:
+            Dict[str, Any]: Same structure convert_speechace_to_custom_response has always returned
+        """
+        word_analysis = []
+        for word in self.words:
+            phones = {}
+            for phone in word.phones:
+                phones[phone.phone] = {
+                    'quality_score': round(phone.quality_score),
+                    'sound_most_like': phone.sound_most_like
+                }
+            word_analysis.append({
+                'word': word.word,
+                'quality_score': round(word.quality_score),
+                'phones': phones
+            })
+
+        metadata = {'status': self.status, 'api_version': 'v9'}
+        if include_raw:
+            metadata['raw_api_response'] = self.raw
+
+        return {
+            'overall_score': round(self.overall_score) if self.overall_score is not None else None,
+            'speechace_score': self.speechace_score,
+            'cefr_score': {'level': self.cefr_level} if self.cefr_level else {},
+            'word_analysis': word_analysis,
+            'metadata': metadata
+        }
+
+    def to_analysis_data(self) -> Dict[str, Any]:
+        """
+        Syllable/phone breakdown used by the Streamlit app.
+
+        Returns:
+            Dict[str, Any]: overall_score and word_analysis with syllables and phones lists
+        """
+        return {
+            'overall_score': self.overall_score,
+            'word_analysis': [
+                {
+                    'word': word.word,
+                    'quality_score': word.quality_score,
+                    'syllables': [
+                        {
+                            'letters': syllable.letters,
+                            'quality_score': syllable.quality_score,
+                            'phone_count': syllable.phone_count
+                        }
+                        for syllable in word.syllables
+                    ],
+                    'phones': [
+                        {
+                            'target_phone': phone.phone,
+                            'quality_score': phone.quality_score,
+                            'sound_most_like': phone.sound_most_like,
+                            'needs_work': phone.needs_work
+                        }
+                        for phone in word.phones
+                    ]
+                }
+                for word in self.words
+            ]
+        }
+
+    def to_compact_json(self) -> Dict[str, Any]:
+        """
+        Reduced structure for LLM prompts: scores plus words with their phones.
+
+        Returns:
+            Dict[str, Any]: speechace_score, cefr_score and words
+        """
+        return {
+            'speechace_score': self.speechace_score,
+            'cefr_score': self.cefr_score,
+            'words': [
+                {
+                    'word': word.word,
+                    'quality_score': round(word.quality_score),
+                    'phones': {
+                        phone.phone: {
+                            'quality_score': round(phone.quality_score),
+                            'sound_most_like': phone.sound_most_like
+                        }
+                        for phone in word.phones
+                    }
+                }
+                for word in self.words
+            ]
+        }
+
+
+def _number(value: Any, path: str) -> float:
+    """Validate a numeric field."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise SpeechAceSchemaError(f"{path} must be a number, got {type(value).__name__}")
+    return value
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _word_schema_error(word_data: Any, index: int) -> SpeechAceSchemaError:
+    """
+    Locate the first schema violation in a word entry.
+
+    Only called once the fast path in _parse_word has failed, so the field paths used
+    in error messages are never formatted for valid responses.
+    """
+    path = f"text_score.word_score_list[{index}]"
+    if not isinstance(word_data, dict):
+        return SpeechAceSchemaError(f"{path} must be an object")
+    if not isinstance(word_data.get('word'), str):
+        return SpeechAceSchemaError(f"{path}.word must be a string")
+
+    phone_list = word_data.get('phone_score_list', [])
+    syllable_list = word_data.get('syllable_score_list', [])
+    if not isinstance(phone_list, list) or not isinstance(syllable_list, list):
+        return SpeechAceSchemaError(f"{path} phone/syllable score lists must be arrays")
+
+    try:
+        for phone_index, phone in enumerate(phone_list):
+            phone_path = f"{path}.phone_score_list[{phone_index}]"
+            if not isinstance(phone, dict) or not isinstance(phone.get('phone'), str):
+                return SpeechAceSchemaError(f"{phone_path}.phone must be a string")
+            _number(phone.get('quality_score'), f"{phone_path}.quality_score")
+
+        for syllable_index, syllable in enumerate(syllable_list):
+            syllable_path = f"{path}.syllable_score_list[{syllable_index}]"
+            if not isinstance(syllable, dict):
+                return SpeechAceSchemaError(f"{syllable_path} must be an object")
+            _number(syllable.get('quality_score'), f"{syllable_path}.quality_score")
+
+        _number(word_data.get('quality_score'), f"{path}.quality_score")
+    except SpeechAceSchemaError as e:
+        return e
+    return SpeechAceSchemaError(f"{path} does not match the v9 schema")
+
+
+def _parse_word(word_data: Any, index: int) -> WordScore:
+    """Validate and decode one entry of word_score_list."""
+    if not isinstance(word_data, dict):
+        raise _word_schema_error(word_data, index)
+
+    word = word_data.get('word')
+    quality_score = word_data.get('quality_score')
+    phone_list = word_data.get('phone_score_list', [])
+    syllable_list = word_data.get('syllable_score_list', [])
+    if not (isinstance(word, str) and _is_number(quality_score)
+            and isinstance(phone_list, list) and isinstance(syllable_list, list)):
+        raise _word_schema_error(word_data, index)
+
+    phones = []
+    for phone in phone_list:
+        if not isinstance(phone, dict):
+            raise _word_schema_error(word_data, index)
+        phone_name = phone.get('phone')
+        phone_score = phone.get('quality_score')
+        if not (isinstance(phone_name, str) and _is_number(phone_score)):
+            raise _word_schema_error(word_data, index)
+        phones.append(PhoneScore(phone_name, phone_score, phone.get('sound_most_like')))
+
+    syllables = []
+    for syllable in syllable_list:
+        if not isinstance(syllable, dict):
+            raise _word_schema_error(word_data, index)
+        syllable_score = syllable.get('quality_score')
+        if not _is_number(syllable_score):
+            raise _word_schema_error(word_data, index)
+        syllables.append(SyllableScore(syllable.get('letters', ''), syllable_score, syllable.get('phone_count', 0)))
+
+    return WordScore(word, quality_score, tuple(syllables), tuple(phones))
+
+
+def parse_speechace_response(speechace_response: Union[str, bytes, Dict[str, Any]]) -> SpeechAceResult:
+    """
+    Validate a SpeechAce v9 response and decode it into the shared model.
+
+    Args:
+        speechace_response: Raw SpeechAce API response (dict or JSON string)
+
+    Returns:
+        SpeechAceResult: Typed result
+
+    Raises:
+        SpeechAceSchemaError: If the response does not match the v9 schema
+    """
+    if isinstance(speechace_response, (str, bytes)):
+        try:
+            data = json.loads(speechace_response)
+        except json.JSONDecodeError as e:
+            raise SpeechAceSchemaError(f"Response is not valid JSON: {e}") from e
+    else:
+        data = speechace_response
+
+    if not isinstance(data, dict):
+        raise SpeechAceSchemaError("Response must be a JSON object")
+
+    text_score = data.get('text_score', {})
+    if not isinstance(text_score, dict):
+        raise SpeechAceSchemaError("text_score must be an object")
+
+    word_list = text_score.get('word_score_list', [])
+    if not isinstance(word_list, list):
+        raise SpeechAceSchemaError("text_score.word_score_list must be an array")
+
+    words = tuple(_parse_word(word_data, index) for index, word_data in enumerate(word_list))
+
+    # Overall pronunciation score: v9 nests it under text_score; older shapes are still accepted
+    overall_score = None
+    nested_score = text_score.get('speechace_score') or {}
+    top_level_score = data.get('speechace_score') or {}
+    if 'pronunciation' in nested_score:
+        overall_score = _number(nested_score['pronunciation'], "text_score.speechace_score.pronunciation")
+    elif 'pronunciation' in top_level_score:
+        overall_score = _number(top_level_score['pronunciation'], "speechace_score.pronunciation")
+    elif 'quality_score' in text_score:
+        overall_score = _number(text_score['quality_score'], "text_score.quality_score")
+    elif 'word_score_list' in text_score:
+        overall_score = sum(word.quality_score for word in words) / len(words) if words else 0
+
+    cefr_level = (text_score.get('cefr_score') or {}).get('pronunciation')
+
+    return SpeechAceResult(
+        status=data.get('status', 'unknown'),
+        overall_score=overall_score,
+        speechace_score=data.get('speechace_score', {}),
+        cefr_score=data.get('cefr_score', {}),
+        cefr_level=cefr_level,
+        words=words,
+        raw=data
+    )
+
+
+def convert_speechace_to_custom_response(speechace_response: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Convert SpeechAce API response to custom Francoflex response format.
+
+    Args:
+        speechace_response: Raw SpeechAce API response (dict or JSON string)
+
+    Returns:
+        dict: Custom response format with overall_score, word_analysis, and metadata
+    """
+    return parse_speechace_response(speechace_response).to_custom_response()
+
+
+def _synthetic_response(n_words: int, phones_per_word: int = 6) -> Dict[str, Any]:
+    """Build a large SpeechAce-shaped response for benchmarking."""
+    words = []
+    for i in range(n_words):
+        phones = [
+            {"phone": f"p{j}", "quality_score": (i * 7 + j * 13) % 100 + 0.5, "sound_most_like": f"p{(j + 1) % phones_per_word}",
+             "extent": [i * 10 + j, i * 10 + j + 1], "stress_level": None, "child_phones": [{"sound_most_like": "x", "quality_score": 50.0}]}
+            for j in range(phones_per_word)
+        ]
+        syllables = [
+            {"letters": f"s{k}", "quality_score": 70.0 + k, "phone_count": phones_per_word // 2, "extent": [k, k + 1]}
+            for k in range(2)
+        ]
+        words.append({"word": f"mot{i}", "quality_score": (i * 11) % 100 + 0.25, "phone_score_list": phones, "syllable_score_list": syllables})
+    return {
+        "status": "success",
+        "text_score": {
+            "text": " ".join(word["word"] for word in words),
+            "word_score_list": words,
+            "speechace_score": {"pronunciation": 78.4},
+            "cefr_score": {"pronunciation": "B2"},
+        },
+    }
+
+
+# Benchmark section
+if __name__ == "__main__":
+    import timeit
+    import tracemalloc
+
+    def legacy_convert(data):
+        """The dict-walking conversion previously duplicated across the codebase."""
+        overall_score = None
+        if 'text_score' in data and 'speechace_score' in data['text_score']:
+            speechace_data = data['text_score']['speechace_score']
+            if 'pronunciation' in speechace_data:
+                overall_score = round(speechace_data['pronunciation'])
+        cefr_score = {}
+        if 'text_score' in data and 'cefr_score' in data['text_score']:
+            cefr_score['level'] = data['text_score']['cefr_score']['pronunciation']
+        word_analysis = []
+        for word_data in data['text_score']['word_score_list']:
+            word_info = {'word': word_data['word'], 'quality_score': round(word_data['quality_score']), 'phones': {}}
+            for phone in word_data['phone_score_list']:
+                word_info['phones'][phone['phone']] = {'quality_score': round(phone['quality_score']), 'sound_most_like': phone.get('sound_most_like')}
+            word_analysis.append(word_info)
+        return {'overall_score': overall_score, 'speechace_score': data.get('speechace_score', {}), 'cefr_score': cefr_score,
+                'word_analysis': word_analysis, 'metadata': {'status': data.get('status', 'unknown'), 'api_version': 'v9', 'raw_api_response': data}}
+
+    def legacy_analysis_data(data):
+        word_analysis = []
+        for word_data in data['text_score']['word_score_list']:
+            word_info = {'word': word_data['word'], 'quality_score': word_data['quality_score'], 'syllables': [], 'phones': []}
+            for syll in word_data['syllable_score_list']:
+                word_info['syllables'].append({'letters': syll['letters'], 'quality_score': syll['quality_score'], 'phone_count': syll['phone_count']})
+            for phone in word_data['phone_score_list']:
+                word_info['phones'].append({'target_phone': phone['phone'], 'quality_score': phone['quality_score'],
+                                            'sound_most_like': phone.get('sound_most_like'), 'needs_work': phone['quality_score'] < 70})
+            word_analysis.append(word_info)
+        return {'overall_score': data['text_score']['speechace_score']['pronunciation'], 'word_analysis': word_analysis}
+
+    def legacy_pipeline(payload):
+        # Each consumer decoded and walked the response on its own
+        return legacy_convert(json.loads(payload)), legacy_analysis_data(json.loads(payload))
+
+    def model_pipeline(payload):
+        # Decode + validate once, then derive the same two views from the typed model
+        result = parse_speechace_response(payload)
+        return result.to_custom_response(), result.to_analysis_data()
+
+    def peak_memory(fn, payload):
+        tracemalloc.start()
+        fn(payload)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak
+
+    sample = json.dumps(_synthetic_response(3))
+    assert model_pipeline(sample) == legacy_pipeline(sample)
+
+    print(f"{'words':>6} {'legacy ms':>10} {'parser ms':>10} {'legacy KiB':>11} {'parser KiB':>11}")
+    for n_words in (20, 200, 2000):
+        payload = json.dumps(_synthetic_response(n_words))
+        runs = max(3, 2000 // n_words)
+        # Best of 5 repeats, to keep scheduler noise out of the comparison
+        legacy_ms = 1000 * min(timeit.repeat(lambda: legacy_pipeline(payload), number=runs, repeat=5)) / runs
+        model_ms = 1000 * min(timeit.repeat(lambda: model_pipeline(payload), number=runs, repeat=5)) / runs
+        print(
+            f"{n_words:>6} {legacy_ms:>10.2f} {model_ms:>10.2f} "
+            f"{peak_memory(legacy_pipeline, payload) / 1024:>11.0f} {peak_memory(model_pipeline, payload) / 1024:>11.0f}"
+        )
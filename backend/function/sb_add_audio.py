@@ -58,7 +58,13 @@ def save_audio_file_from_path(file_path: str, file_extension: str = "mp3") -> Op
 
 # Test it
 if __name__ == "__main__":
-    test_audio_path = "../data/recordings/058c17c7-f8b1-48bb-a9b0-7fdbe279d258.wav"
+    from in_recordings import get_recording_store
+    
+    latest = get_recording_store().list_recordings(limit=1)
+    if not latest:
+        print("❌ No recordings in the recording store")
+        exit(1)
+    test_audio_path = latest[0]["path"]
     
     public_url = save_audio_file_from_path(test_audio_path, "wav")
     
@@ -88,6 +88,34 @@ def get_all_messages_from_session(session_id: str) -> List[Dict[str, Any]]:
         raise e
 
 
+def get_recent_messages(session_id: str, limit: int = 20) -> Dict[str, Any]:
+    """
+    Retrieve the last messages of a session, oldest first.
+    
+    Args:
+        session_id (str): The ID of the session to get messages from
+        limit (int): Maximum number of messages
+        
+    Returns:
+        Dict[str, Any]: messages (up to limit, ordered by creation time) and has_more
+        
+    Raises:
+        Exception: If the database operation fails
+    """
+    try:
+        supabase = get_supabase_client()
+        
+        # Newest first with one extra row to know whether older messages exist
+        result = supabase.table('messages').select('*').eq('session', session_id).order('created_at', desc=True).limit(limit + 1).execute()
+        
+        messages = list(reversed(result.data[:limit]))
+        return {"messages": messages, "has_more": len(result.data) > limit}
+        
+    except Exception as e:
+        print(f"Error retrieving recent messages: {str(e)}")
+        raise e
+
+
 # Example usage
 if __name__ == "__main__":
     # Test with dummy user data
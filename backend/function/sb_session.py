@@ -1,5 +1,8 @@
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+import os
+import threading
 import uuid
 
 # Handle both relative and absolute imports
@@ -9,11 +12,114 @@ except ImportError:
     from sb_client import get_supabase_client
 
 from sb_pref import get_preferences  # Use the new get_pref function
-from oa_generate_question import generate_questions
+from oa_generate_question import stream_questions
 from el_tts import text_to_audio
+from oa_generate_greeting import start_greeting
 
+# Concurrent text-to-speech calls while creating a session
+SESSION_TTS_CONCURRENCY = int(os.getenv("SESSION_TTS_CONCURRENCY", 4))
+# Questions whose audio is synthesized during create_session; the rest is synthesized
+# lazily when get_next_question serves them (prefetched one question ahead)
+SESSION_EAGER_AUDIO = int(os.getenv("SESSION_EAGER_AUDIO", 1))
+# Questions the session greeting mentions (see oa_generate_greeting.extract_session_topics)
+GREETING_TOPICS = 3
 
-def create_session(user_id: str, level: str, mode: str = "repeat") -> List[Dict[str, str]]:
+_audio_pool = ThreadPoolExecutor(max_workers=SESSION_TTS_CONCURRENCY, thread_name_prefix="session-tts")
+_audio_inflight: Dict[Tuple[str, int], Future] = {}
+_audio_inflight_lock = threading.Lock()
+
+# Session content is a single JSON column updated by read-modify-write (audio backfills,
+# status updates); writers of the same session are serialized on one of these striped locks
+_content_locks = [threading.Lock() for _ in range(64)]
+
+
+def _content_lock(session_id: str) -> threading.Lock:
+    """Lock guarding read-modify-write of a session's content in this process."""
+    return _content_locks[hash(session_id) % len(_content_locks)]
+
+
+def _backfill_audio_url(session_id: str, question_index: int, audio_url: str) -> None:
+    """Write a lazily synthesized audio URL into the session content."""
+    supabase = get_supabase_client()
+    with _content_lock(session_id):
+        result = supabase.table('sessions').select('content').eq('id', session_id).execute()
+        if not result.data:
+            return
+        content = result.data[0]['content']
+        if question_index < len(content):
+            content[question_index]['audio_url'] = audio_url
+            supabase.table('sessions').update({'content': content}).eq('id', session_id).execute()
+
+
+def _synthesize_question_audio(session_id: str, question_index: int, question: Dict[str, Any]) -> Optional[str]:
+    audio_url = text_to_audio(question['learning'], audio_format=question.get('audio_format'))
+    if audio_url:
+        _backfill_audio_url(session_id, question_index, audio_url)
+        print(f"✅ Audio backfilled for question {question_index + 1} of session {session_id}")
+    else:
+        print(f"❌ Failed to generate audio for question {question_index + 1}, will retry on next request")
+    return audio_url
+
+
+def _schedule_question_audio(session_id: str, question_index: int, question: Dict[str, Any]) -> Future:
+    """Start (or join) the synthesis of a question's audio; one job per question at a time."""
+    key = (session_id, question_index)
+    with _audio_inflight_lock:
+        future = _audio_inflight.get(key)
+        if future is None:
+            future = _audio_pool.submit(_synthesize_question_audio, session_id, question_index, question)
+            _audio_inflight[key] = future
+            future.add_done_callback(lambda _: _audio_inflight.pop(key, None))
+        return future
+
+
+def ensure_question_audio(session_id: str, question_index: int, question: Dict[str, Any]) -> Optional[str]:
+    """
+    Return a question's audio URL, synthesizing it now if it was deferred or failed before.
+    
+    Waits for an in-flight prefetch of the same question instead of starting a second one.
+    
+    Args:
+        session_id (str): The session ID
+        question_index (int): Index of the question in the session content
+        question (Dict[str, Any]): The question entry
+        
+    Returns:
+        Optional[str]: Audio URL, or None if synthesis failed
+    """
+    if question.get('audio_url'):
+        return question['audio_url']
+    return _schedule_question_audio(session_id, question_index, question).result()
+
+
+def prefetch_question_audio(session_id: str, question_index: int, question: Dict[str, Any]) -> None:
+    """
+    Synthesize a question's audio in the background if it has none yet.
+    
+    Args:
+        session_id (str): The session ID
+        question_index (int): Index of the question in the session content
+        question (Dict[str, Any]): The question entry
+    """
+    if not question.get('audio_url'):
+        _schedule_question_audio(session_id, question_index, question)
+
+
+def _start_session_greeting(session_id: str, user_pref: Dict[str, Any], questions: List[Dict[str, str]], level: str) -> None:
+    """Start the session greeting (template now, LLM version in the background)."""
+    try:
+        start_greeting(session_id, user_pref.get('name', ''), user_pref.get('learning', 'fr'), list(questions), level)
+    except Exception as e:
+        print(f"⚠️ Could not start session greeting: {str(e)}")
+
+
+def create_session(
+    user_id: str,
+    level: str,
+    mode: str = "repeat",
+    audio_format: Optional[str] = None,
+    session_id: Optional[str] = None
+) -> List[Dict[str, str]]:
     """
     Create a new learning session by combining user preferences, generating questions, and creating audio.
     
@@ -21,9 +127,14 @@ def create_session(user_id: str, level: str, mode: str = "repeat") -> List[Dict[
         user_id (str): The user's unique identifier
         level (str): The language learning level (A1, A2, B1, B2, C1, C2)
         mode (str): The session mode ("repeat" or "conversational")
+        audio_format (Optional[str]): TTS output profile negotiated for the client (default: server default)
+        session_id (Optional[str]): Id of the new session (default: a new UUID). The session
+            greeting is started under this id as soon as the first questions are known
+            (see oa_generate_greeting.get_greeting)
         
     Returns:
         List[Dict[str, str]]: List of questions with learning text, native translation, and audio URL
+            (None for questions whose audio is deferred, see SESSION_EAGER_AUDIO)
     """
     try:
         print(f"🎯 Creating session for user {user_id} at level {level}")
@@ -37,62 +148,74 @@ def create_session(user_id: str, level: str, mode: str = "repeat") -> List[Dict[
         
         print(f"✅ Found preferences: {user_pref}")
         
-        if mode == "conversational":
-            # For conversational mode, create a simple greeting message
-            print("💬 Creating conversational session...")
-            questions = [{
-                "learning": f"Bonjour! Je suis Madame AI, votre assistante Francoflex. Comment puis-je vous aider aujourd'hui?",
-                "native": f"Hello! I am Madame AI, your Francoflex assistant. How can I help you today?",
-                "status": "not_done"
-            }]
-            print(f"✅ Created conversational greeting")
-        else:
-            # Step 2: Generate questions using preferences for repeat mode
-            print(" Generating questions...")
-            questions_data = generate_questions(
-                industry=user_pref['industry'],
-                job_title=user_pref['job'],
-                language=user_pref['learning'],
-                level=level,
-                native=user_pref['native']
-            )
-            
-            questions = questions_data.get('content', [])
-            if not questions:
-                raise Exception("No questions generated")
+        # Generate a unique session ID
+        session_id = session_id or str(uuid.uuid4())
+        
+        # Steps 2-3: Generate questions and their audio. Each sentence is handed to the TTS
+        # pool as soon as it has streamed in, so synthesis overlaps with generation.
+        questions = []
+        audio_futures = []
+        with ThreadPoolExecutor(max_workers=SESSION_TTS_CONCURRENCY) as pool:
+            if mode == "conversational":
+                # For conversational mode, create a simple greeting message
+                print("💬 Creating conversational session...")
+                questions = [{
+                    "learning": f"Bonjour! Je suis Madame AI, votre assistante Francoflex. Comment puis-je vous aider aujourd'hui?",
+                    "native": f"Hello! I am Madame AI, your Francoflex assistant. How can I help you today?",
+                    "status": "not_done"
+                }]
+                audio_futures.append(pool.submit(text_to_audio, questions[0]['learning'], audio_format=audio_format))
+                # No practice sentences to quote: the greeting uses the default topics
+                _start_session_greeting(session_id, user_pref, [], level)
+                print(f"✅ Created conversational greeting")
+            else:
+                print(" Generating questions and audio...")
+                for question in stream_questions(
+                    industry=user_pref['industry'],
+                    job_title=user_pref['job'],
+                    language=user_pref['learning'],
+                    level=level,
+                    native=user_pref['native']
+                ):
+                    questions.append(question)
+                    if len(audio_futures) < SESSION_EAGER_AUDIO:
+                        audio_futures.append(pool.submit(text_to_audio, question['learning'], audio_format=audio_format))
+                    # The greeting only uses the first topics: personalize it while the rest streams in
+                    if len(questions) == GREETING_TOPICS:
+                        _start_session_greeting(session_id, user_pref, questions, level)
+                
+                if not questions:
+                    raise Exception("No questions generated")
+                if len(questions) < GREETING_TOPICS:
+                    _start_session_greeting(session_id, user_pref, questions, level)
+                
+                print(f"✅ Generated {len(questions)} questions")
             
-            print(f"✅ Generated {len(questions)} questions")
+            audio_urls = [future.result() for future in audio_futures]
         
-        # Step 3: Generate audio for each question
-        print("🎵 Generating audio for questions...")
         session_questions = []
         
         for i, question in enumerate(questions):
-            print(f"Processing question {i+1}/{len(questions)}")
-            
-            # Generate audio for the learning language sentence
-            audio_url = text_to_audio(question['learning'])
-            
+            audio_url = audio_urls[i] if i < len(audio_urls) else None
             session_question = {
                 "learning": question['learning'],
                 "native": question['native'],
                 "audio_url": audio_url,
+                "audio_format": audio_format,  # Used when deferred audio is synthesized later
                 "status": "not_done"  # Add status field
             }
             session_questions.append(session_question)
             
             if audio_url:
                 print(f"✅ Audio generated for question {i+1}")
-            else:
-                print(f"❌ Failed to generate audio for question {i+1}")
+            elif i < len(audio_urls):
+                print(f"❌ Failed to generate audio for question {i+1}, will retry when it is served")
+        print(f"⏳ Audio deferred for {len(questions) - len(audio_urls)} questions")
         
         # Step 4: Save session to database
         print("💾 Saving session to database...")
         supabase = get_supabase_client()
         
-        # Generate a unique session ID
-        session_id = str(uuid.uuid4())
-        
         session_record = {
             "id": session_id,
             "user": user_id,
@@ -106,6 +229,9 @@ def create_session(user_id: str, level: str, mode: str = "repeat") -> List[Dict[
         
         if result.data:
             print(f"✅ Session saved to database: {session_id}")
+            # The first question is served from the session itself; get the next one ready
+            for i, question in enumerate(session_questions[:len(audio_urls) + 1]):
+                prefetch_question_audio(session_id, i, question)
         else:
             print("⚠️ Failed to save session to database, but continuing...")
         
@@ -150,6 +276,51 @@ def get_all_sessions(user_id: str) -> List[Dict[str, Any]]:
         raise e
 
 
+# Session columns without the (large) question content
+SESSION_HEADER_COLUMNS = "id, user, level, type, created_at"
+
+
+def next_question_cursor(content: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Position of the first question that is not done in a session's content.
+    
+    Args:
+        content (List[Dict[str, Any]]): Session questions
+        
+    Returns:
+        Optional[Dict[str, Any]]: index, question, total_questions and completed_questions,
+            or None if all questions are done
+    """
+    for i, question in enumerate(content):
+        if question.get('status', 'not_done') == 'not_done':
+            return {
+                'index': i,
+                'question': question,
+                'total_questions': len(content),
+                'completed_questions': sum(1 for q in content if q.get('status') == 'done')
+            }
+    return None
+
+
+def get_session_with_content(user_id: str, session_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    A user's session (the most recent one if no session_id is given) in a single query.
+    
+    Args:
+        user_id (str): The user's unique identifier
+        session_id (Optional[str]): Session to fetch (default: latest session)
+        
+    Returns:
+        Optional[Dict[str, Any]]: Session header columns plus content, or None if not found
+    """
+    supabase = get_supabase_client()
+    query = supabase.table('sessions').select(f"{SESSION_HEADER_COLUMNS}, content").eq('user', user_id)
+    if session_id:
+        query = query.eq('id', session_id)
+    result = query.order('created_at', desc=True).limit(1).execute()
+    return result.data[0] if result.data else None
+
+
 def update_question_status(session_id: str, question_index: int, status: str = "done") -> bool:
     """
     Update the status of a specific question in a session.
@@ -165,28 +336,30 @@ def update_question_status(session_id: str, question_index: int, status: str = "
     try:
         supabase = get_supabase_client()
         
-        # Get the current session
-        result = supabase.table('sessions').select('content').eq('id', session_id).execute()
-        
-        if not result.data:
-            print(f"❌ Session {session_id} not found")
-            return False
-        
-        session = result.data[0]
-        content = session['content']
-        
-        # Check if question index is valid
-        if question_index >= len(content) or question_index < 0:
-            print(f"❌ Invalid question index: {question_index}")
-            return False
-        
-        # Update the question status
-        content[question_index]['status'] = status
-        
-        # Update the session in database
-        update_result = supabase.table('sessions').update({
-            'content': content
-        }).eq('id', session_id).execute()
+        # Serialized with audio backfills of the same session, so neither write drops the other
+        with _content_lock(session_id):
+            # Get the current session
+            result = supabase.table('sessions').select('content').eq('id', session_id).execute()
+            
+            if not result.data:
+                print(f"❌ Session {session_id} not found")
+                return False
+            
+            session = result.data[0]
+            content = session['content']
+            
+            # Check if question index is valid
+            if question_index >= len(content) or question_index < 0:
+                print(f"❌ Invalid question index: {question_index}")
+                return False
+            
+            # Update the question status
+            content[question_index]['status'] = status
+            
+            # Update the session in database
+            update_result = supabase.table('sessions').update({
+                'content': content
+            }).eq('id', session_id).execute()
         
         if update_result.data:
             print(f"✅ Updated question {question_index} status to '{status}' in session {session_id}")
@@ -224,15 +397,15 @@ def get_next_question(session_id: str) -> Optional[Dict[str, Any]]:
         content = session['content']
         
         # Find the first question that is not done
-        for i, question in enumerate(content):
-            if question.get('status', 'not_done') == 'not_done':
-                print(f"✅ Found next question at index {i}")
-                return {
-                    'index': i,
-                    'question': question,
-                    'total_questions': len(content),
-                    'completed_questions': sum(1 for q in content if q.get('status') == 'done')
-                }
+        cursor = next_question_cursor(content)
+        if cursor:
+            i = cursor['index']
+            print(f"✅ Found next question at index {i}")
+            # Deferred (or previously failed) audio is synthesized now, the following question's in the background
+            cursor['question']['audio_url'] = ensure_question_audio(session_id, i, cursor['question'])
+            if i + 1 < len(content):
+                prefetch_question_audio(session_id, i + 1, content[i + 1])
+            return cursor
         
         print("✅ All questions are completed")
         return None
@@ -5,7 +5,15 @@ import json
 import requests
 import pandas as pd
 from dotenv import load_dotenv
-import openai
+
+try:
+    from function.sa_parser import parse_speechace_response
+    from function.oa_client import chat_completion_json, is_llm_configured, LLMError
+    from function.in_audio_transcode import transcode_audio_in_pool
+except ImportError:
+    from sa_parser import parse_speechace_response
+    from oa_client import chat_completion_json, is_llm_configured, LLMError
+    from in_audio_transcode import transcode_audio_in_pool
 
 # Load environment variables
 load_dotenv()
@@ -18,64 +26,17 @@ def analyze_pronunciation_data(json_data):
     - overall_score: Main pronunciation score
     - word_analysis: Detailed breakdown by word with syllables and phones
     """
-    
-    if isinstance(json_data, str):
-        data = json.loads(json_data)
-    else:
-        data = json_data
-    
-    # Extract overall metrics - handle different response structures
-    overall_score = None
-    
-    # Try different possible structures
-    if 'speechace_score' in data and 'pronunciation' in data['speechace_score']:
-        overall_score = data['speechace_score']['pronunciation']
-    elif 'text_score' in data and 'quality_score' in data['text_score']:
-        overall_score = data['text_score']['quality_score']
-    elif 'text_score' in data and 'word_score_list' in data['text_score']:
-        # Calculate average from word scores
-        word_scores = [word['quality_score'] for word in data['text_score']['word_score_list']]
-        overall_score = sum(word_scores) / len(word_scores) if word_scores else 0
-    
-    # Process each word
-    word_analysis = []
-    
-    for word_data in data['text_score']['word_score_list']:
-        word_info = {
-            'word': word_data['word'],
-            'quality_score': word_data['quality_score'],
-            'syllables': [],
-            'phones': []
-        }
-        
-        # Extract syllable data
-        for syll in word_data['syllable_score_list']:
-            syllable_info = {
-                'letters': syll['letters'],
-                'quality_score': syll['quality_score'],
-                'phone_count': syll['phone_count']
-            }
-            word_info['syllables'].append(syllable_info)
-        
-        # Extract phone data with pronunciation issues
-        for phone in word_data['phone_score_list']:
-            phone_info = {
-                'target_phone': phone['phone'],
-                'quality_score': phone['quality_score'],
-                'sound_most_like': phone.get('sound_most_like'),
-                'needs_work': phone['quality_score'] < 70
-            }
-            word_info['phones'].append(phone_info)
-        
-        word_analysis.append(word_info)
-    
-    return {
-        'overall_score': overall_score,
-        'word_analysis': word_analysis
-    }
+    return parse_speechace_response(json_data).to_analysis_data()
 
-def analyze_pronunciation(audio_path, target_text):
-    """Analyze pronunciation using direct SpeechAce API call."""
+def analyze_pronunciation(audio, target_text):
+    """
+    Analyze pronunciation using direct SpeechAce API call.
+    
+    Args:
+        audio: Path to the audio file, audio bytes, or a readable file object
+            (e.g. an UploadFile's spooled buffer), read without a disk copy
+        target_text: Text the learner was asked to say
+    """
     
     try:
         # Check if API key is available
@@ -90,14 +51,23 @@ def analyze_pronunciation(audio_path, target_text):
             'text': target_text
         }
         
-        with open(audio_path, 'rb') as audio_file:
-            files = {
-                'user_audio_file': audio_file
-            }
-            
-            response = requests.post(url, data=data, files=files)
-            response.raise_for_status()
-            score_result = response.json()
+        if isinstance(audio, (str, os.PathLike)):
+            with open(audio, 'rb') as audio_file:
+                audio_bytes = audio_file.read()
+        elif isinstance(audio, (bytes, bytearray)):
+            audio_bytes = bytes(audio)
+        else:
+            audio_bytes = audio.read()
+        
+        # Normalize to 16 kHz mono WAV; if the container can't be decoded here, the
+        # original is sent labeled with its real format
+        transcoded = transcode_audio_in_pool(audio_bytes)
+        files = {
+            'user_audio_file': (f"audio.{transcoded['extension']}", transcoded['audio_bytes'], transcoded['content_type'])
+        }
+        response = requests.post(url, data=data, files=files)
+        response.raise_for_status()
+        score_result = response.json()
         
         if not score_result or score_result.get("status") != "success":
             return None, "Failed to get pronunciation score"
@@ -121,42 +91,7 @@ def create_compact_pronunciation_json(json_data):
     - speechace_score and cefr_score
     - words with quality_score and phones (phone, quality_score, sound_most_like)
     """
-    
-    if isinstance(json_data, str):
-        data = json.loads(json_data)
-    else:
-        data = json_data
-    
-    # Extract overall scores
-    speechace_score = data.get('speechace_score', {})
-    cefr_score = data.get('cefr_score', {})
-    
-    # Process words
-    words = []
-    if 'text_score' in data and 'word_score_list' in data['text_score']:
-        for word_data in data['text_score']['word_score_list']:
-            word_info = {
-                'word': word_data['word'],
-                'quality_score': round(word_data['quality_score'])
-            }
-            
-            # Process phones - create a dictionary with phone as key
-            phones = {}
-            for phone in word_data['phone_score_list']:
-                phone_key = phone['phone']
-                phones[phone_key] = {
-                    'quality_score': round(phone['quality_score']),
-                    'sound_most_like': phone.get('sound_most_like')
-                }
-            
-            word_info['phones'] = phones
-            words.append(word_info)
-    
-    return {
-        'speechace_score': speechace_score,
-        'cefr_score': cefr_score,
-        'words': words
-    }
+    return parse_speechace_response(json_data).to_compact_json()
 
 def convert_speechace_to_custom_response(speechace_response):
     """
@@ -168,64 +103,18 @@ def convert_speechace_to_custom_response(speechace_response):
     Returns:
         dict: Custom response format with overall_score, word_analysis, and metadata
     """
-    
-    if isinstance(speechace_response, str):
-        data = json.loads(speechace_response)
-    else:
-        data = speechace_response
-    
-    # Extract overall pronunciation score from the correct nested location
-    overall_score = None
-    if 'text_score' in data and 'speechace_score' in data['text_score']:
-        speechace_data = data['text_score']['speechace_score']
-        if 'pronunciation' in speechace_data:
-            overall_score = round(speechace_data['pronunciation'])  # This is an int from 0-100
-    elif 'speechace_score' in data and 'pronunciation' in data['speechace_score']:
-        overall_score = round(data['speechace_score']['pronunciation'])
-    elif 'text_score' in data and 'quality_score' in data['text_score']:
-        overall_score = round(data['text_score']['quality_score'])
-    
-    # Extract CEFR score from the correct nested location
-    cefr_score = {}
-    if 'text_score' in data and 'cefr_score' in data['text_score']:
-        cefr_data = data['text_score']['cefr_score']
-        if 'pronunciation' in cefr_data:
-            cefr_score['level'] = cefr_data['pronunciation']  # This is a string like "B1", "B2", etc.
-    
-    # Process word analysis
-    word_analysis = []
-    if 'text_score' in data and 'word_score_list' in data['text_score']:
-        for word_data in data['text_score']['word_score_list']:
-            word_info = {
-                'word': word_data['word'],
-                'quality_score': round(word_data['quality_score']),
-                'phones': {}
-            }
-            
-            # Process phones for this word
-            for phone in word_data['phone_score_list']:
-                phone_key = phone['phone']
-                word_info['phones'][phone_key] = {
-                    'quality_score': round(phone['quality_score']),
-                    'sound_most_like': phone.get('sound_most_like')
-                }
-            
-            word_analysis.append(word_info)
-    
-    # Create custom response format
-    custom_response = {
-        'overall_score': overall_score,
-        'speechace_score': data.get('speechace_score', {}),
-        'cefr_score': cefr_score,
-        'word_analysis': word_analysis,
-        'metadata': {
-            'status': data.get('status', 'unknown'),
-            'api_version': 'v9',
-            'raw_api_response': data  # Include the complete raw API response
-        }
-    }
-    
-    return custom_response
+    return parse_speechace_response(speechace_response).to_custom_response()
+
+# Structured output schema for generate_word_feedback
+WORD_TIP_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "cheering_message": {"type": "string"},
+        "feedback": {"type": "string"}
+    },
+    "required": ["cheering_message", "feedback"],
+    "additionalProperties": False
+}
 
 def generate_word_feedback(word_data, overall_score):
     """
@@ -241,8 +130,7 @@ def generate_word_feedback(word_data, overall_score):
     
     try:
         # Check if OpenAI API key is available
-        openai.api_key = os.getenv('OPENAI_API_KEY')
-        if not openai.api_key:
+        if not is_llm_configured():
             return {
                 "cheering_message": "Great effort! Keep practicing!",
                 "feedback": "Continue working on your pronunciation."
@@ -288,31 +176,24 @@ Respond in JSON format:
 Keep it concise, supportive, and focused on the specific pronunciation issues for this word.
 """
         
-        # Make API call to OpenAI
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
+        # Make API call to OpenAI (schema-constrained, so the result is already validated)
+        return chat_completion_json(
+            "word_tip",
             messages=[
                 {"role": "system", "content": "You are a supportive French pronunciation coach. Always be encouraging and provide specific, actionable feedback."},
                 {"role": "user", "content": prompt}
             ],
+            schema=WORD_TIP_SCHEMA,
             max_tokens=200,
             temperature=0.7
         )
         
-        # Parse the response
-        ai_response = response.choices[0].message.content.strip()
-        
-        # Try to parse as JSON, fallback if it fails
-        try:
-            feedback_data = json.loads(ai_response)
-            return feedback_data
-        except json.JSONDecodeError:
-            # Fallback if AI doesn't return valid JSON
-            return {
-                "cheering_message": "Great effort! Keep practicing!",
-                "feedback": ai_response if ai_response else "Continue working on your pronunciation."
-            }
-            
+    except LLMError:
+        # Fallback if the AI call failed or returned unusable JSON
+        return {
+            "cheering_message": "Great effort! Keep practicing!",
+            "feedback": "Continue working on your pronunciation."
+        }
     except Exception as e:
         # Fallback in case of any error
         return {
@@ -368,13 +249,15 @@ if __name__ == "__main__":
     target_question = "Comment expliquez-vous l'efficacité et les effets secondaires des médicaments aux professionnels de la santé lors de réunions de vente?"
     
     # Find the latest audio file
-    recordings_dir = "data/recordings"
-    if os.path.exists(recordings_dir):
-        audio_files = [f for f in os.listdir(recordings_dir) if f.endswith('.wav')]
-        if audio_files:
+    from function.in_recordings import get_recording_store
+    
+    store = get_recording_store()
+    if store.stats()["recordings"]:
+        latest_recordings = [r for r in store.list_recordings(limit=20) if r["extension"] == "wav"]
+        if latest_recordings:
             # Get the most recent file
-            latest_file = max(audio_files, key=lambda x: os.path.getctime(os.path.join(recordings_dir, x)))
-            audio_path = os.path.join(recordings_dir, latest_file)
+            audio_path = latest_recordings[0]["path"]
+            latest_file = os.path.basename(audio_path)
             
             print(f"🎵 Testing with audio file: {latest_file}")
             print(f"📝 Target question: {target_question}")
@@ -406,6 +289,6 @@ if __name__ == "__main__":
                     print("\n🔍 Raw Response for debugging:")
                     print(json.dumps(raw_data, indent=2))
         else:
-            print("❌ No audio files found in data/recordings")
+            print("❌ No audio files found in the recording store")
     else:
-        print("❌ Recordings directory not found")
+        print("❌ Recording store is empty")
@@ -3,7 +3,6 @@
 import streamlit as st
 import os
 import tempfile
-import uuid
 import json
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -12,7 +11,7 @@ import plotly.figure_factory as ff
 import plotly.graph_objects as go
 from datetime import datetime
 from conversational_ai import ElevenLabsClient, PharmaScenarios
-from pronunciation_ai import LLMAnalyzer
+from pronunciation_ai import LLMAnalyzer, AudioHandler
 from pronunciation_analyzer import analyze_pronunciation_data, analyze_pronunciation, convert_speechace_to_custom_response, add_ai_feedback_to_response, generate_word_feedback
 
 def _old_analyze_pronunciation_data(json_data):
@@ -21,68 +20,9 @@ def _old_analyze_pronunciation_data(json_data):
     
     Returns:
     - overall_score: Main pronunciation score
-    - cefr_level: Language proficiency level  
     - word_analysis: Detailed breakdown by word with syllables and phones
     """
-    
-    if isinstance(json_data, str):
-        data = json.loads(json_data)
-    else:
-        data = json_data
-    
-    # Extract overall metrics - handle different response structures
-    overall_score = None
-    cefr_level = None
-    
-    # Try different possible structures
-    if 'speechace_score' in data and 'pronunciation' in data['speechace_score']:
-        overall_score = data['speechace_score']['pronunciation']
-    elif 'text_score' in data and 'quality_score' in data['text_score']:
-        overall_score = data['text_score']['quality_score']
-    elif 'text_score' in data and 'word_score_list' in data['text_score']:
-        # Calculate average from word scores
-        word_scores = [word['quality_score'] for word in data['text_score']['word_score_list']]
-        overall_score = sum(word_scores) / len(word_scores) if word_scores else 0
-    
-    
-    
-    # Process each word
-    word_analysis = []
-    
-    for word_data in data['text_score']['word_score_list']:
-        word_info = {
-            'word': word_data['word'],
-            'quality_score': word_data['quality_score'],
-            'syllables': [],
-            'phones': []
-        }
-        
-        # Extract syllable data
-        for syll in word_data['syllable_score_list']:
-            syllable_info = {
-                'letters': syll['letters'],
-                'quality_score': syll['quality_score'],
-                'phone_count': syll['phone_count']
-            }
-            word_info['syllables'].append(syllable_info)
-        
-        # Extract phone data with pronunciation issues
-        for phone in word_data['phone_score_list']:
-            phone_info = {
-                'target_phone': phone['phone'],
-                'quality_score': phone['quality_score'],
-                'sound_most_like': phone.get('sound_most_like'),
-                'needs_work': phone['quality_score'] < 70
-            }
-            word_info['phones'].append(phone_info)
-        
-        word_analysis.append(word_info)
-    
-    return {
-        'overall_score': overall_score,
-        
-        'word_analysis': word_analysis
-    }
+    return analyze_pronunciation_data(json_data)
 
 def generate_feedback_summary(analysis):
     """
@@ -253,17 +193,8 @@ def create_phone_scatter_plot(phone_data):
     return fig, hover_texts
 
 def save_voice_note(audio_data):
-    """Save voice note and return file path."""
-    recordings_dir = "data/recordings"
-    os.makedirs(recordings_dir, exist_ok=True)
-    
-    filename = f"{uuid.uuid4()}.wav"
-    filepath = os.path.join(recordings_dir, filename)
-    
-    with open(filepath, "wb") as f:
-        f.write(audio_data.read())
-    
-    return filepath
+    """Save voice note to the recording store and return file path."""
+    return AudioHandler().save_recording(audio_data, "wav")
 
 def generate_ai_voice(text, voice_type="professional_female"):
     """Generate AI voice response."""